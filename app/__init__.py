@@ -2,6 +2,9 @@ from flask import Flask
 from app.utils import load_config, load_stats, sync_stats_with_config
 from app.services.camera import start_camera_agents
 from app.database import init_db
+from app.config import SERVICE_ROLE
+from app.services.live_state import LiveStateReader, FrameSlotReader
+from app.services.thresholds import ThresholdStore
 import app.globals as g
 
 def create_app():
@@ -16,7 +19,17 @@ def create_app():
     init_db()
     
     # Sync stats with config (Remove zombie entries)
-    sync_stats_with_config()
+    # Web workers never write traffic_stats.json; the ingest process owns it
+    if SERVICE_ROLE != "web":
+        sync_stats_with_config()
+
+    # Congestion thresholds are updated by the agents; web workers only read them
+    g.threshold_store = ThresholdStore(read_only=(SERVICE_ROLE == "web")).load()
+
+    # Web workers read live counters/frames from the ingest process
+    if SERVICE_ROLE == "web":
+        g.live_state_reader = LiveStateReader()
+        g.frame_reader = FrameSlotReader()
     
     app = Flask(__name__)
     
@@ -3,13 +3,25 @@ import os
 # Base Directories
 # Moved inside app/, so go up two levels to reach root
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-DATA_DIR = os.path.join(BASE_DIR, 'data')
+# SMARTTRAFFIC_DATA_DIR points a process at another data set (e.g. scripts/load_test_api.py)
+DATA_DIR = os.environ.get("SMARTTRAFFIC_DATA_DIR", os.path.join(BASE_DIR, 'data'))
 MODELS_DIR = os.path.join(BASE_DIR, 'models')
 
 # Files
 CONFIG_FILE = os.path.join(DATA_DIR, "cctv_config.json")
 STATS_FILE = os.path.join(DATA_DIR, "traffic_stats.json")
+THRESHOLDS_FILE = os.path.join(DATA_DIR, "camera_thresholds.json")
+THRESHOLD_SKETCH_FILE = os.path.join(DATA_DIR, "camera_threshold_sketches.json")
+NOWCAST_STATE_FILE = os.path.join(DATA_DIR, "nowcast_state.json")
+EXPORT_DIR = os.path.join(DATA_DIR, "exports")
+# Watermarks for scripts/sync_stats_db.py
+STATS_SYNC_STATE_FILE = os.path.join(DATA_DIR, "stats_sync_state.json")
+# Held (flock) by the process running camera agents, which owns STATS_FILE
+INGEST_LOCK_FILE = os.path.join(DATA_DIR, "ingest.lock")
 YOLO_MODEL_PATH = os.path.join(MODELS_DIR, "yolov8l.pt")
+# Exported graphs (see scripts/export_detector.py)
+ONNX_MODEL_PATH = os.path.join(MODELS_DIR, "yolov8l.onnx")
+OPENVINO_MODEL_PATH = os.path.join(MODELS_DIR, "yolov8l_openvino_model", "yolov8l.xml")
 
 # Server
 HOST_IP = "0.0.0.0"
@@ -24,6 +36,157 @@ PROCESS_INTERVAL = 2
 # 24h * 60m * 30 (2s intervals) = ~43,200 points
 HISTORY_MAX_LEN = 50000
 
+# Motion Gate (skip inference when the scene has not changed)
+MOTION_GATE_ENABLED = True
+MOTION_GATE_WIDTH = 64               # Thumbnail width used for the frame difference
+MOTION_GATE_PIXEL_DELTA = 12         # Per-pixel intensity change that counts as motion
+MOTION_GATE_THRESHOLD = 0.005        # Fraction of changed pixels below which inference is skipped
+MOTION_GATE_REFRESH_SECONDS = 30     # Always run inference at least this often
+
+# Exports (rows fetched per cursor batch; bounds memory for any export size)
+EXPORT_BATCH_SIZE = 5000
+
+# Bulk Import (scripts/bulk_import.py)
+IMPORT_CHECKPOINT_DIR = os.path.join(DATA_DIR, "import_checkpoints")
+IMPORT_SEGMENT_ROWS = 500000          # Rows per transaction/checkpoint
+IMPORT_BATCH_ROWS = 50000             # Rows per executemany into the staging table
+
+# Backfill (app/services/backfill.py)
+BACKFILL_CHUNK_DAYS = 1               # Days per INSERT ... SELECT (progress granularity)
+DATALAKE_AGG_INTERVAL = 300           # Seconds per aggregated data-lake record
+
+# Data Lake (app/services/datalake.py): YYYY/MM/DD partitions of detection logs
+# and backfill aggregates; closed days are compacted by scripts/compact_datalake.py
+DATA_LAKE_PATH = os.environ.get("SMARTTRAFFIC_DATA_LAKE", "/var/www/vehicle-counter/data_lake/raw")
+DATA_LAKE_COMPRESS_LEVEL = 6          # gzip level of compacted blocks (written once, read many times)
+
+# Data-Lake Range Analytics (/api/datalake/range, app/services/lake_analytics.py)
+LAKE_SCAN_PROCESSES = min(4, os.cpu_count() or 1)  # Process pool for partition scans (0 = in-process)
+LAKE_MAX_RANGE_DAYS = 366             # Longest range accepted per request
+LAKE_DAY_CACHE_SIZE = 4096            # Closed-day summaries kept in memory (revalidated by file stats)
+
+# Replay (scripts/replay.py, app/services/replay.py): recorded data-lake detections
+# through the counting/stats/storage path under a simulated clock
+REPLAY_SPEED = 60                     # Simulated seconds per real second (0 = as fast as possible)
+REPLAY_SEED = 0                       # Seeds each camera's traffic-multiplier RNG
+REPLAY_HISTORY_BATCH = 1000           # History rows per SQLite transaction during a replay
+
+# Congestion Thresholds (hourly vehicle flow percentiles, updated online per camera)
+THRESHOLD_QUANTILES = (50, 75, 90)
+DEFAULT_THRESHOLDS = {"p50": 100, "p75": 200, "p90": 300}
+THRESHOLD_MIN_COVERAGE = 0.5          # Fraction of an hour a camera must be online for the hour to count
+THRESHOLD_GAP_SECONDS = 600           # Longer gaps between cycles are not counted as online time
+
+# API Responses (app/services/responses.py)
+RESPONSE_COMPRESS_MIN_BYTES = 1024    # Smaller bodies are sent uncompressed
+RESPONSE_COMPRESS_LEVEL = 1           # Fastest level: ~4x cheaper than 6 for ~25% larger bodies
+HISTORY_MAX_BUCKETS = 10000           # Upper bound for /api/history?interval=
+
+# Response Cache (app/services/response_cache.py)
+RESPONSE_CACHE_SIZE = 256             # Entries (LRU beyond this)
+HISTORY_CACHE_STALENESS = 0.1         # /api/history cached for this fraction of a bucket (5-300 s)
+PREDICT_CACHE_TTL = 300               # /api/predict_traffic, also capped at the next hour
+DATALAKE_CACHE_TTL = 60               # /api/datalake/stats for today
+DATALAKE_PAST_CACHE_TTL = 3600        # ... and for earlier days (only backfills change them)
+# Bulk writers (imports, replays, backfills) append invalidated tags here so every
+# server process sharing DATA_DIR drops the affected entries
+RESPONSE_CACHE_INVALIDATION_LOG = os.path.join(DATA_DIR, "live", "cache_invalidations.log")
+RESPONSE_CACHE_INVALIDATION_POLL = 1.0  # Seconds between checks of that log
+
+# Map / Spatial Index (app/services/spatial.py)
+SPATIAL_CELL_DEG = 0.01               # Grid cell size (~1.1 km) for viewport and nearest queries
+SPATIAL_REGION_DEG = 0.1              # Region size (~11 km) for cameras without a "region" field
+SPATIAL_MAX_NEAREST = 50              # Largest k accepted by /api/cameras/nearest
+
+# Nowcasting & Anomalies (app/services/nowcast.py, updated every camera cycle)
+NOWCAST_LEVEL_SECONDS = 300           # Time constant of the flow level (EWMA)
+NOWCAST_TREND_SECONDS = 1800          # Time constant of the flow trend
+NOWCAST_GAP_SECONDS = 600             # Longer gaps between cycles restart the filter
+NOWCAST_HORIZONS = (15, 30, 60)       # Minutes ahead reported as next_<N>m
+NOWCAST_BASELINE_WEEKS = 8            # Baseline becomes an exponential average after this many samples
+NOWCAST_MIN_BASELINE = 3              # Hourly samples a weekday/hour slot needs before z-scores are reported
+NOWCAST_MIN_COVERAGE = 0.5            # Fraction of an hour a camera must be online for it to count
+NOWCAST_ANOMALY_Z = 3.5               # |z| at or above this flags an anomaly
+NOWCAST_CLEAR_Z = 2.0                 # ... and it clears once |z| falls below this
+
+# Forecasting (app/services/forecast.py)
+FORECAST_HISTORY_DAYS = 56            # Hourly rollups kept in memory for fitting
+FORECAST_REFIT_SECONDS = 900          # Background refit when the model is older than this
+FORECAST_FULL_RELOAD_SECONDS = 86400  # Rebuild rollups from scratch (picks up deleted/replaced rows)
+FORECAST_WEEK_DECAY = 0.7             # Weight per week of age for the weekday/hour baseline
+FORECAST_DAY_DECAY = 0.9              # Weight per day of age for the hourly profile and AR fit
+FORECAST_MIN_SLOT_WEIGHT = 0.5        # Below this a weekday/hour slot falls back to the hourly profile
+FORECAST_LAGS = (1, 2, 3, 24)         # Residual lags (hours) for the ridge AR term
+FORECAST_RIDGE_ALPHA = 1.0
+FORECAST_MAX_AR_HORIZON = 168         # Beyond this many hours ahead only the baseline is used
+FORECAST_MAX_BATCH_HOURS = 168        # Longest horizon served by /api/forecast
+FORECAST_CACHE_SIZE = 32              # Cached /api/forecast bodies
+
+# Detector Backend
+# "ultralytics": eager PyTorch (.pt, supports TTA)
+# "onnx" / "openvino": exported CPU-optimized graphs (FP32/FP16/INT8)
+DETECTOR_BACKEND = "ultralytics"
+
+# Cascade Detection
+# A small model runs first; frames are escalated to the large (DETECTOR_BACKEND) model
+# only when dense, borderline-confidence, or due for an audit. Per-camera overrides go
+# in a "cascade" block in cctv_config.json.
+CASCADE_ENABLED = False
+CASCADE_SMALL_BACKEND = "ultralytics"
+CASCADE_SMALL_MODEL_PATH = os.path.join(MODELS_DIR, "yolov8n.pt")
+CASCADE_DENSE_THRESHOLD = 25          # Vehicles found by the small model
+CASCADE_CONF_BAND = (0.10, 0.35)      # Confidence range treated as "borderline"
+CASCADE_BORDERLINE_FRACTION = 0.3     # Share of borderline boxes that triggers escalation
+CASCADE_AUDIT_EVERY = 30              # Cycles between forced large-model runs (0 = never)
+CASCADE_NEVER_ESCALATE_PROFILES = ["RESIDENTIAL"]
+
+# Camera Connection Health (app/services/health.py): circuit breaker for dead streams
+CAMERA_FAILURE_THRESHOLD = 3          # Consecutive failed connects before the breaker opens
+CAMERA_BACKOFF_BASE = 30              # Seconds before the first half-open probe
+CAMERA_BACKOFF_MAX = 900              # Backoff cap (doubles after every failed probe)
+CAMERA_BACKOFF_JITTER = 0.5           # Up to this fraction is trimmed off each backoff at random
+CAMERA_MAX_CONCURRENT_CONNECTS = 16   # Stream connection attempts in flight across all cameras
+CAMERA_OPEN_TIMEOUT_MS = 20000        # VideoCapture open timeout
+CAMERA_READ_TIMEOUT_MS = 5000         # VideoCapture per-read timeout
+
+# Camera Scheduling
+# "pool": bounded worker pools driven by a due-time priority queue (scales to hundreds of cameras)
+# "threads": legacy mode, one CameraAgent thread per camera
+CAMERA_SCHEDULER = "pool"
+CAPTURE_WORKERS = 8
+INFERENCE_WORKERS = 1
+# Extra priority for the camera currently shown in the live view
+VIEW_PRIORITY_BOOST = 10
+
+# Multi-process Inference
+# 0 = run the model inside the web process (shared, behind model_lock)
+# N = spawn N worker processes, each with its own model copy
+INFERENCE_PROCESSES = 0
+# Shared-memory slot size (largest frame handed over zero-copy; bigger frames are pickled)
+INFERENCE_SLOT_SHAPE = (1080, 1920, 3)
+# Torch/OpenMP threads per worker (None = library default). Set to cores / N on multi-socket hosts.
+INFERENCE_THREADS_PER_PROCESS = None
+INFERENCE_TIMEOUT = 60
+
+# Process Roles & Shared Live State
+# "all":    agents + web server in one process (run.py default)
+# "ingest": camera agents only; publishes live counters/frames to the shared files below
+# "web":    HTTP only; any number of workers read the shared files (see wsgi.py)
+SERVICE_ROLE = os.environ.get("SMARTTRAFFIC_ROLE", "all")
+LIVE_STATE_DIR = os.path.join(DATA_DIR, "live")
+LIVE_STATE_FILE = os.path.join(LIVE_STATE_DIR, "counters.bin")
+LIVE_FRAME_FILE = os.path.join(LIVE_STATE_DIR, "frame.bin")
+LIVE_STATE_CAPACITY = 1024
+LIVE_FRAME_MAX_BYTES = 2 * 1024 * 1024
+
+# Video Streaming & Production Serving (serve.py, app/services/broadcast.py)
+STREAM_POLL_SECONDS = 0.05            # Frame slot poll interval of the shared broadcaster
+STREAM_MIN_FRAME_INTERVAL = 0.5       # Per-viewer frame throttle (~2 fps)
+STREAM_IDLE_SECONDS = 30              # Broadcaster stops polling after this long without viewers
+SERVE_MAX_CONNECTIONS = 2000          # Concurrent connections per serve.py process (gevent)
+SERVE_SHUTDOWN_TIMEOUT = 15           # Seconds to drain requests and stop camera agents
+SERVE_STARTUP_TIMEOUT = 60            # Seconds to wait for the ingest process to publish live state
+
 # Vehicle Classes
 VEHICLE_CLASSES = [1, 2, 3, 5, 7]
 CLASS_CAR = 0
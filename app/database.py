@@ -43,6 +43,7 @@ def insert_history_batch(records):
     """
     Batch insert records.
     records: list of tuples (camera_id, timestamp, total, cars, motors)
+    Returns the rowid of the last inserted row (None if nothing was inserted).
     """
     if not records:
         return
@@ -55,6 +56,7 @@ def insert_history_batch(records):
             VALUES (?, ?, ?, ?, ?, ?, ?, ?)
         ''', records)
         conn.commit()
+        return c.execute("SELECT last_insert_rowid()").fetchone()[0]
     except Exception as e:
         print(f"Error inserting batch: {e}")
     finally:
@@ -71,7 +73,7 @@ def clear_all_history():
     finally:
         conn.close()
 
-def get_camera_history(camera_id, start_ts=None, end_ts=None):
+def get_camera_history(camera_id, start_ts=None, end_ts=None, limit=None):
     conn = get_db_connection()
     c = conn.cursor()
     
@@ -86,7 +88,12 @@ def get_camera_history(camera_id, start_ts=None, end_ts=None):
         query += " AND timestamp <= ?"
         params.append(end_ts)
         
-    query += " ORDER BY timestamp ASC"
+    if limit:
+        # Newest `limit` rows, returned oldest first
+        query = f"SELECT * FROM ({query} ORDER BY timestamp DESC LIMIT ?) ORDER BY timestamp ASC"
+        params.append(limit)
+    else:
+        query += " ORDER BY timestamp ASC"
     
     c.execute(query, params)
     rows = c.fetchall()
@@ -166,6 +173,49 @@ def get_total_lifetime():
     finally:
         conn.close()
 
+def get_max_rowid():
+    conn = get_db_connection()
+    try:
+        row = conn.execute("SELECT MAX(id) FROM traffic_history").fetchone()
+        return row[0] or 0
+    finally:
+        conn.close()
+
+def get_camera_totals_since(last_rowid=0, camera_rowids=None, max_rowid=None):
+    """
+    Per-camera sums of rows inserted after last_rowid (a rowid range scan, so the
+    cost follows the number of new rows, not the table size). camera_rowids
+    raises the watermark of individual cameras; max_rowid caps the scan.
+    Returns {camera_id: {"total", "cars", "motors", "last_rowid"}}.
+    """
+    conn = get_db_connection()
+    try:
+        conn.execute("CREATE TEMP TABLE camera_rowids (camera_id TEXT PRIMARY KEY, last_rowid INTEGER)")
+        conn.executemany("INSERT INTO camera_rowids VALUES (?, ?)",
+                         [(cam_id, rowid) for cam_id, rowid in (camera_rowids or {}).items() if rowid > last_rowid])
+        c = conn.execute("""
+            SELECT
+                h.camera_id,
+                COALESCE(SUM(h.new_count), 0) as total,
+                COALESCE(SUM(h.new_cars), 0) as cars,
+                COALESCE(SUM(h.new_motors), 0) as motors,
+                MAX(h.id) as last_rowid
+            FROM traffic_history h LEFT JOIN camera_rowids w ON w.camera_id = h.camera_id
+            WHERE h.id > ? AND h.id <= ? AND h.id > COALESCE(w.last_rowid, 0)
+            GROUP BY h.camera_id
+        """, (last_rowid, max_rowid if max_rowid is not None else 2 ** 63 - 1))
+        return {
+            row["camera_id"]: {
+                "total": row["total"],
+                "cars": row["cars"],
+                "motors": row["motors"],
+                "last_rowid": row["last_rowid"],
+            }
+            for row in c
+        }
+    finally:
+        conn.close()
+
 def get_aggregated_stats(days=30):
     """
     Get aggregated stats for the last N days.
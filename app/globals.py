@@ -4,6 +4,14 @@ import threading
 global_stats = {}
 CCTV_SOURCES = []
 camera_agents = {}
+camera_scheduler = None
+# Ingest lock file handle while this process runs camera agents (see app/utils.py)
+ingest_lock = None
+
+# Congestion threshold sketches (see app/services/thresholds.py)
+threshold_store = None
+# Per-camera nowcasts and anomaly flags (see app/services/nowcast.py); ingest side only
+nowcast_store = None
 
 # Video Feed State
 VIDEO_SOURCE = ""
@@ -12,6 +20,18 @@ outputFrame = None
 # Locks
 lock = threading.Lock()
 model_lock = threading.Lock()
+small_model_lock = threading.Lock()
 
 # YOLO Instance (Lazy loaded)
 yolo_model_instance = None
+# Cascade first-stage model (when CASCADE_ENABLED)
+small_model_instance = None
+# Multi-process inference pool (when INFERENCE_PROCESSES > 0)
+inference_pool = None
+
+# Shared live state (see app/services/live_state.py)
+# Writers live in the ingest process, readers in web workers
+live_state_writer = None
+frame_writer = None
+live_state_reader = None
+frame_reader = None
@@ -3,11 +3,26 @@ import json
 import time
 import datetime
 from flask import Blueprint, render_template, Response, jsonify, request, g, stream_with_context, current_app
-from app.config import DATA_DIR
+from app.config import (
+    DATA_DIR, FORECAST_MAX_BATCH_HOURS, SPATIAL_MAX_NEAREST, HISTORY_MAX_BUCKETS,
+    HISTORY_CACHE_STALENESS, DATALAKE_CACHE_TTL, DATALAKE_PAST_CACHE_TTL, PREDICT_CACHE_TTL,
+    LAKE_MAX_RANGE_DAYS
+)
 from app.globals import CCTV_SOURCES
 from app.services.camera import generate_frames, CameraAgent
-from app.database import predict_future_traffic, get_history_range, get_aggregated_stats
+from app.database import get_history_range, get_aggregated_stats
 from app.utils import backfill_camera_history, get_datalake_stats
+from app.services.metrics import registry, timed_route
+from app.services.live_state import merge_live_stats
+from app.services.roi import validate_polygons
+from app.services.export import FORMATS, iter_history_batches, export_chunks
+from app.services.forecast import engine as forecast_engine
+from app.services import spatial
+from app.services.responses import json_response, encoded_response, cached_response, dumps, to_columnar, wants_columnar
+from app.services.response_cache import (cache as response_cache, CachedBody, ALL_CAMERAS, camera_tag,
+                                         seconds_to_boundary, notify_data_changed)
+from app.services.lake_analytics import analytics as lake_analytics, RANGE_FIELDS
+import app.globals as state
 
 bp = Blueprint('main', __name__)
 
@@ -72,6 +87,7 @@ def switch_source():
         return jsonify({"status": "error", "message": str(e)}), 500
 
 @bp.route("/api/history")
+@timed_route("/api/history")
 def get_history_api():
     period = request.args.get("period", "30m")
     camera_id = request.args.get("camera_id")
@@ -101,10 +117,37 @@ def get_history_api():
     elif period == "30d":
         start_ts = now - (30 * 24 * 3600)
         interval = 86400 # 1 day
-        
-    rows = get_history_range(camera_id=camera_id, start_ts=start_ts)
-    
-    # Aggregate
+
+    label_format = "%d/%m" if period in ["30d", "7d"] else "%H:%M"
+
+    # Optional finer buckets (seconds), e.g. 30d at 300s for zoomable charts
+    if request.args.get("interval"):
+        interval = request.args.get("interval", type=int)
+        if not interval or interval < 60 or (now - start_ts) / interval > HISTORY_MAX_BUCKETS:
+            return jsonify({"status": "error",
+                            "message": f"interval must be >= 60s and give at most {HISTORY_MAX_BUCKETS} buckets"}), 400
+        if period in ["30d", "7d"] and interval < 86400:
+            label_format = "%d/%m %H:%M"
+
+    columnar = wants_columnar()
+
+    def compute():
+        rows = get_history_range(camera_id=camera_id, start_ts=start_ts)
+        data = bucket_history(rows, interval, label_format)
+        return CachedBody(dumps(to_columnar(data, HISTORY_FIELDS) if columnar else data)), True
+
+    # Live rows only change the newest bucket: serve a cached copy for a small
+    # fraction of the bucket, and never past the boundary where a new bucket starts
+    max_age = min(max(interval * HISTORY_CACHE_STALENESS, 5), 300)
+    key = (period, camera_id, interval, columnar)
+    cached = response_cache.get_or_compute("/api/history", key, seconds_to_boundary(interval, now, max_age),
+                                           compute, tags=[camera_tag(camera_id)])
+    return cached_response(cached)
+
+HISTORY_FIELDS = ["label", "count", "cars", "motors", "ts"]
+
+def bucket_history(rows, interval, label_format="%H:%M"):
+    """Sum new vehicles per interval-aligned bucket, formatted for Chart.js."""
     buckets = {}
     for r in rows:
         ts = r["ts"]
@@ -120,12 +163,7 @@ def get_history_api():
     sorted_ts = sorted(buckets.keys())
     data = []
     for ts in sorted_ts:
-        dt = datetime.datetime.fromtimestamp(ts)
-        if period in ["30d", "7d"]:
-            label = dt.strftime("%d/%m")
-        else:
-            label = dt.strftime("%H:%M")
-            
+        label = datetime.datetime.fromtimestamp(ts).strftime(label_format)
         data.append({
             "label": label,
             "count": buckets[ts]["count"],
@@ -133,10 +171,64 @@ def get_history_api():
             "motors": buckets[ts]["motors"],
             "ts": ts
         })
-        
-    return jsonify(data)
+    return data
+
+PERIOD_SECONDS = {"30m": 1800, "1h": 3600, "6h": 6 * 3600, "12h": 12 * 3600,
+                  "24h": 24 * 3600, "7d": 7 * 24 * 3600, "30d": 30 * 24 * 3600}
+
+def stream_export(fmt, start_ts, end_ts, camera_ids):
+    """Chunked download of traffic_history; rows are fetched in batches while streaming."""
+    ext, mimetype, _ = FORMATS[fmt]
+    camera_names = {src["id"]: src["name"] for src in state.CCTV_SOURCES}
+    chunks = export_chunks(fmt, iter_history_batches(start_ts, end_ts, camera_ids), camera_names)
+    filename = time.strftime(f"traffic_%Y%m%d_%H%M%S.{ext}")
+    return Response(
+        stream_with_context(chunks),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    )
+
+def parse_ts(value):
+    """Optional epoch-seconds query value -> float or None (ValueError if malformed)."""
+    if value is None or value == "":
+        return None
+    ts = float(value)
+    if ts != ts or ts in (float("inf"), float("-inf")):
+        raise ValueError(value)
+    return ts
+
+@bp.route("/api/export")
+def export_history():
+    fmt = request.args.get("format", "csv")
+    if fmt not in FORMATS:
+        return jsonify({"status": "error", "message": f"Unknown format '{fmt}'"}), 400
+    try:
+        start_ts = parse_ts(request.args.get("start_ts"))
+        end_ts = parse_ts(request.args.get("end_ts"))
+    except ValueError:
+        return jsonify({"status": "error", "message": "start_ts/end_ts must be epoch seconds"}), 400
+    # ?camera_id=a&camera_id=b or ?camera_id=a,b
+    camera_ids = [c for value in request.args.getlist("camera_id") for c in value.split(",") if c]
+    return stream_export(fmt, start_ts, end_ts, camera_ids or None)
+
+@bp.route("/api/export_csv")
+def export_csv():
+    # Dashboard download button: same periods as /api/history, or one day from start_ts
+    period = request.args.get("period", "24h")
+    try:
+        start_ts = parse_ts(request.args.get("start_ts"))
+    except ValueError:
+        return jsonify({"status": "error", "message": "start_ts must be epoch seconds"}), 400
+    if period == "custom" and start_ts:
+        end_ts = start_ts + 86400
+    else:
+        end_ts = None
+        start_ts = time.time() - PERIOD_SECONDS.get(period, PERIOD_SECONDS["24h"])
+    camera_id = request.args.get("camera_id")
+    return stream_export("csv", start_ts, end_ts, [camera_id] if camera_id else None)
 
 @bp.route("/api/stats")
+@timed_route("/api/stats")
 def get_stats():
     # Return traffic stats
     try:
@@ -151,17 +243,174 @@ def get_stats():
                 for s_id in data['sources']:
                     if 'history' in data['sources'][s_id]:
                         del data['sources'][s_id]['history']
+
+            # Multi-worker mode: overlay live counters from the ingest process
+            # (the JSON file is only rewritten every 60 seconds)
+            if state.live_state_reader is not None:
+                live = state.live_state_reader.read_all()
+                if live:
+                    merge_live_stats(data.setdefault('sources', {}), live)
+                    totals = data.setdefault('global_total', {})
+                    totals['current_count'] = sum(s.get('current_count', 0) for s in data['sources'].values())
+                    totals['current_cars'] = sum(s.get('current_class_counts', {}).get('0', 0) for s in data['sources'].values())
+                    totals['current_motorcycles'] = sum(s.get('current_class_counts', {}).get('1', 0) for s in data['sources'].values())
+
+            # Agents in this process: nowcasts straight from memory
+            if state.nowcast_store is not None:
+                for s_id, src in data.get('sources', {}).items():
+                    snapshot = state.nowcast_store.snapshot(s_id)
+                    if snapshot is not None:
+                        src['nowcast'] = snapshot
+            data['anomalies'] = [s_id for s_id, src in data.get('sources', {}).items()
+                                 if src.get('nowcast', {}).get('anomaly')]
+
+            # Agents in this process: connection health straight from memory
+            for s_id, agent in list(state.camera_agents.items()):
+                if s_id in data.get('sources', {}):
+                    data['sources'][s_id]['health'] = agent.health.snapshot()
+            data['circuit_open'] = [s_id for s_id, src in data.get('sources', {}).items()
+                                    if (src.get('health') or {}).get('state') == 'open']
             
             # Add Monthly Aggregated Stats (Big Data / SQL Source)
             # This allows the dashboard to show "This Month" instead of "Lifetime" if configured
             monthly = get_aggregated_stats(days=30)
             data['global_monthly'] = monthly
-            
-            return jsonify(data)
-        return jsonify({})
+
+            if wants_columnar():
+                data['sources'] = sources_columnar(data.get('sources', {}))
+            return json_response(data)
+        return json_response({})
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
 
+def live_camera_stats():
+    """{camera_id: stats} with current counters (shared live state in web workers, else in-process)."""
+    if state.live_state_reader is not None:
+        live = state.live_state_reader.read_all()
+        if live:
+            return merge_live_stats({}, live)
+    return state.global_stats
+
+def parse_bbox(value):
+    """'west,south,east,north' (Leaflet's toBBoxString order) -> (south, west, north, east)."""
+    try:
+        west, south, east, north = (float(v) for v in value.split(","))
+    except (AttributeError, ValueError):
+        raise ValueError("bbox must be 'west,south,east,north'")
+    if south > north or west > east:
+        raise ValueError("bbox must have south <= north and west <= east")
+    return south, west, north, east
+
+def camera_summary(cam, live):
+    stats = live.get(cam["id"], {})
+    summary = {
+        "id": cam["id"],
+        "name": cam.get("name"),
+        "lat": cam.get("lat"),
+        "lng": cam.get("lng"),
+        "status": stats.get("status", "unknown"),
+        "current_count": stats.get("current_count", 0),
+        "accumulated_count": stats.get("accumulated_count", 0),
+    }
+    if "nowcast" in stats:
+        summary["anomaly"] = stats["nowcast"].get("anomaly", False)
+    return summary
+
+@bp.route("/api/cameras/viewport")
+@timed_route("/api/cameras/viewport")
+def cameras_in_viewport():
+    # Map markers for the visible area only: ?bbox=west,south,east,north
+    try:
+        bounds = parse_bbox(request.args.get("bbox"))
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    index = spatial.index_for(state.CCTV_SOURCES)
+    live = live_camera_stats()
+    cameras = [camera_summary(cam, live) for cam in index.within(*bounds)]
+    return jsonify({"status": "success", "count": len(cameras), "cameras": cameras})
+
+@bp.route("/api/cameras/nearest")
+@timed_route("/api/cameras/nearest")
+def nearest_cameras():
+    # k closest cameras to a point: ?lat=&lng=&k=5
+    lat = spatial.parse_coordinate(request.args.get("lat"))
+    lng = spatial.parse_coordinate(request.args.get("lng"))
+    k = request.args.get("k", 5, type=int)
+    if lat is None or lng is None:
+        return jsonify({"status": "error", "message": "lat and lng are required"}), 400
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        return jsonify({"status": "error", "message": "lat must be within ±90 and lng within ±180"}), 400
+    if not 1 <= k <= SPATIAL_MAX_NEAREST:
+        return jsonify({"status": "error", "message": f"k must be 1-{SPATIAL_MAX_NEAREST}"}), 400
+    index = spatial.index_for(state.CCTV_SOURCES)
+    live = live_camera_stats()
+    cameras = []
+    for distance, cam in index.nearest(lat, lng, k):
+        summary = camera_summary(cam, live)
+        summary["distance_m"] = round(distance, 1)
+        cameras.append(summary)
+    return jsonify({"status": "success", "cameras": cameras})
+
+@bp.route("/api/regions")
+@timed_route("/api/regions")
+def region_aggregates():
+    # Per-region totals (optionally only regions overlapping ?bbox=west,south,east,north)
+    index = spatial.index_for(state.CCTV_SOURCES)
+    regions = index.region_info
+    if request.args.get("bbox"):
+        try:
+            bounds = parse_bbox(request.args.get("bbox"))
+        except ValueError as e:
+            return jsonify({"status": "error", "message": str(e)}), 400
+        regions = {region: regions[region] for region in index.regions_within(*bounds)}
+    live = live_camera_stats()
+    result = []
+    for region, info in regions.items():
+        members = [live.get(cam_id, {}) for cam_id in info["camera_ids"]]
+        result.append({
+            "region": region,
+            "lat": info["lat"],
+            "lng": info["lng"],
+            "bbox": info["bbox"],
+            "cameras": len(members),
+            "online": sum(1 for s in members if s.get("status") == "online"),
+            "current_count": sum(s.get("current_count", 0) for s in members),
+            "accumulated_count": sum(s.get("accumulated_count", 0) for s in members),
+            "anomalies": sum(1 for s in members if s.get("nowcast", {}).get("anomaly")),
+        })
+    return jsonify({"status": "success", "regions": result})
+
+def sources_columnar(sources):
+    """Per-camera stats as parallel arrays (one entry per camera in 'id' order)."""
+    rows = []
+    for s_id, src in sources.items():
+        current = src.get('current_class_counts', {})
+        accumulated = src.get('accumulated_class_counts', {})
+        nowcast = src.get('nowcast') or {}
+        health = src.get('health') or {}
+        rows.append({
+            "id": s_id,
+            "name": src.get('name'),
+            "status": src.get('status'),
+            "last_update": src.get('last_update'),
+            "current_count": src.get('current_count', 0),
+            "current_cars": current.get('0', 0),
+            "current_motors": current.get('1', 0),
+            "accumulated_count": src.get('accumulated_count', 0),
+            "accumulated_cars": accumulated.get('0', 0),
+            "accumulated_motors": accumulated.get('1', 0),
+            "nowcast_rate": nowcast.get('rate_per_hour'),
+            "nowcast_z": nowcast.get('z_score'),
+            "anomaly": nowcast.get('anomaly', False),
+            "health": health.get('state'),
+            "retry_at": health.get('retry_at'),
+        })
+    return to_columnar(rows, SOURCE_FIELDS)
+
+SOURCE_FIELDS = ["id", "name", "status", "last_update", "current_count", "current_cars", "current_motors",
+                 "accumulated_count", "accumulated_cars", "accumulated_motors", "nowcast_rate", "nowcast_z", "anomaly",
+                 "health", "retry_at"]
+
 @bp.route("/api/edit_camera", methods=["POST"])
 def edit_camera():
     try:
@@ -179,20 +428,27 @@ def edit_camera():
             config = json.load(f)
             
         # Update
+        lat, lng = spatial.parse_coordinate(data.get("lat")), spatial.parse_coordinate(data.get("lng"))
+        if lat is None or lng is None or not (-90 <= lat <= 90 and -180 <= lng <= 180):
+            return jsonify({"status": "error", "message": "lat/lng must be valid coordinates"}), 400
+
         updated = False
         for cam in config:
             if cam["id"] == data["id"]:
-                cam["lat"] = data["lat"]
-                cam["lng"] = data["lng"]
+                cam["lat"] = lat
+                cam["lng"] = lng
                 updated = True
                 break
         
         if updated:
             with open(config_path, 'w') as f:
                 json.dump(config, f, indent=4)
-            # Update global
-            # Note: This requires a restart or dynamic reload. 
-            # For now, we just save file.
+            # Apply to the in-memory config and rebuild the map index
+            for cam in state.CCTV_SOURCES:
+                if cam["id"] == data["id"]:
+                    cam["lat"] = lat
+                    cam["lng"] = lng
+            spatial.invalidate()
             return jsonify({"status": "success", "message": "Coordinate updated"})
         else:
             return jsonify({"status": "error", "message": "Camera not found"}), 404
@@ -200,6 +456,65 @@ def edit_camera():
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
 
+@bp.route("/api/roi/<camera_id>")
+def get_roi(camera_id):
+    for cam in CCTV_SOURCES:
+        if cam["id"] == camera_id:
+            return jsonify({"id": camera_id, "roi": cam.get("roi")})
+    return jsonify({"status": "error", "message": "Camera not found"}), 404
+
+@bp.route("/api/edit_roi", methods=["POST"])
+def edit_roi():
+    try:
+        data = request.json
+        # Check auth (same rules as /api/edit_camera)
+        if not data.get('username') or not data.get('password'):
+             return jsonify({"status": "error", "message": "Auth required"}), 401
+
+        # roi: list of polygons in normalized [x, y] coordinates; null/[] clears it
+        roi = data.get("roi") or None
+        if roi is not None:
+            try:
+                roi = validate_polygons(roi)
+            except (ValueError, TypeError) as e:
+                return jsonify({"status": "error", "message": str(e)}), 400
+
+        config_path = os.path.join(DATA_DIR, 'cctv_config.json')
+        with open(config_path, 'r') as f:
+            config = json.load(f)
+
+        updated = False
+        for cam in config:
+            if cam["id"] == data["id"]:
+                if roi is None:
+                    cam.pop("roi", None)
+                else:
+                    cam["roi"] = roi
+                updated = True
+                break
+
+        if not updated:
+            return jsonify({"status": "error", "message": "Camera not found"}), 404
+
+        with open(config_path, 'w') as f:
+            json.dump(config, f, indent=4)
+
+        # Apply immediately to the in-memory config and running agent
+        for cam in CCTV_SOURCES:
+            if cam["id"] == data["id"]:
+                if roi is None:
+                    cam.pop("roi", None)
+                else:
+                    cam["roi"] = roi
+        agent = state.camera_agents.get(data["id"])
+        if agent is not None:
+            agent.set_roi(roi)
+
+        return jsonify({"status": "success", "message": "ROI updated", "roi": roi})
+
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+
 @bp.route("/api/reset_data", methods=["POST"])
 def reset_data():
     # Placeholder for reset functionality mentioned in core memories
@@ -210,120 +525,133 @@ def reset_data():
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
 
+def build_predictions(target_ts, force_scenario=None):
+    """Forecast and congestion decision for every configured camera at target_ts."""
+    # Load active cameras
+    config_path = os.path.join(DATA_DIR, 'cctv_config.json')
+    with open(config_path, 'r') as f:
+        all_cameras = json.load(f)
+        
+    # Thresholds (Dynamic Decision Support) are kept current in memory by the agents
+    threshold_store = state.threshold_store
+    threshold_store.refresh()
+
+    # User requested to update ALL indicators even if a specific camera is selected
+    # So we process ALL cameras regardless of active status or the requested camera_id
+    # This ensures the entire map updates with prediction data
+    cameras_to_process = all_cameras
+    
+    # Seasonal + recent-trend forecast for every camera in one vectorized pass
+    # (cameras without history forecast 0)
+    forecasts = forecast_engine.predict([cam["id"] for cam in cameras_to_process], target_ts)
+
+    predictions = []
+    for cam in cameras_to_process:
+        avg_count = forecasts[cam["id"]]
+        
+        # --- DEMO SCENARIO INJECTION ---
+        if force_scenario == 'high_traffic':
+            # Artificially boost traffic for demo purposes to show decision logic
+            import random
+            avg_count = max(avg_count, random.randint(250, 400))
+        elif force_scenario == 'low_traffic':
+            avg_count = min(avg_count, 50)
+        # -------------------------------
+        
+        # Decision Logic / Rules Engine
+        # Get camera specific thresholds or use defaults
+        cam_thresholds = threshold_store.thresholds(cam["id"])
+        
+        status = "LANCAR"
+        recommendation = "Traffic flow is optimal. Continue standard monitoring."
+        action_icon = "fas fa-check-circle"
+        status_color = "text-green-500" # Tailwind class for UI
+        
+        if avg_count > cam_thresholds["p90"]: 
+            status = "MACET TOTAL"
+            recommendation = "CRITICAL ACTION: 1) Deploy Field Unit to intersection. 2) Override traffic light to manual flush. 3) Notify Traffic Command Center."
+            action_icon = "fas fa-exclamation-triangle"
+            status_color = "text-red-500"
+        elif avg_count > cam_thresholds["p75"]: 
+            status = "MACET"
+            recommendation = "ACTION REQUIRED: 1) Extend Green Light duration by 15s. 2) Display 'Congestion Ahead' on VMS (Variable Message Signs)."
+            action_icon = "fas fa-user-shield"
+            status_color = "text-orange-500"
+        elif avg_count > cam_thresholds["p50"]: 
+            status = "PADAT LANCAR"
+            recommendation = "ADVISORY: Monitor queue length. Prepare to activate diversion protocols if density increases by 10%."
+            action_icon = "fas fa-stopwatch"
+            status_color = "text-yellow-500"
+        
+        predictions.append({
+            "camera_id": cam["id"],
+            "camera_name": cam["name"],
+            "vehicle_count": int(avg_count),
+            "traffic_status": status,
+            "recommendation": recommendation,
+            "action_icon": action_icon,
+            "status_color": status_color
+        })
+    return predictions
+
 @bp.route("/api/predict_traffic", methods=["POST"])
+@timed_route("/api/predict_traffic")
 def predict_traffic():
     try:
         data = request.json
         target_time_str = data.get("target_time")
         
-        # Support legacy single camera request if needed, but priority is full list
-        req_camera_id = data.get("camera_id")
-        
         if target_time_str:
-            from datetime import datetime
-            dt = datetime.fromisoformat(target_time_str)
-            day_of_week = int(dt.strftime('%w')) # 0-6
-            hour = dt.hour
+            target_ts = datetime.datetime.fromisoformat(target_time_str).timestamp()
         else:
-            # Fallback to manual params
+            # Fallback to manual params: the next occurrence of that weekday/hour
             day_of_week = data.get("day_of_week")
             hour = data.get("hour")
+            if day_of_week is None or hour is None:
+                return jsonify({"status": "error", "message": "Missing time parameters"}), 400
+            now = datetime.datetime.now().replace(minute=0, second=0, microsecond=0)
+            days_ahead = (int(day_of_week) - int(now.strftime('%w'))) % 7
+            target = now.replace(hour=int(hour)) + datetime.timedelta(days=days_ahead)
+            if target < now:
+                target += datetime.timedelta(days=7)
+            target_ts = target.timestamp()
 
-        if day_of_week is None or hour is None:
-             return jsonify({"status": "error", "message": "Missing time parameters"}), 400
-
-        # Get list of cameras to predict for
-        cameras_to_process = []
-        if req_camera_id:
-            # Just one
-            # We need the name though, so let's load config anyway
-            pass 
-        
-        # Load active cameras
-        config_path = os.path.join(DATA_DIR, 'cctv_config.json')
-        with open(config_path, 'r') as f:
-            all_cameras = json.load(f)
-            
-        # Load Thresholds (Dynamic Decision Support)
-        thresholds_path = os.path.join(DATA_DIR, 'camera_thresholds.json')
-        thresholds = {}
-        if os.path.exists(thresholds_path):
-            with open(thresholds_path, 'r') as f:
-                thresholds = json.load(f)
-            
-        # User requested to update ALL indicators even if a specific camera is selected
-        # So we process ALL cameras regardless of active status or req_camera_id
-        # This ensures the entire map updates with prediction data
-        cameras_to_process = all_cameras
-        
-        # Note: We trust predict_future_traffic to handle cases with no history gracefully
-
-        # Ensure the requested camera is included (redundant now but kept for safety logic)
-        if req_camera_id:
-             if not any(c["id"] == req_camera_id for c in cameras_to_process):
-                 pass # Already included all
-
-
-        predictions = []
-        
         # Demo/Simulation Mode Check
         force_scenario = data.get("force_scenario")
-        
-        for cam in cameras_to_process:
-            avg_count = predict_future_traffic(cam["id"], int(day_of_week), int(hour))
-            
-            # --- DEMO SCENARIO INJECTION ---
-            if force_scenario == 'high_traffic':
-                # Artificially boost traffic for demo purposes to show decision logic
-                import random
-                avg_count = max(avg_count, random.randint(250, 400))
-            elif force_scenario == 'low_traffic':
-                avg_count = min(avg_count, 50)
-            # -------------------------------
-            
-            # Decision Logic / Rules Engine
-            # Get camera specific thresholds or use defaults
-            cam_thresholds = thresholds.get(cam["id"], {"p50": 100, "p75": 200, "p90": 300})
-            
-            status = "LANCAR"
-            recommendation = "Traffic flow is optimal. Continue standard monitoring."
-            action_icon = "fas fa-check-circle"
-            status_color = "text-green-500" # Tailwind class for UI
-            
-            if avg_count > cam_thresholds["p90"]: 
-                status = "MACET TOTAL"
-                recommendation = "CRITICAL ACTION: 1) Deploy Field Unit to intersection. 2) Override traffic light to manual flush. 3) Notify Traffic Command Center."
-                action_icon = "fas fa-exclamation-triangle"
-                status_color = "text-red-500"
-            elif avg_count > cam_thresholds["p75"]: 
-                status = "MACET"
-                recommendation = "ACTION REQUIRED: 1) Extend Green Light duration by 15s. 2) Display 'Congestion Ahead' on VMS (Variable Message Signs)."
-                action_icon = "fas fa-user-shield"
-                status_color = "text-orange-500"
-            elif avg_count > cam_thresholds["p50"]: 
-                status = "PADAT LANCAR"
-                recommendation = "ADVISORY: Monitor queue length. Prepare to activate diversion protocols if density increases by 10%."
-                action_icon = "fas fa-stopwatch"
-                status_color = "text-yellow-500"
-            
-            predictions.append({
-                "camera_id": cam["id"],
-                "camera_name": cam["name"],
-                "vehicle_count": int(avg_count),
-                "traffic_status": status,
-                "recommendation": recommendation,
-                "action_icon": action_icon,
-                "status_color": status_color
-            })
-        
-        return jsonify({
-            "status": "success",
-            "predictions": predictions,
-            "target_time": target_time_str
-        })
+
+        def compute():
+            body = {
+                "status": "success",
+                "predictions": build_predictions(target_ts, force_scenario),
+                "target_time": target_time_str
+            }
+            # Demo scenarios are randomized, so only real forecasts are cached
+            return CachedBody(dumps(body)), not force_scenario
+
+        # Forecasts are hourly and change with each refit (model version)
+        model = forecast_engine.model
+        key = (target_time_str, int(target_ts // 3600), model.version if model else None, force_scenario)
+        cached = response_cache.get_or_compute(
+            "/api/predict_traffic", key, seconds_to_boundary(3600, max_age=PREDICT_CACHE_TTL), compute,
+            tags=[ALL_CAMERAS]
+        )
+        return cached_response(cached)
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
 
+@bp.route("/api/forecast")
+@timed_route("/api/forecast")
+def forecast_batch():
+    # All cameras over the next N hours (?hours=24), or a weekday x hour grid (?grid=week)
+    grid = request.args.get("grid")
+    if grid not in (None, "week"):
+        return jsonify({"status": "error", "message": "grid must be 'week'"}), 400
+    hours = 168 if grid else request.args.get("hours", 24, type=int)
+    if not 1 <= hours <= FORECAST_MAX_BATCH_HOURS:
+        return jsonify({"status": "error", "message": f"hours must be 1-{FORECAST_MAX_BATCH_HOURS}"}), 400
+    body = forecast_engine.batch_json(state.CCTV_SOURCES, hours, week_grid=bool(grid))
+    return encoded_response(body)
+
 @bp.route("/api/backfill_camera", methods=["POST"])
 def backfill_camera():
     try:
@@ -342,12 +670,58 @@ def backfill_camera():
             return jsonify({"status": "error", "message": "Missing target_id or template_id"}), 400
             
         result = backfill_camera_history(target_id, template_id, hours=days*24, generate_datalake=True, start_date=start_date)
+        notify_data_changed(camera_tag(target_id), "datalake")
         return jsonify(result)
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
 
 @bp.route("/api/datalake/stats")
+@timed_route("/api/datalake/stats")
 def datalake_stats():
     date_str = request.args.get("date")
-    result = get_datalake_stats(date_str)
-    return jsonify(result)
+    # Keyed by the resolved day so "today" does not outlive midnight
+    today = datetime.date.today().isoformat()
+    day = date_str or today
+    ttl = DATALAKE_CACHE_TTL if day == today else DATALAKE_PAST_CACHE_TTL
+
+    def compute():
+        return CachedBody(dumps(get_datalake_stats(date_str))), True
+
+    cached = response_cache.get_or_compute("/api/datalake/stats", day, ttl, compute,
+                                           tags=["datalake"])
+    return cached_response(cached)
+
+@bp.route("/api/datalake/range")
+@timed_route("/api/datalake/range")
+def datalake_range():
+    # Multi-day report: ?start=YYYY-MM-DD&end=YYYY-MM-DD[&camera_id=a,b][&breakdown=daily|hourly]
+    try:
+        start = datetime.date.fromisoformat(request.args.get("start", ""))
+        end = datetime.date.fromisoformat(request.args.get("end") or start.isoformat())
+    except ValueError:
+        return jsonify({"status": "error", "message": "start and end must be YYYY-MM-DD"}), 400
+    if end < start or (end - start).days >= LAKE_MAX_RANGE_DAYS:
+        return jsonify({"status": "error",
+                        "message": f"end must be on or after start, at most {LAKE_MAX_RANGE_DAYS} days"}), 400
+    breakdown = request.args.get("breakdown", "daily")
+    if breakdown not in ("daily", "hourly"):
+        return jsonify({"status": "error", "message": "breakdown must be 'daily' or 'hourly'"}), 400
+    camera_ids = sorted({cam for arg in request.args.getlist("camera_id") for cam in arg.split(",") if cam})
+    columnar = wants_columnar()
+
+    def compute():
+        report = lake_analytics.report(start, end, camera_ids or None, breakdown)
+        if columnar:
+            report["series"] = to_columnar(report["series"], RANGE_FIELDS)
+        return CachedBody(dumps(report)), True
+
+    # Closed days only change through backfills, which invalidate "datalake"
+    ttl = DATALAKE_CACHE_TTL if end >= datetime.date.today() else DATALAKE_PAST_CACHE_TTL
+    key = (start, end, tuple(camera_ids), breakdown, columnar)
+    cached = response_cache.get_or_compute("/api/datalake/range", key, ttl, compute, tags=["datalake"])
+    return cached_response(cached)
+
+@bp.route("/api/metrics")
+def metrics():
+    # Prometheus scrape endpoint (per-stage and per-route latency histograms)
+    return Response(registry.render_prometheus(), mimetype="text/plain; version=0.0.4")
@@ -0,0 +1,175 @@
+import csv
+import datetime
+import os
+import time
+
+from app.config import BACKFILL_CHUNK_DAYS, DATALAKE_AGG_INTERVAL
+from app.database import get_db_connection
+from app.services.datalake import (AGG_FILE_PREFIX, AGG_HEADER, partition_dir, open_compacted,
+                                   read_csv_rows, hour_starts)
+
+# Backfills write aggregated data-lake records (one row per interval instead of
+# one row per synthetic vehicle); get_datalake_stats reads both kinds.
+
+HISTORY_VALUES = "total_count, car_count, motorcycle_count, new_count, new_cars, new_motors"
+
+def utc_offset(ts):
+    """Local UTC offset in seconds at ts (local midnight = UTC midnight - offset)."""
+    return time.localtime(ts).tm_gmtoff
+
+def local_midnight(day):
+    """Timestamp of local midnight of a date (DST-aware, unlike stepping by 86400)."""
+    return datetime.datetime.combine(day, datetime.time.min).timestamp()
+
+def _copy_range(conn, new_id, template_id, chunk_start, chunk_end, start_ts, end_ts):
+    """Same-timestamp copy of the template's rows in [chunk_start, chunk_end) within [start_ts, end_ts]."""
+    conn.execute(f"""
+        INSERT INTO traffic_history (camera_id, timestamp, {HISTORY_VALUES})
+        SELECT ?, timestamp, {HISTORY_VALUES}
+        FROM traffic_history
+        WHERE camera_id = ? AND timestamp >= ? AND timestamp < ? AND timestamp >= ? AND timestamp <= ?
+        ORDER BY timestamp
+    """, (new_id, template_id, chunk_start, chunk_end, start_ts, end_ts))
+
+def _tile_days(conn, new_id, template_id, pattern_end, days, start_ts, end_ts):
+    """
+    Repeat the template's last 24h, by local time of day, over every date in days.
+    Each local hour is placed at that date's own hour start (datalake.hour_starts),
+    so days after a DST change keep their wall-clock times. Rows outside
+    [start_ts, end_ts] are dropped.
+    """
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS backfill_hours (hour INTEGER, hour_start REAL)")
+    conn.execute("DELETE FROM backfill_hours")
+    conn.executemany("INSERT INTO backfill_hours VALUES (?, ?)",
+                     [(hour, ts) for day in days for hour, ts in enumerate(hour_starts(day))])
+    conn.execute(f"""
+        WITH pattern AS (
+            SELECT
+                -- local seconds since midnight; % would truncate the REAL timestamp
+                timestamp + :offset - 86400 * CAST((timestamp + :offset) / 86400 AS INTEGER) AS secs,
+                {HISTORY_VALUES}
+            FROM traffic_history
+            WHERE camera_id = :template AND timestamp > :pattern_end - 86400 AND timestamp <= :pattern_end
+        )
+        INSERT INTO traffic_history (camera_id, timestamp, {HISTORY_VALUES})
+        SELECT :new_id, h.hour_start + (p.secs - 3600 * h.hour) AS ts, {HISTORY_VALUES}
+        FROM backfill_hours h JOIN pattern p ON CAST(p.secs / 3600 AS INTEGER) = h.hour
+        WHERE ts >= :start_ts AND ts <= :end_ts
+        ORDER BY ts
+    """, {
+        "offset": utc_offset(pattern_end), "template": template_id, "pattern_end": pattern_end,
+        "new_id": new_id, "start_ts": start_ts, "end_ts": end_ts,
+    })
+
+def backfill_sql(new_id, template_id, start_ts, end_ts=None, shift_days=False, progress=None,
+                 chunk_days=BACKFILL_CHUNK_DAYS):
+    """
+    Backfill new_id from template_id's rows entirely inside SQLite.
+
+    shift_days=False copies the template's rows in [start_ts, end_ts] as-is.
+    shift_days=True tiles the template's most recent day over every day of the range.
+    Existing rows of new_id in the range are replaced, so reruns do not double count.
+    progress(days_done, days_total) is called after each committed chunk.
+    Returns a summary dict (rows, totals, rowid watermark of the new rows, seconds).
+    """
+    if new_id == template_id:
+        raise ValueError("Target and template must differ")
+    end_ts = end_ts or time.time()
+    started = time.time()
+
+    conn = get_db_connection()
+    try:
+        last_ts = conn.execute(
+            "SELECT MAX(timestamp) FROM traffic_history WHERE camera_id = ?", (template_id,)
+        ).fetchone()[0]
+        if last_ts is None:
+            raise ValueError("Template has no history data")
+
+        conn.execute("DELETE FROM traffic_history WHERE camera_id = ? AND timestamp >= ? AND timestamp <= ?",
+                     (new_id, start_ts, end_ts))
+        conn.commit()
+        first_rowid = (conn.execute("SELECT MAX(id) FROM traffic_history").fetchone()[0] or 0) + 1
+
+        # Chunk by local dates so long ranges report progress and keep transactions short
+        day = datetime.date.fromtimestamp(start_ts)
+        last_day = datetime.date.fromtimestamp(end_ts)
+        total_days = (last_day - day).days + 1
+        done = 0
+        while day <= last_day:
+            next_day = min(day + datetime.timedelta(days=chunk_days), last_day + datetime.timedelta(days=1))
+            if shift_days:
+                days = [day + datetime.timedelta(days=i) for i in range((next_day - day).days)]
+                _tile_days(conn, new_id, template_id, last_ts, days, start_ts, end_ts)
+            else:
+                _copy_range(conn, new_id, template_id, local_midnight(day), local_midnight(next_day),
+                            start_ts, end_ts)
+            conn.commit()
+            done += (next_day - day).days
+            day = next_day
+            if progress:
+                progress(done, total_days)
+
+        row = conn.execute("""
+            SELECT COUNT(*), COALESCE(SUM(new_count), 0), COALESCE(SUM(new_cars), 0),
+                   COALESCE(SUM(new_motors), 0), MAX(id)
+            FROM traffic_history WHERE id >= ? AND camera_id = ?
+        """, (first_rowid, new_id)).fetchone()
+    finally:
+        conn.close()
+
+    return {
+        "rows": row[0], "new_count": row[1], "new_cars": row[2], "new_motors": row[3],
+        "first_rowid": first_rowid, "last_rowid": row[4], "start_ts": start_ts, "end_ts": end_ts,
+        "seconds": time.time() - started,
+    }
+
+def write_datalake_aggregates(camera_id, camera_name, first_rowid, start_ts, end_ts,
+                              interval=DATALAKE_AGG_INTERVAL):
+    """
+    Write per-interval vehicle totals of the rows inserted since first_rowid to
+    daily traffic_agg_<camera>.csv partitions. Rows already in a file for the
+    backfilled range are replaced. Returns the number of records written.
+    """
+    offset = utc_offset(start_ts)
+    conn = get_db_connection()
+    try:
+        rows = conn.execute("""
+            SELECT
+                CAST((timestamp + ?) / ? AS INTEGER) * ? - ? AS interval_start,
+                SUM(new_cars), SUM(new_motors)
+            FROM traffic_history
+            WHERE id >= ? AND camera_id = ?
+            GROUP BY interval_start
+            ORDER BY interval_start
+        """, (offset, interval, interval, offset, first_rowid, camera_id)).fetchall()
+    finally:
+        conn.close()
+
+    by_day = {}
+    for interval_start, cars, motors in rows:
+        dt = datetime.datetime.fromtimestamp(interval_start)
+        by_day.setdefault((dt.year, dt.month, dt.day), []).append(
+            [interval_start, camera_id, camera_name, interval, cars, motors, cars + motors]
+        )
+
+    written = 0
+    for (year, month, day), records in by_day.items():
+        base = partition_dir(datetime.date(year, month, day))
+        os.makedirs(base, exist_ok=True)
+        fp = os.path.join(base, f"{AGG_FILE_PREFIX}{camera_id}.csv")
+        if os.path.isfile(fp):
+            existing = read_csv_rows(fp, "agg")
+        else:
+            # Compacted day: the loose file starts from the compacted aggregates and replaces them
+            compacted = open_compacted(base)
+            existing = [] if compacted is None else \
+                (row for _, row in compacted.read_blocks(compacted.blocks(camera_id, ("agg",))))
+        kept = [r for r in existing if not (start_ts - interval < float(r[0]) <= end_ts)]
+        merged = sorted(kept + records, key=lambda r: float(r[0]))
+        with open(fp + ".tmp", "w", newline="") as f:
+            w = csv.writer(f)
+            w.writerow(AGG_HEADER)
+            w.writerows(merged)
+        os.replace(fp + ".tmp", fp)
+        written += len(records)
+    return written
@@ -0,0 +1,115 @@
+import threading
+import time
+
+from app.config import LIVE_FRAME_FILE, STREAM_POLL_SECONDS, STREAM_MIN_FRAME_INTERVAL, STREAM_IDLE_SECONDS
+from app.services.live_state import FrameSlotReader
+import app.globals as g
+
+# Shared MJPEG fan-out for /video_feed.
+#
+# One poller per process reads the frame slot (published by the ingest side)
+# and builds each multipart chunk once; every viewer of that camera just waits
+# on a condition and writes the shared bytes. Viewers never encode, poll or
+# busy-wait, so under gevent (serve.py) they are parked greenlets and under a
+# threaded server they are sleeping threads.
+
+class FrameBroadcaster:
+    def __init__(self, path=LIVE_FRAME_FILE):
+        self.path = path
+        self._reader = None
+        self._cond = threading.Condition()
+        self._frames = {}            # camera_id -> (seq, multipart chunk)
+        self._viewers = {}           # camera_id -> number of open streams
+        self._thread = None
+        self._running = True
+
+    def _ensure_poller(self):
+        # Called with self._cond held
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._poll_loop, name="frame-broadcaster", daemon=True)
+            self._thread.start()
+
+    def _poll_loop(self):
+        idle_since = None
+        while self._running:
+            with self._cond:
+                watched = [cam_id for cam_id, n in self._viewers.items() if n > 0]
+                if not watched:
+                    idle_since = idle_since or time.time()
+                    if time.time() - idle_since > STREAM_IDLE_SECONDS:
+                        self._thread = None
+                        return
+                else:
+                    idle_since = None
+            if watched:
+                self._poll(watched)
+            time.sleep(STREAM_POLL_SECONDS)
+
+    def _poll(self, watched):
+        if self._reader is None:
+            self._reader = FrameSlotReader(self.path)
+        seq, camera_id, jpeg = self._reader.read()
+        if not jpeg or camera_id not in watched:
+            return
+        with self._cond:
+            current = self._frames.get(camera_id)
+            if current is not None and current[0] == seq:
+                return
+            chunk = b'--frame\r\nContent-Type: image/jpeg\r\n\r\n' + jpeg + b'\r\n'
+            self._frames[camera_id] = (seq, chunk)
+            self._cond.notify_all()
+
+    def _request_view(self, camera_id):
+        """Make the ingest side render this camera into the frame slot."""
+        if g.live_state_reader is not None:
+            g.live_state_reader.request_view(camera_id)
+            return
+        # Agents in this process
+        for src in g.CCTV_SOURCES:
+            if src["id"] == camera_id:
+                g.VIDEO_SOURCE = src["url"]
+                if g.camera_scheduler is not None:
+                    g.camera_scheduler.promote(camera_id)
+                break
+
+    def stream(self, camera_id):
+        """Multipart MJPEG chunks for one viewer; ends when the viewer disconnects or on stop()."""
+        with self._cond:
+            self._viewers[camera_id] = self._viewers.get(camera_id, 0) + 1
+            self._ensure_poller()
+        self._request_view(camera_id)
+        last_seq = None
+        try:
+            while self._running:
+                with self._cond:
+                    self._cond.wait_for(
+                        lambda: not self._running or self._frames.get(camera_id, (last_seq,))[0] != last_seq,
+                        timeout=1.0
+                    )
+                    frame = self._frames.get(camera_id)
+                if not self._running:
+                    return
+                if frame is None or frame[0] == last_seq:
+                    continue
+                last_seq = frame[0]
+                yield frame[1]
+                # Viewers never get more than one frame per STREAM_MIN_FRAME_INTERVAL
+                time.sleep(STREAM_MIN_FRAME_INTERVAL)
+        finally:
+            with self._cond:
+                self._viewers[camera_id] -= 1
+                if self._viewers[camera_id] <= 0:
+                    del self._viewers[camera_id]
+                    self._frames.pop(camera_id, None)
+
+    def viewer_count(self):
+        with self._cond:
+            return sum(self._viewers.values())
+
+    def stop(self):
+        """End every open stream (graceful shutdown)."""
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+
+broadcaster = FrameBroadcaster()
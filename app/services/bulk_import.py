@@ -0,0 +1,434 @@
+import csv
+import datetime
+import gzip
+import hashlib
+import json
+import operator
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+
+from app.config import IMPORT_CHECKPOINT_DIR, IMPORT_SEGMENT_ROWS, IMPORT_BATCH_ROWS
+from app.database import DB_PATH, init_db
+from app.services.response_cache import notify_data_changed, camera_tag
+
+# Bulk import of history rows into traffic_history.
+#
+# Inputs are parsed as streams (no json.load of the whole file) and loaded one
+# segment at a time: rows go into an unindexed TEMP staging table, the staging
+# key index is built once, then deduplicated rows are merged into
+# traffic_history in (camera_id, timestamp) order inside the same transaction.
+# Each committed segment is checkpointed, so an interrupted import resumes
+# where it stopped, and dedupe on (camera_id, timestamp) makes reruns harmless.
+# CSVs from /api/export carry the exact epoch in "Unix Timestamp"; older exports
+# only have second-precision local time and are matched on whole seconds.
+
+HISTORY_COLUMNS = ["camera_id", "timestamp", "total_count", "car_count", "motorcycle_count",
+                   "new_count", "new_cars", "new_motors"]
+
+# Timestamps staged as text are converted by SQLite, which can land one ulp
+# away from Python's float(); duplicates are matched within this many seconds
+TS_EPSILON = 1e-6
+
+# --- Input readers: each yields tuples in HISTORY_COLUMNS order ---
+
+_WS = re.compile(r"[ \t\r\n]*")
+
+class JsonStream:
+    """
+    Minimal pull parser over a text stream. Containers we care about are walked
+    with items()/elements(); everything else is decoded with raw_decode one
+    value at a time, so memory is bounded by the largest single value.
+    """
+
+    def __init__(self, f, chunk_size=1 << 20):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self):
+        chunk = self.f.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        while True:
+            self.pos = _WS.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, ch):
+        if self.peek() != ch:
+            raise ValueError(f"Expected '{ch}' near: {self.buf[self.pos:self.pos + 40]!r}")
+        self.pos += 1
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                obj, end = self.decoder.raw_decode(self.buf, self.pos)
+                # A number ending exactly at the buffer edge may continue in the next chunk
+                if end < len(self.buf) or self.eof:
+                    self.pos = end
+                    return obj
+            except ValueError:
+                if self.eof:
+                    raise
+            self._fill()
+
+    def _members(self, open_ch, close_ch, keyed):
+        self.expect(open_ch)
+        if self.peek() == close_ch:
+            self.pos += 1
+            return
+        while True:
+            if keyed:
+                key = self.value()
+                self.expect(":")
+                yield key
+            else:
+                yield None
+            ch = self.peek()
+            self.pos += 1
+            if ch == close_ch:
+                return
+            if ch != ",":
+                raise ValueError(f"Expected ',' or '{close_ch}', got {ch!r}")
+
+    def array_values(self):
+        """Decode an array's elements one by one (the hot path for history lists)."""
+        self.expect("[")
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        decode = self.decoder.raw_decode
+        while True:
+            try:
+                obj, end = decode(self.buf, self.pos)
+            except ValueError:
+                end = None
+            if end is None or (end >= len(self.buf) and not self.eof):
+                if not self._fill():
+                    raise ValueError("Truncated JSON array")
+                continue
+            self.pos = end
+            ch = self.peek()
+            self.pos += 1
+            yield obj
+            if ch == "]":
+                return
+            if ch != ",":
+                raise ValueError(f"Expected ',' or ']', got {ch!r}")
+            self.peek()
+
+    def items(self):
+        """Iterate an object's keys; the caller must consume each value."""
+        return self._members("{", "}", True)
+
+    def elements(self):
+        """Iterate an array; the caller must consume each element."""
+        return self._members("[", "]", False)
+
+def _camera_rows(stream, cam_id):
+    if stream.peek() != "{":
+        stream.value()
+        return
+    for key in stream.items():
+        if key == "history" and stream.peek() == "[":
+            for item in stream.array_values():
+                if isinstance(item, dict) and item.get("ts") is not None:
+                    get = item.get
+                    yield (cam_id, item["ts"], get("count", 0), get("cars", 0), get("motors", 0),
+                           get("new_count", 0), get("new_cars", 0), get("new_motors", 0))
+        else:
+            stream.value()
+
+def iter_stats_json(f):
+    """traffic_stats.json, v2 ({"sources": {...}}) or legacy flat ({camera_id: {...}})."""
+    stream = JsonStream(f)
+    for key in stream.items():
+        if key == "sources":
+            for cam_id in stream.items():
+                yield from _camera_rows(stream, cam_id)
+        elif stream.peek() == "{":
+            # Legacy layout; non-camera objects (global_total, ...) simply have no history
+            yield from _camera_rows(stream, key)
+        else:
+            stream.value()
+
+def iter_ndjson(f):
+    """One object per line: /api/export NDJSON, or history items with a camera_id."""
+    for line in f:
+        if not line.strip():
+            continue
+        rec = json.loads(line)
+        ts = rec.get("ts", rec.get("timestamp"))
+        if ts is None or not rec.get("camera_id"):
+            continue
+        yield (
+            rec["camera_id"],
+            float(ts),
+            rec.get("total_count", rec.get("count", 0)),
+            rec.get("car_count", rec.get("cars", 0)),
+            rec.get("motorcycle_count", rec.get("motors", 0)),
+            rec.get("new_count", 0),
+            rec.get("new_cars", 0),
+            rec.get("new_motors", 0),
+        )
+
+# CSV headers accepted besides the raw column names (the /api/export CSV layout)
+CSV_ALIASES = {
+    "Camera ID": "camera_id", "Total Count": "total_count", "Car Count": "car_count",
+    "Motorcycle Count": "motorcycle_count", "New Count": "new_count", "New Cars": "new_cars",
+    "New Motors": "new_motors", "Unix Timestamp": "timestamp",
+}
+
+def csv_whole_seconds(f):
+    """
+    True for CSVs whose only time column is the export's local-time 'Timestamp'
+    (exports made before it gained 'Unix Timestamp'). Those times are cut to the
+    second, so they are deduplicated against whole seconds of the stored rows.
+    """
+    header = next(csv.reader(f), None) or []
+    return "timestamp" not in (CSV_ALIASES.get(h, h) for h in header)
+
+def iter_csv(f):
+    reader = csv.reader(f)
+    header = next(reader, None)
+    if not header:
+        return
+    columns = [CSV_ALIASES.get(h, h) for h in header]
+    index = {name: i for i, name in enumerate(columns)}
+    if "camera_id" not in index or ("timestamp" not in index and "Timestamp" not in index):
+        raise ValueError("CSV needs camera_id and timestamp (or the export's 'Camera ID'/'Timestamp') columns")
+    count_idx = [index.get(name) for name in HISTORY_COLUMNS[2:]]
+    cam_i = index["camera_id"]
+    if "timestamp" in index and None not in count_idx:
+        # Raw column layout: pass the text through; the staging table's column
+        # affinity and the CASTs in _merge_segment convert it in C
+        pick = operator.itemgetter(cam_i, index["timestamp"], *count_idx)
+        for rec in reader:
+            if rec:
+                yield pick(rec)
+        return
+    if "timestamp" in index:
+        ts_i = index["timestamp"]
+        parse_ts = float
+    else:
+        # Export CSV: local-time text
+        ts_i = index["Timestamp"]
+        parse_ts = lambda s: datetime.datetime.strptime(s, "%Y-%m-%d %H:%M:%S").timestamp()
+    for rec in reader:
+        if not rec:
+            continue
+        yield (rec[cam_i], parse_ts(rec[ts_i]),
+               *[int(rec[i] or 0) if i is not None else 0 for i in count_idx])
+
+READERS = {"stats": iter_stats_json, "ndjson": iter_ndjson, "csv": iter_csv}
+
+def detect_format(path):
+    name = path[:-3] if path.endswith(".gz") else path
+    if name.endswith(".csv"):
+        return "csv"
+    if name.endswith((".ndjson", ".jsonl")):
+        return "ndjson"
+    return "stats"
+
+def open_text(path):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8", newline="")
+    return open(path, "r", encoding="utf-8", newline="")
+
+# --- Checkpoints ---
+
+def _checkpoint_path(source):
+    digest = hashlib.sha1(os.path.abspath(source).encode("utf-8")).hexdigest()[:16]
+    return os.path.join(IMPORT_CHECKPOINT_DIR, f"{digest}.json")
+
+def load_checkpoint(source):
+    """Progress of a previous import of this exact file (same size and mtime), or None."""
+    path = _checkpoint_path(source)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r') as f:
+        checkpoint = json.load(f)
+    stat = os.stat(source)
+    if checkpoint.get("size") != stat.st_size or checkpoint.get("mtime") != stat.st_mtime:
+        return None
+    return checkpoint
+
+def save_checkpoint(source, rows_read, rows_inserted, complete=False):
+    os.makedirs(IMPORT_CHECKPOINT_DIR, exist_ok=True)
+    stat = os.stat(source)
+    path = _checkpoint_path(source)
+    with open(path + ".tmp", 'w') as f:
+        json.dump({
+            "source": os.path.abspath(source), "size": stat.st_size, "mtime": stat.st_mtime,
+            "rows_read": rows_read, "rows_inserted": rows_inserted, "complete": complete,
+            "updated": time.time()
+        }, f)
+    os.replace(path + ".tmp", path)
+
+# --- Loader ---
+
+def _connect():
+    conn = sqlite3.connect(DB_PATH, isolation_level=None)
+    # Relaxed durability for the load: a killed import loses at most the open
+    # segment, which the checkpoint makes it redo
+    conn.execute("PRAGMA synchronous = OFF")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    conn.execute("PRAGMA cache_size = -262144")  # 256 MB
+    conn.execute("""
+        CREATE TEMP TABLE import_staging (
+            camera_id TEXT, timestamp REAL, total_count INTEGER, car_count INTEGER,
+            motorcycle_count INTEGER, new_count INTEGER, new_cars INTEGER, new_motors INTEGER
+        )
+    """)
+    conn.execute("CREATE TEMP TABLE import_overlap (camera_id TEXT PRIMARY KEY)")
+    return conn
+
+def _merge_segment(conn, rows, whole_seconds=False):
+    """
+    Stage one segment and merge its new rows. Returns the number inserted.
+    whole_seconds: staged timestamps are truncated to the second, so any stored
+    row of the camera within [ts, ts + 1) counts as the same row.
+    """
+    # Stored rows within [ts - before, ts + after) are the same row
+    before, after = (0, 1) if whole_seconds else (TS_EPSILON, TS_EPSILON)
+    conn.execute("BEGIN")
+    try:
+        conn.execute("DELETE FROM import_staging")
+        for start in range(0, len(rows), IMPORT_BATCH_ROWS):
+            conn.executemany("INSERT INTO import_staging VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                             rows[start:start + IMPORT_BATCH_ROWS])
+        # One sorted index build instead of per-row maintenance while staging
+        conn.execute("CREATE INDEX temp.import_staging_key ON import_staging (camera_id, timestamp)")
+
+        # Only cameras whose staged time range already has rows need per-row duplicate probes
+        conn.execute("DELETE FROM import_overlap")
+        ranges = conn.execute(
+            "SELECT camera_id, MIN(timestamp), MAX(timestamp) FROM import_staging GROUP BY camera_id"
+        ).fetchall()
+        for cam_id, lo, hi in ranges:
+            if conn.execute("""
+                SELECT EXISTS (SELECT 1 FROM traffic_history
+                               WHERE camera_id = ? AND timestamp BETWEEN CAST(? AS REAL) - ? AND CAST(? AS REAL) + ?)
+            """, (cam_id, lo, before, hi, after)).fetchone()[0]:
+                conn.execute("INSERT INTO import_overlap VALUES (?)", (cam_id,))
+
+        cols = ", ".join(HISTORY_COLUMNS)
+        counts = ", ".join(f"CAST({c} AS INTEGER)" for c in HISTORY_COLUMNS[2:])
+        changes = conn.total_changes
+        conn.execute(f"""
+            INSERT INTO traffic_history ({cols})
+            SELECT camera_id, CAST(timestamp AS REAL), {counts} FROM import_staging s
+            WHERE s.camera_id NOT IN (SELECT camera_id FROM import_overlap)
+               OR NOT EXISTS (
+                   SELECT 1 FROM traffic_history t
+                   WHERE t.camera_id = s.camera_id
+                     AND t.timestamp >= CAST(s.timestamp AS REAL) - :before
+                     AND t.timestamp < CAST(s.timestamp AS REAL) + :after
+               )
+            -- Walks the staging index: drops in-file duplicates and yields key order
+            GROUP BY camera_id, timestamp
+        """, {"before": before, "after": after})
+        inserted = conn.total_changes - changes
+        conn.execute("DROP INDEX temp.import_staging_key")
+        conn.execute("COMMIT")
+        return inserted
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+def _read_segments(rows, skip, segment_rows, out):
+    """Producer thread: parse ahead while the previous segment is being merged."""
+    try:
+        segment = []
+        for i, row in enumerate(rows):
+            if i < skip:
+                continue
+            segment.append(row)
+            if len(segment) >= segment_rows:
+                out.put(segment)
+                segment = []
+        if segment:
+            out.put(segment)
+        out.put(None)
+    except Exception as e:
+        out.put(e)
+
+def import_file(source, fmt=None, segment_rows=IMPORT_SEGMENT_ROWS, resume=True,
+                progress=None):
+    """
+    Import one file into traffic_history. Returns a summary dict with rows
+    read/inserted and throughput. progress(rows_read, rows_inserted) is called
+    after every committed segment.
+    """
+    fmt = fmt or detect_format(source)
+    if fmt not in READERS:
+        raise ValueError(f"Unknown import format '{fmt}' (choose from {', '.join(READERS)})")
+
+    checkpoint = load_checkpoint(source) if resume else None
+    if checkpoint and checkpoint.get("complete"):
+        return {"source": source, "rows_read": checkpoint["rows_read"], "rows_inserted": 0,
+                "skipped": True, "seconds": 0.0, "rows_per_sec": 0.0}
+    skip = checkpoint["rows_read"] if checkpoint else 0
+    rows_read = skip
+    rows_inserted = checkpoint["rows_inserted"] if checkpoint else 0
+
+    whole_seconds = False
+    if fmt == "csv":
+        with open_text(source) as f:
+            whole_seconds = csv_whole_seconds(f)
+
+    init_db()
+    conn = _connect()
+    started = time.time()
+    try:
+        with open_text(source) as f:
+            # Parsing holds the GIL while SQLite mostly releases it, so the two overlap
+            segments = queue.Queue(maxsize=1)
+            reader = threading.Thread(target=_read_segments, name="import-reader", daemon=True,
+                                      args=(READERS[fmt](f), skip, segment_rows, segments))
+            reader.start()
+            while True:
+                segment = segments.get()
+                if segment is None:
+                    break
+                if isinstance(segment, Exception):
+                    raise segment
+                inserted = _merge_segment(conn, segment, whole_seconds)
+                if inserted:
+                    # Cached history/forecasts of these cameras are stale now
+                    notify_data_changed(*{camera_tag(row[0]) for row in segment})
+                rows_inserted += inserted
+                rows_read += len(segment)
+                save_checkpoint(source, rows_read, rows_inserted)
+                if progress:
+                    progress(rows_read, rows_inserted)
+            reader.join()
+        save_checkpoint(source, rows_read, rows_inserted, complete=True)
+        if progress:
+            progress(rows_read, rows_inserted)
+        conn.execute("PRAGMA optimize")
+    finally:
+        conn.close()
+
+    seconds = time.time() - started
+    processed = rows_read - skip
+    return {
+        "source": source, "rows_read": rows_read, "rows_inserted": rows_inserted, "skipped": False,
+        "resumed_from": skip, "seconds": seconds, "rows_per_sec": processed / seconds if seconds else 0.0
+    }
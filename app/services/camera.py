@@ -6,33 +6,82 @@ import os
 import datetime
 import math
 import random
+import numpy as np
 from collections import deque
-from ultralytics import YOLO
 
 from app.config import (
-    YOLO_MODEL_PATH, CONF_THRESHOLD, IOU_THRESHOLD, 
-    VEHICLE_CLASSES, CLASS_MAPPING, CLASS_CAR, CLASS_MOTORCYCLE,
-    PROCESS_INTERVAL, HISTORY_MAX_LEN
+    DETECTOR_BACKEND, CLASS_MAPPING, CLASS_CAR, CLASS_MOTORCYCLE,
+    PROCESS_INTERVAL, HISTORY_MAX_LEN, CAMERA_SCHEDULER,
+    INFERENCE_WORKERS, INFERENCE_PROCESSES, INFERENCE_TIMEOUT, SERVICE_ROLE,
+    MOTION_GATE_ENABLED, MOTION_GATE_THRESHOLD,
+    CASCADE_ENABLED, CASCADE_SMALL_BACKEND, CASCADE_SMALL_MODEL_PATH, DATA_LAKE_PATH,
+    CAMERA_OPEN_TIMEOUT_MS, CAMERA_READ_TIMEOUT_MS
 )
 import app.globals as g
-from app.utils import save_stats
+from app.utils import save_stats, load_stats, sync_stats_with_config, acquire_ingest_lock
 from app.database import insert_history_batch
+from app.services.metrics import stage_timer, registry
+from app.services.scheduler import CameraScheduler
+from app.services.inference import InferenceProcessPool, EMPTY_DETECTIONS, YOLO_INFER_KWARGS
+from app.services.detectors import create_detector
+from app.services.live_state import LiveStateWriter, FrameSlotWriter
+from app.services.motion import MotionGate
+from app.services.roi import RegionOfInterest, scaled_imgsz
+from app.services.cascade import CascadePolicy
+from app.services.nowcast import NowcastStore
+from app.services.broadcast import broadcaster
+from app.services.datalake import partition_dir, RAW_FILE_PREFIX, RAW_HEADER
+from app.services.clock import system_clock
+from app.services.health import CameraHealth, connect_slots, CLOSED, OPEN, HEALTH_CODES
 
-# Data Lake Configuration
-DATA_LAKE_PATH = "/var/www/vehicle-counter/data_lake/raw"
+# Stream timeouts are passed to each VideoCapture. OpenCV builds without these
+# properties only read the process-wide FFmpeg options, so set those once here.
+if hasattr(cv2, "CAP_PROP_OPEN_TIMEOUT_MSEC"):
+    CAPTURE_PARAMS = [cv2.CAP_PROP_OPEN_TIMEOUT_MSEC, CAMERA_OPEN_TIMEOUT_MS,
+                      cv2.CAP_PROP_READ_TIMEOUT_MSEC, CAMERA_READ_TIMEOUT_MS]
+else:
+    CAPTURE_PARAMS = None
+    os.environ.setdefault("OPENCV_FFMPEG_CAPTURE_OPTIONS", f"timeout;{CAMERA_OPEN_TIMEOUT_MS * 1000}")
+
+def open_capture(url):
+    if CAPTURE_PARAMS is None:
+        return cv2.VideoCapture(url)
+    return cv2.VideoCapture(url, cv2.CAP_FFMPEG, CAPTURE_PARAMS)
 
 class CameraAgent(threading.Thread):
-    def __init__(self, source_config, model_ref):
+    # Seconds (by self.clock) between traffic_stats.json saves
+    SAVE_INTERVAL = 60
+    # Print one "Count:" line per processed frame
+    LOG_CYCLES = True
+
+    def __init__(self, source_config, model_ref, clock=None, rng=None):
         threading.Thread.__init__(self)
         self.source_id = source_config["id"]
         self.source_name = source_config["name"]
         self.source_url = source_config["url"]
         self.mirror_id = source_config.get("mirror_id")
+        self.interval = source_config.get("interval", PROCESS_INTERVAL)
+        self.priority = source_config.get("priority", 0)
         self.model = model_ref
         self.running = True
         self.daemon = True
-        self.last_save_time = time.time()
+        # Injectable for replays: wall clock and the global RNG by default
+        self.clock = clock or system_clock
+        self.rng = rng or random
+        self.datalake_root = DATA_LAKE_PATH
+        self.health = CameraHealth(rng=self.rng)
+        self.last_save_time = self.clock.time()
         self.prev_rects = [] # Store previous frame detections for static object filtering
+        self.last_detections = EMPTY_DETECTIONS
+        self.cascade = CascadePolicy.for_camera(source_config) if CASCADE_ENABLED else None
+        self.roi = None
+        try:
+            self.roi = RegionOfInterest.from_config(source_config.get("roi"))
+        except ValueError as e:
+            print(f"[WARN] {self.source_name}: invalid ROI ignored: {e}")
+        # Per-camera override: "motion_threshold": 0 disables the gate for that camera
+        motion_threshold = source_config.get("motion_threshold", MOTION_GATE_THRESHOLD)
+        self.motion_gate = MotionGate(threshold=motion_threshold) if MOTION_GATE_ENABLED and motion_threshold > 0 else None
         
         # Initialize stats for this camera if not exists
         if self.source_id not in g.global_stats:
@@ -51,6 +100,94 @@ class CameraAgent(threading.Thread):
             if "history" not in g.global_stats[self.source_id]:
                 g.global_stats[self.source_id]["history"] = deque(maxlen=HISTORY_MAX_LEN)
 
+    def timer(self, stage):
+        """Latency timer for one pipeline stage of this camera (see /api/metrics)."""
+        return stage_timer(stage, self.source_id, self.source_name)
+
+    def set_roi(self, roi_config):
+        """Replace the ROI polygons (None clears them). Takes effect on the next cycle."""
+        self.roi = RegionOfInterest.from_config(roi_config)
+        # Gate reference was taken on the old crop
+        if self.motion_gate is not None:
+            self.motion_gate.reference = None
+
+    def detect(self, frame, stage="large", **overrides):
+        """
+        Run vehicle detection on a frame with the large model (or the cascade's
+        "small" model). Returns an (N, 6) array of [x1, y1, x2, y2, conf, coco_class],
+        empty if inference failed.
+        """
+        try:
+            return self.run_detector(frame, stage, **overrides)
+        except Exception as e:
+            print(f"[ERROR] Inference failed for {self.source_name}: {e}")
+            return EMPTY_DETECTIONS
+
+    def run_detector(self, frame, stage="large", **overrides):
+        """Like detect(), but inference errors and pool timeouts propagate."""
+        timer_stage = "inference" if stage == "large" else "inference_small"
+        if g.inference_pool is not None:
+            # Out-of-process workers: no model lock, the GIL stays free for HTTP
+            with self.timer(timer_stage):
+                return g.inference_pool.detect(frame, timeout=INFERENCE_TIMEOUT, stage=stage, **overrides)
+
+        if stage == "large":
+            model, lock = self.model, g.model_lock
+        else:
+            model, lock = g.small_model_instance, g.small_model_lock
+
+        if model.thread_safe:
+            # Exported-graph runtimes handle concurrent calls themselves
+            with self.timer(timer_stage):
+                return model.detect(frame, **overrides)
+
+        # In-process shared model (Protected by Lock)
+        with self.timer("model_lock_wait"):
+            lock.acquire()
+        try:
+            with self.timer(timer_stage):
+                return model.detect(frame, **overrides)
+        finally:
+            lock.release()
+
+    def detect_cascade(self, image, **overrides):
+        """Small model first; escalate to the large model only when the policy asks for it."""
+        if self.cascade is None:
+            return self.detect(image, **overrides)
+
+        # No TTA for the cheap first pass
+        try:
+            detections = self.run_detector(image, stage="small", **dict(overrides, augment=False))
+        except Exception as e:
+            # An empty result would count 0 vehicles; let the large model see the frame
+            print(f"[WARN] Small model failed for {self.source_name}, escalating: {e!r}")
+            reason = "small_failed"
+        else:
+            reason = self.cascade.decide(detections)
+        registry.inc("camera_cascade_frames_total", 1, "Frames by cascade outcome",
+                     camera_id=self.source_id, camera=self.source_name,
+                     result="escalated" if reason else "small_only", reason=reason or "none")
+        if reason:
+            detections = self.detect(image, **overrides)
+        return detections
+
+    def detect_region(self, frame, region, offset):
+        """
+        Detect inside the ROI crop only, then map boxes back to frame coordinates
+        and drop those whose center falls outside the polygons.
+        """
+        if self.roi is None:
+            return self.detect_cascade(frame)
+        imgsz = scaled_imgsz(region.shape, frame.shape, YOLO_INFER_KWARGS["imgsz"])
+        detections = self.detect_cascade(region, imgsz=imgsz)
+        detections = self.roi.to_frame_coords(detections, offset)
+        return self.roi.filter(detections, frame.shape)
+
+    def publish_live(self):
+        """Push this camera's counters to the shared live-state table (ingest role)."""
+        if g.live_state_writer is not None:
+            g.live_state_writer.publish(self.source_id, g.global_stats[self.source_id])
+
     def log_to_datalake(self, detections, timestamp):
         """
         Simulate Big Data Ingestion:
@@ -59,10 +196,10 @@ class CameraAgent(threading.Thread):
         """
         try:
             dt = datetime.datetime.fromtimestamp(timestamp)
-            partition_path = os.path.join(DATA_LAKE_PATH, str(dt.year), f"{dt.month:02d}", f"{dt.day:02d}")
+            partition_path = partition_dir(dt.date(), self.datalake_root)
             os.makedirs(partition_path, exist_ok=True)
             
-            filename = f"traffic_log_{self.source_id}.csv"
+            filename = f"{RAW_FILE_PREFIX}{self.source_id}.csv"
             filepath = os.path.join(partition_path, filename)
             
             file_exists = os.path.isfile(filepath)
@@ -70,7 +207,7 @@ class CameraAgent(threading.Thread):
             with open(filepath, 'a', newline='') as f:
                 writer = csv.writer(f)
                 if not file_exists:
-                    writer.writerow(["timestamp", "source_id", "source_name", "class_id", "confidence", "bbox"])
+                    writer.writerow(RAW_HEADER)
                 
                 for det in detections:
                     # det = (class_id, confidence, [x1, y1, x2, y2])
@@ -85,6 +222,10 @@ class CameraAgent(threading.Thread):
         except Exception as e:
             print(f"[ERROR] Data Lake Write Failed: {e}")
 
+    def write_history(self, records):
+        """Persist history rows (camera_id, ts, counts...) to SQLite. Returns the last rowid."""
+        return insert_history_batch(records)
+
     def get_iou(self, boxA, boxB):
         # Determine the (x, y)-coordinates of the intersection rectangle
         xA = max(boxA[0], boxB[0])
@@ -108,7 +249,7 @@ class CameraAgent(threading.Thread):
         Returns a multiplier to simulate realistic traffic patterns based on time of day.
         Used to augment the base video detection count for demo purposes.
         """
-        now = datetime.datetime.now()
+        now = self.clock.now()
         hour = now.hour + now.minute / 60.0
         
         # Base multiplier (Video might have 5-10 cars, we want at least that)
@@ -129,46 +270,62 @@ class CameraAgent(threading.Thread):
             mult = 0.5
             
         # Random fluctuation (+/- 20%)
-        mult *= random.uniform(0.8, 1.2)
+        mult *= self.rng.uniform(0.8, 1.2)
         
         return max(0.5, mult)
 
-    def run(self):
-        print(f"[INFO] Started Agent for {self.source_name}")
-        
-        while self.running:
-            # Mirror Mode: Copy stats from another source if configured
-            if self.mirror_id and self.mirror_id in g.global_stats:
-                mirrored = g.global_stats[self.mirror_id]
-                stats = g.global_stats[self.source_id]
-                # Copy current and accumulated stats
-                stats["current_count"] = mirrored.get("current_count", 0)
-                stats["current_class_counts"] = mirrored.get("current_class_counts", {str(CLASS_CAR): 0, str(CLASS_MOTORCYCLE): 0})
-                stats["accumulated_count"] = mirrored.get("accumulated_count", 0)
-                stats["accumulated_class_counts"] = mirrored.get("accumulated_class_counts", {str(CLASS_CAR): 0, str(CLASS_MOTORCYCLE): 0})
-                # Copy history reference for consistent charts
-                if "history" in mirrored:
-                    stats["history"] = mirrored["history"]
-                # OSD/Frame update is skipped in mirror mode
-                time.sleep(PROCESS_INTERVAL)
-                continue
-            
-            # 1. Connect & Snapshot
-            # Set timeout for FFmpeg (20 seconds - increased for slow streams)
-            os.environ["OPENCV_FFMPEG_CAPTURE_OPTIONS"] = "timeout;20000"
-            
-            cap = None
+    def is_mirror(self):
+        return bool(self.mirror_id and self.mirror_id in g.global_stats)
+
+    def mirror_step(self):
+        """Mirror Mode: Copy stats from another source if configured"""
+        mirrored = g.global_stats[self.mirror_id]
+        stats = g.global_stats[self.source_id]
+        # Copy current and accumulated stats
+        stats["current_count"] = mirrored.get("current_count", 0)
+        stats["current_class_counts"] = mirrored.get("current_class_counts", {str(CLASS_CAR): 0, str(CLASS_MOTORCYCLE): 0})
+        stats["accumulated_count"] = mirrored.get("accumulated_count", 0)
+        stats["accumulated_class_counts"] = mirrored.get("accumulated_class_counts", {str(CLASS_CAR): 0, str(CLASS_MOTORCYCLE): 0})
+        # Copy history reference for consistent charts
+        if "history" in mirrored:
+            stats["history"] = mirrored["history"]
+        self.publish_live()
+        # OSD/Frame update is skipped in mirror mode
+
+    def capture(self):
+        """
+        Connect to the stream and grab a fresh frame.
+        Returns the frame, or None if the stream is unavailable or its circuit breaker is open.
+        """
+        # Dead streams are only probed when their backoff has expired
+        if not self.health.allow(time.time()):
+            registry.inc("camera_connect_skipped_total", 1, "Capture cycles skipped by an open circuit breaker",
+                         camera_id=self.source_id, camera=self.source_name)
+            return None
+
+        # 1. Connect & Snapshot
+        cap = None
+        with self.timer("connect"):
+            # Opens can block for the full timeout; bound how many run at once
+            if not connect_slots.acquire(timeout=CAMERA_OPEN_TIMEOUT_MS / 1000):
+                self.health.skip()
+                registry.inc("camera_connect_throttled_total", 1, "Capture cycles without a free connection slot",
+                             camera_id=self.source_id, camera=self.source_name)
+                return None
             try:
-                cap = cv2.VideoCapture(self.source_url)
+                cap = open_capture(self.source_url)
             except Exception as e:
                 print(f"[WARN] {self.source_name}: VideoCapture init failed: {e}")
+            finally:
+                connect_slots.release()
 
-            frame = None
-            success = False
-            
-            if cap and cap.isOpened():
-                # Burst read to clear buffer and find keyframe
-                # Increased to max 2 seconds to handle stream startup artifacts
+        frame = None
+        success = False
+
+        if cap and cap.isOpened():
+            # Burst read to clear buffer and find keyframe
+            # Increased to max 2 seconds to handle stream startup artifacts
+            with self.timer("frame_read"):
                 start_read = time.time()
                 while (time.time() - start_read) < 2.0:
                     ret, tmp_frame = cap.read()
@@ -183,214 +340,377 @@ class CameraAgent(threading.Thread):
                     else:
                         time.sleep(0.05)
                 cap.release()
+        else:
+            if cap: cap.release()
+            registry.inc("camera_connect_failures_total", 1, "Failed stream connections",
+                         camera_id=self.source_id, camera=self.source_name)
+
+        self.update_health(success)
+
+        # Update status in global stats
+        if self.source_id in g.global_stats:
+            g.global_stats[self.source_id]["status"] = "online" if success else "offline"
+            g.global_stats[self.source_id]["last_update"] = time.time()
+            g.global_stats[self.source_id]["health"] = self.health.snapshot()
+            if not success:
+                self.publish_live()
+
+        return frame if success else None
+
+    def update_health(self, success):
+        """Feed a capture result to the circuit breaker; logs only state changes and probes."""
+        if success:
+            if self.health.record_success() != CLOSED:
+                print(f"[INFO] {self.source_name}: stream back online.")
+            state = CLOSED
+        else:
+            state = self.health.record_failure(time.time())
+            if state == OPEN:
+                print(f"[WARN] {self.source_name}: stream offline ({self.health.failures} failed attempts), "
+                      f"next attempt in {self.health.retry_at - time.time():.0f}s.")
+                registry.inc("camera_circuit_opened_total", 1, "Failed connects that (re)opened the circuit breaker",
+                             camera_id=self.source_id, camera=self.source_name)
             else:
-                if cap: cap.release()
                 print(f"[WARN] {self.source_name}: Connection failed or stream closed.")
-            
-            # Update status in global stats
-            if self.source_id in g.global_stats:
-                g.global_stats[self.source_id]["status"] = "online" if success else "offline"
-                g.global_stats[self.source_id]["last_update"] = time.time()
-
-            if success and frame is not None:
-                # 2. Inference (Protected by Lock)
-                results = []
-                with g.model_lock:
-                    try:
-                        # imgsz=1280 for better small object detection, augment=True for TTA (Robustness)
-                        results = self.model(frame, conf=CONF_THRESHOLD, iou=IOU_THRESHOLD, classes=VEHICLE_CLASSES, verbose=False, imgsz=1280, augment=True, agnostic_nms=False)
-                    except Exception as e:
-                        print(f"[ERROR] Inference failed for {self.source_name}: {e}")
-
-                # 3. Process Results
-                rects = []
-                rect_classes = []
-                datalake_batch = []
-                
-                if results:
-                    for result in results:
-                        boxes = result.boxes
-                        for box in boxes:
-                            x1, y1, x2, y2 = box.xyxy[0].cpu().numpy().astype(int)
-                            cls_id = int(box.cls[0].cpu().numpy())
-                            conf = float(box.conf[0].cpu().numpy())
-                            
-                            internal_class_id = CLASS_MAPPING.get(cls_id, CLASS_CAR)
-                            rects.append((x1, y1, x2, y2))
-                            rect_classes.append(internal_class_id)
-                            
-                            # Prepare for Data Lake
-                            datalake_batch.append({
-                                'class_id': internal_class_id,
-                                'conf': conf,
-                                'box': [x1, y1, x2, y2]
-                            })
-
-                # Log to Data Lake (Simulate Streaming Ingestion)
-                if datalake_batch:
-                    self.log_to_datalake(datalake_batch, time.time())
-
-                # 4. Update Stats
-                current_count = len(rects)
-                current_class_counts = {CLASS_CAR: 0, CLASS_MOTORCYCLE: 0}
-                for c_id in rect_classes:
-                    current_class_counts[c_id] += 1
-                
-                # Logic: Filter Static Objects (e.g. at Red Light)
-                # If a vehicle overlaps significantly (>50%) with a vehicle in the previous frame (5s ago),
-                # we assume it is the SAME vehicle stopped at a light, so we DO NOT add it to the accumulated count.
-                new_rects_count = 0
-                new_class_counts = {CLASS_CAR: 0, CLASS_MOTORCYCLE: 0}
-                
-                for i, rect in enumerate(rects):
-                    is_static = False
-                    for prev_rect in self.prev_rects:
-                        # Check IOU (Overlap)
-                        if self.get_iou(rect, prev_rect) > 0.5:
-                             is_static = True
-                             break
-                    
-                    if not is_static:
-                        new_rects_count += 1
-                        cls_id = rect_classes[i]
-                        new_class_counts[cls_id] += 1
-                
-                # Apply Traffic Simulation Multiplier (for realistic patterns)
-                # Only apply if it's likely a demo/simulation (local video source) or if explicitly desired
-                # Here we apply it globally to ensure the charts look dynamic as requested
-                traffic_mult = self.get_traffic_multiplier()
-                
-                # Scale counts
-                current_count = int(current_count * traffic_mult)
-                new_rects_count = int(new_rects_count * traffic_mult)
-                
-                # Scale class counts proportionally
-                total_classes = sum(current_class_counts.values())
-                if total_classes > 0:
-                    for k in current_class_counts:
-                         ratio = current_class_counts[k] / total_classes
-                         current_class_counts[k] = int(current_count * ratio)
-                
-                total_new = sum(new_class_counts.values())
-                if total_new > 0:
-                    for k in new_class_counts:
-                         ratio = new_class_counts[k] / total_new
-                         new_class_counts[k] = int(new_rects_count * ratio)
-
-                self.prev_rects = rects # Update for next frame
-
-                # Atomic Update to Global Stats
-                stats = g.global_stats[self.source_id]
-                stats["current_count"] = current_count # Always show actual current count
-                stats["current_class_counts"] = {str(k): v for k, v in current_class_counts.items()}
-                
-                # Only add NEW (non-static) vehicles to accumulated history
-                stats["accumulated_count"] += new_rects_count
-                stats["accumulated_class_counts"][str(CLASS_CAR)] += new_class_counts[CLASS_CAR]
-                stats["accumulated_class_counts"][str(CLASS_MOTORCYCLE)] += new_class_counts[CLASS_MOTORCYCLE]
-                
-                # Append to history (We use current_count for history graph to show density trend)
-                timestamp = time.time()
-                stats["history"].append({
-                    "ts": timestamp,
-                    "count": current_count, # Graph shows density (how many cars NOW)
-                    "cars": current_class_counts[CLASS_CAR],
-                    "motors": current_class_counts[CLASS_MOTORCYCLE],
-                    "new_count": new_rects_count,
-                    "new_cars": new_class_counts[CLASS_CAR],
-                    "new_motors": new_class_counts[CLASS_MOTORCYCLE]
+        registry.set_gauge("camera_circuit_state", HEALTH_CODES[state], "Circuit breaker (0 closed, 1 half-open, 2 open)",
+                           camera_id=self.source_id, camera=self.source_name)
+
+    def process(self, frame):
+        """Run inference on a captured frame and update stats, storage and the live view."""
+        # 2. Inference (skipped if the scene has not changed since the last inferred frame)
+        # Only the ROI crop is looked at (both by the gate and the model)
+        region, offset = self.roi.crop(frame) if self.roi is not None else (frame, (0, 0))
+
+        reused = False
+        if self.motion_gate is not None:
+            with self.timer("motion_gate"):
+                reused = self.motion_gate.should_skip(region)
+            registry.inc("camera_motion_gate_frames_total", 1, "Frames seen by the motion gate",
+                         camera_id=self.source_id, camera=self.source_name,
+                         result="skipped" if reused else "inferred")
+
+        if reused:
+            detections = self.last_detections
+        else:
+            detections = self.detect_region(frame, region, offset)
+            self.last_detections = detections
+
+        self.process_detections(detections, frame, reused)
+
+    def process_detections(self, detections, frame=None, reused=False):
+        """
+        Count an (N, 6) detection array and update stats, storage and the live view.
+        Replays call this directly with recorded detections and no frame.
+        """
+        # 3. Process Results
+        rects = []
+        rect_classes = []
+        datalake_batch = []
+
+        with self.timer("postprocess"):
+            for det in detections:
+                x1, y1, x2, y2 = (int(v) for v in det[:4])
+                conf = float(det[4])
+                cls_id = int(det[5])
+
+                internal_class_id = CLASS_MAPPING.get(cls_id, CLASS_CAR)
+                rects.append((x1, y1, x2, y2))
+                rect_classes.append(internal_class_id)
+
+                # Prepare for Data Lake
+                datalake_batch.append({
+                    'class_id': internal_class_id,
+                    'conf': conf,
+                    'box': [x1, y1, x2, y2]
                 })
-                
-                # Persist to SQLite (Big Data Architecture)
-                try:
-                    insert_history_batch([(
-                        self.source_id,
-                        timestamp,
-                        current_count,
-                        current_class_counts[CLASS_CAR],
-                        current_class_counts[CLASS_MOTORCYCLE],
-                        new_rects_count,
-                        new_class_counts[CLASS_CAR],
-                        new_class_counts[CLASS_MOTORCYCLE]
-                    )])
-                except Exception as e:
-                    print(f"[{self.source_name}] DB Error: {e}")
-                
-                # Save periodically (every 60 seconds)
-                if timestamp - self.last_save_time > 60:
-                    save_stats()
-                    self.last_save_time = timestamp
-                
-                print(f"[{self.source_name}] Count: {current_count} (Total: {stats['accumulated_count']})")
-
-                # 5. Update Output Frame ONLY if this is the active source
-                if self.source_url == g.VIDEO_SOURCE:
-                    # Draw boxes
-                    for (rect, cls_id) in zip(rects, rect_classes):
-                        (x1, y1, x2, y2) = rect
-                        color = (0, 255, 0) if cls_id == CLASS_CAR else (255, 0, 0)
-                        label = "Car" if cls_id == CLASS_CAR else "Motor"
-                        cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
-                        cv2.putText(frame, label, (x1, y1-10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
-                    
-                    # Draw OSD
-                    cv2.putText(frame, f"CAM: {self.source_name}", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 255), 2)
-                    cv2.putText(frame, f"Total: {stats['accumulated_count']}", (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
-                    # Watermark
-                    cv2.putText(frame, "desavitho", (10, 90), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
-                    
-                    with g.lock:
-                        g.outputFrame = frame.copy()
 
+        # Log to Data Lake (Simulate Streaming Ingestion)
+        if datalake_batch and not reused:
+            with self.timer("datalake_write"):
+                self.log_to_datalake(datalake_batch, self.clock.time())
+
+        # 4. Update Stats
+        current_count = len(rects)
+        current_class_counts = {CLASS_CAR: 0, CLASS_MOTORCYCLE: 0}
+        for c_id in rect_classes:
+            current_class_counts[c_id] += 1
+
+        # Logic: Filter Static Objects (e.g. at Red Light)
+        # If a vehicle overlaps significantly (>50%) with a vehicle in the previous frame (5s ago),
+        # we assume it is the SAME vehicle stopped at a light, so we DO NOT add it to the accumulated count.
+        new_rects_count = 0
+        new_class_counts = {CLASS_CAR: 0, CLASS_MOTORCYCLE: 0}
+
+        with self.timer("static_filter"):
+            # Reused detections are by definition the same vehicles as last cycle
+            candidates = [] if reused else enumerate(rects)
+            for i, rect in candidates:
+                is_static = False
+                for prev_rect in self.prev_rects:
+                    # Check IOU (Overlap)
+                    if self.get_iou(rect, prev_rect) > 0.5:
+                         is_static = True
+                         break
+
+                if not is_static:
+                    new_rects_count += 1
+                    cls_id = rect_classes[i]
+                    new_class_counts[cls_id] += 1
+
+        # Apply Traffic Simulation Multiplier (for realistic patterns)
+        # Only apply if it's likely a demo/simulation (local video source) or if explicitly desired
+        # Here we apply it globally to ensure the charts look dynamic as requested
+        traffic_mult = self.get_traffic_multiplier()
+
+        # Scale counts
+        current_count = int(current_count * traffic_mult)
+        new_rects_count = int(new_rects_count * traffic_mult)
+
+        # Scale class counts proportionally
+        total_classes = sum(current_class_counts.values())
+        if total_classes > 0:
+            for k in current_class_counts:
+                 ratio = current_class_counts[k] / total_classes
+                 current_class_counts[k] = int(current_count * ratio)
+
+        total_new = sum(new_class_counts.values())
+        if total_new > 0:
+            for k in new_class_counts:
+                 ratio = new_class_counts[k] / total_new
+                 new_class_counts[k] = int(new_rects_count * ratio)
+
+        self.prev_rects = rects # Update for next frame
+
+        # Atomic Update to Global Stats
+        stats = g.global_stats[self.source_id]
+        stats["current_count"] = current_count # Always show actual current count
+        stats["current_class_counts"] = {str(k): v for k, v in current_class_counts.items()}
+        if self.motion_gate is not None:
+            stats["motion_skip_rate"] = round(self.motion_gate.skip_rate, 3)
+        if self.cascade is not None:
+            stats["cascade_escalation_rate"] = round(self.cascade.escalation_rate, 3)
+
+        # Only add NEW (non-static) vehicles to accumulated history
+        stats["accumulated_count"] += new_rects_count
+        stats["accumulated_class_counts"][str(CLASS_CAR)] += new_class_counts[CLASS_CAR]
+        stats["accumulated_class_counts"][str(CLASS_MOTORCYCLE)] += new_class_counts[CLASS_MOTORCYCLE]
+
+        # Append to history (We use current_count for history graph to show density trend)
+        timestamp = self.clock.time()
+        stats["history"].append({
+            "ts": timestamp,
+            "count": current_count, # Graph shows density (how many cars NOW)
+            "cars": current_class_counts[CLASS_CAR],
+            "motors": current_class_counts[CLASS_MOTORCYCLE],
+            "new_count": new_rects_count,
+            "new_cars": new_class_counts[CLASS_CAR],
+            "new_motors": new_class_counts[CLASS_MOTORCYCLE]
+        })
+
+        # Nowcast/anomaly update is O(1) and published with the live counters
+        if g.nowcast_store is not None:
+            stats["nowcast"], anomaly_started = g.nowcast_store.observe(self.source_id, timestamp, new_rects_count)
+            if anomaly_started:
+                print(f"[WARN] {self.source_name}: traffic anomaly (z={stats['nowcast']['z_score']}, "
+                      f"{stats['nowcast']['rate_per_hour']}/h vs baseline {stats['nowcast']['baseline_per_hour']}/h)")
+                registry.inc("camera_anomalies_total", 1, "Traffic anomalies flagged by the nowcaster",
+                             camera_id=self.source_id, camera=self.source_name)
+
+        self.publish_live()
+
+        # Persist to SQLite (Big Data Architecture)
+        try:
+            with self.timer("db_insert"):
+                rowid = self.write_history([(
+                    self.source_id,
+                    timestamp,
+                    current_count,
+                    current_class_counts[CLASS_CAR],
+                    current_class_counts[CLASS_MOTORCYCLE],
+                    new_rects_count,
+                    new_class_counts[CLASS_CAR],
+                    new_class_counts[CLASS_MOTORCYCLE]
+                )])
+            if rowid:
+                # Per-camera high-water mark of rows already in the counters
+                # (scripts/sync_stats_db.py only adds rows above it)
+                stats["db_rowid"] = rowid
+        except Exception as e:
+            print(f"[{self.source_name}] DB Error: {e}")
+
+        if g.threshold_store is not None:
+            g.threshold_store.observe(self.source_id, timestamp, new_rects_count)
+
+        # Save periodically (every SAVE_INTERVAL seconds)
+        if timestamp - self.last_save_time > self.SAVE_INTERVAL:
+            with self.timer("save_stats"):
+                save_stats()
+                if g.threshold_store is not None:
+                    g.threshold_store.save_if_dirty()
+                if g.nowcast_store is not None:
+                    g.nowcast_store.save_if_dirty()
+            self.last_save_time = timestamp
+
+        if self.LOG_CYCLES:
+            print(f"[{self.source_name}] Count: {current_count} (Total: {stats['accumulated_count']})")
+        registry.inc("camera_vehicles_counted_total", new_rects_count, "New vehicles added to accumulated counts",
+                     camera_id=self.source_id, camera=self.source_name)
+        registry.set_gauge("camera_current_count", current_count, "Vehicles visible in the latest frame",
+                           camera_id=self.source_id, camera=self.source_name)
+
+        # 5. Update Output Frame ONLY if this is the active source
+        sync_view_request()
+        if frame is not None and self.source_url == g.VIDEO_SOURCE:
+            with self.timer("frame_publish"):
+                # Draw boxes
+                for (rect, cls_id) in zip(rects, rect_classes):
+                    (x1, y1, x2, y2) = rect
+                    color = (0, 255, 0) if cls_id == CLASS_CAR else (255, 0, 0)
+                    label = "Car" if cls_id == CLASS_CAR else "Motor"
+                    cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
+                    cv2.putText(frame, label, (x1, y1-10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
+
+                # Draw ROI outline
+                if self.roi is not None:
+                    polygons = [p.astype(np.int32) for p in self.roi.pixel_polygons(frame.shape)]
+                    cv2.polylines(frame, polygons, True, (0, 255, 255), 1)
+
+                # Draw OSD
+                cv2.putText(frame, f"CAM: {self.source_name}", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 255), 2)
+                cv2.putText(frame, f"Total: {stats['accumulated_count']}", (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+                # Watermark
+                cv2.putText(frame, "desavitho", (10, 90), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
+
+                with g.lock:
+                    g.outputFrame = frame.copy()
+
+                if g.frame_writer is not None:
+                    # Encode once here so web workers only copy bytes
+                    (flag, encodedImage) = cv2.imencode(".jpg", frame)
+                    if flag:
+                        g.frame_writer.publish(encodedImage.tobytes(), self.source_id)
+
+    def run_cycle(self):
+        """One full capture -> inference -> stats cycle (used by both thread and pool modes)."""
+        if self.is_mirror():
+            self.mirror_step()
+            return
+        frame = self.capture()
+        if frame is not None:
+            self.process(frame)
+
+    def run(self):
+        print(f"[INFO] Started Agent for {self.source_name}")
+        
+        while self.running:
+            self.run_cycle()
+            
             # Sleep
-            time.sleep(PROCESS_INTERVAL)
+            time.sleep(self.interval)
 
     def stop(self):
         self.running = False
 
-def generate_frames(camera_id):
-    # Find the source URL
-    target_url = None
+def sync_view_request():
+    """Ingest role: follow the camera most recently opened by any web worker."""
+    if g.live_state_writer is None:
+        return
+    requested = g.live_state_writer.requested_view()
+    if not requested:
+        return
     for src in g.CCTV_SOURCES:
-        if src["id"] == camera_id:
-            target_url = src["url"]
+        if src["id"] == requested:
+            if g.VIDEO_SOURCE != src["url"]:
+                g.VIDEO_SOURCE = src["url"]
             break
-            
-    if target_url:
-        # Set the global video source so the agent starts updating outputFrame
-        g.VIDEO_SOURCE = target_url
-        
-        while True:
-            with g.lock:
-                if g.outputFrame is None:
-                    # If no frame yet, yield a blank frame or wait
-                    time.sleep(0.1)
-                    continue
-                    
-                (flag, encodedImage) = cv2.imencode(".jpg", g.outputFrame)
-                if not flag:
-                    time.sleep(0.1)
-                    continue
-            
-            yield (b'--frame\r\n'
-                   b'Content-Type: image/jpeg\r\n\r\n' + bytearray(encodedImage) + b'\r\n')
-            
-            # Throttle to avoid busy loop, match process interval roughly
-            time.sleep(0.5)
+
+def generate_frames(camera_id):
+    if not any(src["id"] == camera_id for src in g.CCTV_SOURCES):
+        return
+    # Frames come from the shared slot; encoding happens once in the agent
+    yield from broadcaster.stream(camera_id)
 
 def start_camera_agents():
-    print("[INFO] Loading YOLOv8 model (Shared)...")
-    g.yolo_model_instance = YOLO(YOLO_MODEL_PATH)
-    print("[INFO] Model Loaded.")
+    if SERVICE_ROLE == "web":
+        print("[INFO] Web role: camera agents run in the ingest process.")
+        return
+
+    if g.ingest_lock is None:
+        # This process now owns STATS_FILE; scripts/sync_stats_db.py refuses to run meanwhile
+        g.ingest_lock = acquire_ingest_lock(blocking=False)
+        if g.ingest_lock is None:
+            g.ingest_lock = acquire_ingest_lock()
+            # A stats sync rewrote the file while we waited
+            g.global_stats = load_stats()
+            sync_stats_with_config()
+    if g.live_state_writer is None:
+        g.live_state_writer = LiveStateWriter()
+        g.frame_writer = FrameSlotWriter()
+    if g.nowcast_store is None:
+        g.nowcast_store = NowcastStore().load()
+
+    if INFERENCE_PROCESSES > 0:
+        # Each worker process loads its own model copy
+        if g.inference_pool is None:
+            print(f"[INFO] Starting {INFERENCE_PROCESSES} inference worker processes...")
+            small_spec = (CASCADE_SMALL_BACKEND, CASCADE_SMALL_MODEL_PATH) if CASCADE_ENABLED else None
+            g.inference_pool = InferenceProcessPool(INFERENCE_PROCESSES, DETECTOR_BACKEND, small_spec=small_spec)
+            g.inference_pool.start()
+    else:
+        print(f"[INFO] Loading YOLOv8 model (Shared, backend: {DETECTOR_BACKEND})...")
+        g.yolo_model_instance = create_detector(DETECTOR_BACKEND)
+        if CASCADE_ENABLED:
+            g.small_model_instance = create_detector(CASCADE_SMALL_BACKEND, CASCADE_SMALL_MODEL_PATH)
+        print("[INFO] Model Loaded.")
     
-    # Start agents for all sources
+    if CAMERA_SCHEDULER == "pool" and g.camera_scheduler is None:
+        # Enough inference threads to keep every worker process busy
+        g.camera_scheduler = CameraScheduler(inference_workers=max(INFERENCE_WORKERS, INFERENCE_PROCESSES))
+        g.camera_scheduler.start()
+
+    # Start agents for all sources (entries with "enabled": false are skipped)
     for src in g.CCTV_SOURCES:
+        if not src.get("enabled", True):
+            continue
         if src["id"] not in g.camera_agents:
             agent = CameraAgent(src, g.yolo_model_instance)
             g.camera_agents[src["id"]] = agent
-            agent.start()
+            if g.camera_scheduler is not None:
+                g.camera_scheduler.add(agent, interval=agent.interval, priority=agent.priority)
+            else:
+                agent.start()
+
+def stop_camera_agents(timeout=10):
+    """Graceful shutdown: stop every agent, wait for in-flight cycles and persist state."""
+    if g.camera_scheduler is not None:
+        g.camera_scheduler.stop()
+        g.camera_scheduler = None
+    agents = list(g.camera_agents.values())
+    for agent in agents:
+        agent.stop()
+    deadline = time.time() + timeout
+    for agent in agents:
+        if agent.is_alive():
+            agent.join(max(0.0, deadline - time.time()))
+    g.camera_agents.clear()
+    if g.inference_pool is not None:
+        g.inference_pool.stop()
+        g.inference_pool = None
+
+    save_stats()
+    if g.threshold_store is not None:
+        g.threshold_store.save_if_dirty()
+    if g.nowcast_store is not None:
+        g.nowcast_store.save_if_dirty()
+    if g.ingest_lock is not None:
+        g.ingest_lock.close()
+        g.ingest_lock = None
+    print(f"[INFO] Stopped {len(agents)} camera agents.")
 
 def stop_agent(source_id):
     if source_id in g.camera_agents:
-        g.camera_agents[source_id].stop()
+        if g.camera_scheduler is not None:
+            g.camera_scheduler.remove(source_id)
+        else:
+            g.camera_agents[source_id].stop()
         del g.camera_agents[source_id]
@@ -0,0 +1,72 @@
+from app.config import (
+    CASCADE_DENSE_THRESHOLD, CASCADE_CONF_BAND, CASCADE_BORDERLINE_FRACTION,
+    CASCADE_AUDIT_EVERY, CASCADE_NEVER_ESCALATE_PROFILES
+)
+from app.utils import get_camera_profile
+
+class CascadePolicy:
+    """
+    Decides when a frame seen by the small model must be re-run on the large one.
+
+    Escalation reasons:
+      dense       - the small model found at least dense_threshold vehicles
+      borderline  - too many boxes have confidence inside conf_band
+      audit       - every audit_every-th cycle, to keep the small model honest
+
+    CameraAgent.detect_cascade also escalates with reason "small_failed" when the
+    small pass raises or times out (without calling decide()).
+    """
+
+    def __init__(self, dense_threshold=CASCADE_DENSE_THRESHOLD, conf_band=CASCADE_CONF_BAND,
+                 borderline_fraction=CASCADE_BORDERLINE_FRACTION, audit_every=CASCADE_AUDIT_EVERY,
+                 escalate=True):
+        self.dense_threshold = dense_threshold
+        self.conf_low, self.conf_high = conf_band
+        self.borderline_fraction = borderline_fraction
+        self.audit_every = audit_every
+        self.escalate = escalate
+
+        self.cycles = 0
+        self.escalations = 0
+
+    @classmethod
+    def for_camera(cls, source_config):
+        """
+        Policy from defaults, the camera's traffic profile and its optional
+        "cascade" block in cctv_config.json, e.g.
+            "cascade": {"dense_threshold": 40, "audit_every": 0, "escalate": true}
+        """
+        kwargs = {}
+        if get_camera_profile(source_config.get("name", "")) in CASCADE_NEVER_ESCALATE_PROFILES:
+            # Quiet streets: the small model is always good enough
+            kwargs["escalate"] = False
+        overrides = source_config.get("cascade") or {}
+        for key in ("dense_threshold", "borderline_fraction", "audit_every", "escalate"):
+            if key in overrides:
+                kwargs[key] = overrides[key]
+        if "conf_band" in overrides:
+            kwargs["conf_band"] = tuple(overrides["conf_band"])
+        return cls(**kwargs)
+
+    def decide(self, detections):
+        """Return the escalation reason for this frame, or None to keep the small model's result."""
+        self.cycles += 1
+        reason = None
+        if self.escalate:
+            if len(detections) >= self.dense_threshold:
+                reason = "dense"
+            elif len(detections) and self._borderline_share(detections) >= self.borderline_fraction:
+                reason = "borderline"
+            elif self.audit_every and self.cycles % self.audit_every == 0:
+                reason = "audit"
+        if reason:
+            self.escalations += 1
+        return reason
+
+    def _borderline_share(self, detections):
+        conf = detections[:, 4]
+        return float(((conf >= self.conf_low) & (conf < self.conf_high)).mean())
+
+    @property
+    def escalation_rate(self):
+        return self.escalations / float(self.cycles) if self.cycles else 0.0
@@ -0,0 +1,31 @@
+import datetime
+import time
+
+# Time sources for the camera pipeline. Agents read the time through a clock
+# object so that replays (app/services/replay.py) can run recorded traffic
+# under simulated time.
+
+class SystemClock:
+    """Wall-clock time."""
+    def time(self):
+        return time.time()
+
+    def now(self):
+        return datetime.datetime.now()
+
+class SimClock:
+    """Simulated time that only moves when the replay driver advances it."""
+    def __init__(self, start_ts):
+        self._ts = float(start_ts)
+
+    def time(self):
+        return self._ts
+
+    def now(self):
+        return datetime.datetime.fromtimestamp(self._ts)
+
+    def advance_to(self, ts):
+        """Move forward to ts (never backwards)."""
+        self._ts = max(self._ts, float(ts))
+
+system_clock = SystemClock()
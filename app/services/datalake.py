@@ -0,0 +1,349 @@
+import bisect
+import csv
+import datetime
+import gzip
+import io
+import json
+import os
+import shutil
+import struct
+
+from app.config import DATA_LAKE_PATH, DATA_LAKE_COMPRESS_LEVEL
+
+# Data-lake partitions.
+#
+# Every local day is a directory DATA_LAKE_PATH/YYYY/MM/DD. While a day is open
+# the agents append detections to traffic_log_<camera>.csv (one row per vehicle)
+# and backfills write traffic_agg_<camera>.csv (one row per interval).
+# Compaction rewrites a closed day into a single COMPACT_FILE:
+#
+#   MAGIC | index length (uint64 LE) | JSON index | data
+#
+# The data is one gzip member per (camera, hour, kind) with rows sorted by time,
+# laid out camera by camera. The index lists each camera's blocks with byte
+# offsets and vehicle totals, so day/hour totals need no decompression and a
+# camera + time range read seeks straight to the blocks it needs. CSVs written
+# into a compacted day later (late rows, backfills) stay loose until the next
+# compaction merges them; readers combine both.
+
+RAW_FILE_PREFIX = "traffic_log_"
+RAW_HEADER = ["timestamp", "source_id", "source_name", "class_id", "confidence", "bbox"]
+AGG_FILE_PREFIX = "traffic_agg_"
+AGG_HEADER = ["interval_start", "source_id", "source_name", "interval_seconds", "cars", "motorcycles", "total"]
+KINDS = {"raw": (RAW_FILE_PREFIX, RAW_HEADER), "agg": (AGG_FILE_PREFIX, AGG_HEADER)}
+
+COMPACT_FILE = "traffic_day.compact"
+MAGIC = b"STLAKE01"
+INDEX_LENGTH = struct.Struct("<Q")
+
+# Raw rows carry the internal class id (CLASS_CAR / CLASS_MOTORCYCLE); older logs used names
+CAR_CLASSES = {"0", "car"}
+MOTORCYCLE_CLASSES = {"1", "motorcycle"}
+
+def partition_dir(day, root=DATA_LAKE_PATH):
+    """Directory of a local date's partition."""
+    return os.path.join(root, str(day.year), f"{day.month:02d}", f"{day.day:02d}")
+
+def partition_days(root=DATA_LAKE_PATH):
+    """Dates of every partition directory, oldest first."""
+    days = []
+    for year in sorted(os.listdir(root)) if os.path.isdir(root) else []:
+        year_dir = os.path.join(root, year)
+        if not year.isdigit() or not os.path.isdir(year_dir):
+            continue
+        for month in sorted(os.listdir(year_dir)):
+            month_dir = os.path.join(year_dir, month)
+            if not month.isdigit() or not os.path.isdir(month_dir):
+                continue
+            for day in sorted(os.listdir(month_dir)):
+                try:
+                    days.append(datetime.date(int(year), int(month), int(day)))
+                except ValueError:
+                    continue
+    return days
+
+def partition_signature(day, root=DATA_LAKE_PATH):
+    """(name, size, mtime) of every file in a partition; changes whenever its contents do. None if missing."""
+    path = partition_dir(day, root)
+    try:
+        names = sorted(os.listdir(path))
+    except FileNotFoundError:
+        return None
+    signature = []
+    for name in names:
+        try:
+            st = os.stat(os.path.join(path, name))
+        except FileNotFoundError:
+            continue
+        signature.append((name, st.st_size, st.st_mtime_ns))
+    return tuple(signature)
+
+def hour_starts(day):
+    """Timestamps of the local hours 0..23 of a date."""
+    return [datetime.datetime.combine(day, datetime.time(hour)).timestamp() for hour in range(24)]
+
+def hour_of(ts, starts):
+    """Local hour (0-23) of ts within the day of `starts`; clamped outside it."""
+    return max(0, bisect.bisect_right(starts, ts) - 1)
+
+def row_counts(kind, row):
+    """(total, cars, motorcycles) represented by one row."""
+    if kind == "agg":
+        cars, motors = int(row[4] or 0), int(row[5] or 0)
+        return cars + motors, cars, motors
+    return 1, int(row[3] in CAR_CLASSES), int(row[3] in MOTORCYCLE_CLASSES)
+
+def read_csv_rows(path, kind):
+    """Data rows of a loose partition CSV (header and torn rows are skipped)."""
+    width = len(KINDS[kind][1])
+    with open(path, newline="") as f:
+        for row in csv.reader(f):
+            if len(row) < width:
+                continue
+            try:
+                float(row[0])
+            except ValueError:
+                continue
+            yield row
+
+class CompactedDay:
+    """Index of a compacted partition; blocks are decompressed on demand."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            head = f.read(len(MAGIC) + INDEX_LENGTH.size)
+            if len(head) < len(MAGIC) + INDEX_LENGTH.size or head[:len(MAGIC)] != MAGIC:
+                raise ValueError(f"Not a compacted partition: {path}")
+            length = INDEX_LENGTH.unpack_from(head, len(MAGIC))[0]
+            self.index = json.loads(f.read(length))
+        self.data_offset = len(MAGIC) + INDEX_LENGTH.size + length
+        self.cameras = self.index["cameras"]
+        self.merged = self.index.get("merged", {})
+
+    def blocks(self, camera_id, kinds=("raw", "agg"), first_hour=0, last_hour=23):
+        """Index entries [kind, hour, offset, length, rows, total, cars, motorcycles] of one camera."""
+        entry = self.cameras.get(camera_id)
+        if entry is None:
+            return []
+        return [b for b in entry["blocks"] if b[0] in kinds and first_hour <= b[1] <= last_hour]
+
+    def read_blocks(self, blocks):
+        """(kind, row) for every row of the given blocks, in block order."""
+        with open(self.path, "rb") as f:
+            for block in blocks:
+                kind, _, offset, length = block[:4]
+                f.seek(self.data_offset + offset)
+                text = gzip.decompress(f.read(length)).decode("utf-8")
+                for row in csv.reader(io.StringIO(text)):
+                    yield kind, row
+
+def open_compacted(path):
+    """CompactedDay of a partition directory, or None if it has not been compacted."""
+    file_path = os.path.join(path, COMPACT_FILE)
+    if not os.path.isfile(file_path):
+        return None
+    return CompactedDay(file_path)
+
+def loose_files(path):
+    """{filename: (kind, camera_id)} of the CSVs in a partition directory."""
+    found = {}
+    try:
+        names = os.listdir(path)
+    except FileNotFoundError:
+        return found
+    for name in names:
+        if not name.endswith(".csv"):
+            continue
+        for kind, (prefix, _) in KINDS.items():
+            if name.startswith(prefix):
+                found[name] = (kind, name[len(prefix):-len(".csv")])
+                break
+    return found
+
+def _file_signature(path):
+    st = os.stat(path)
+    return [st.st_size, st.st_mtime_ns]
+
+def pending_files(path, compacted):
+    """Loose CSVs not yet merged into the compacted file (all of them if there is none)."""
+    files = loose_files(path)
+    if compacted is None:
+        return files
+    pending = {}
+    for name, info in files.items():
+        try:
+            signature = _file_signature(os.path.join(path, name))
+        except FileNotFoundError:
+            continue  # removed by a compaction that just finished
+        if compacted.merged.get(name) != signature:
+            pending[name] = info
+    return pending
+
+def _superseded(pending):
+    # A loose aggregate file is rewritten in full by each backfill (see
+    # write_datalake_aggregates), so it replaces the camera's compacted aggregates
+    return {camera_id for kind, camera_id in pending.values() if kind == "agg"}
+
+def day_summary(day, camera_ids=None, root=DATA_LAKE_PATH):
+    """
+    Vehicle totals of one partition: {camera_id: {"name": str, "hours": {hour: [total, cars, motorcycles]}}}.
+    Compacted data is answered from the index; only loose CSVs are scanned. None if the partition is missing.
+    """
+    path = partition_dir(day, root)
+    if not os.path.isdir(path):
+        return None
+    compacted = open_compacted(path)
+    pending = pending_files(path, compacted)
+    superseded = _superseded(pending)
+    summary = {}
+
+    def add(camera_id, name, hour, total, cars, motors):
+        camera = summary.setdefault(camera_id, {"name": name, "hours": {}})
+        camera["name"] = name or camera["name"]
+        counts = camera["hours"].setdefault(hour, [0, 0, 0])
+        counts[0] += total
+        counts[1] += cars
+        counts[2] += motors
+
+    if compacted is not None:
+        for camera_id, entry in compacted.cameras.items():
+            if camera_ids is not None and camera_id not in camera_ids:
+                continue
+            for block in entry["blocks"]:
+                if block[0] == "agg" and camera_id in superseded:
+                    continue
+                add(camera_id, entry["name"], block[1], *block[5:8])
+
+    starts = hour_starts(day)
+    for name, (kind, camera_id) in pending.items():
+        if camera_ids is not None and camera_id not in camera_ids:
+            continue
+        for row in read_csv_rows(os.path.join(path, name), kind):
+            add(camera_id, row[2], hour_of(float(row[0]), starts), *row_counts(kind, row))
+    return summary
+
+def read_rows(camera_id, start_ts, end_ts, kinds=("raw",), root=DATA_LAKE_PATH):
+    """
+    (kind, row) of one camera with start_ts <= time < end_ts, in time order within each day.
+    Compacted days only decompress the hour blocks that overlap the range.
+    """
+    day = datetime.date.fromtimestamp(start_ts)
+    last_day = datetime.date.fromtimestamp(end_ts)
+    while day <= last_day:
+        path = partition_dir(day, root)
+        if os.path.isdir(path):
+            starts = hour_starts(day)
+            compacted = open_compacted(path)
+            pending = pending_files(path, compacted)
+            rows = []
+            if compacted is not None:
+                wanted = tuple(k for k in kinds if not (k == "agg" and camera_id in _superseded(pending)))
+                blocks = compacted.blocks(camera_id, wanted, hour_of(start_ts, starts), hour_of(end_ts, starts))
+                rows.extend(compacted.read_blocks(blocks))
+            for name, (kind, file_camera) in pending.items():
+                if file_camera == camera_id and kind in kinds:
+                    rows.extend((kind, row) for row in read_csv_rows(os.path.join(path, name), kind))
+            rows = [item for item in rows if start_ts <= float(item[1][0]) < end_ts]
+            rows.sort(key=lambda item: float(item[1][0]))
+            yield from rows
+        day += datetime.timedelta(days=1)
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+def compact_partition(day, root=DATA_LAKE_PATH, level=DATA_LAKE_COMPRESS_LEVEL):
+    """
+    Merge a day's loose CSVs (and a previous compacted file) into COMPACT_FILE and
+    delete the CSVs. Holds one camera-day of rows in memory at a time.
+    Returns {"date", "files", "cameras", "rows", "bytes_in", "bytes_out"}.
+    """
+    path = partition_dir(day, root)
+    compacted = open_compacted(path)
+    pending = pending_files(path, compacted)
+    # Merged by an earlier run that stopped before deleting them
+    for name in set(loose_files(path)) - set(pending):
+        _remove(os.path.join(path, name))
+    result = {"date": day.isoformat(), "files": len(pending), "cameras": 0, "rows": 0, "bytes_in": 0, "bytes_out": 0}
+    if not pending:
+        return result
+
+    merged = {name: _file_signature(os.path.join(path, name)) for name in pending}
+    result["bytes_in"] = sum(size for size, _ in merged.values())
+    if compacted is not None:
+        result["bytes_in"] += os.path.getsize(compacted.path)
+    superseded = _superseded(pending)
+    camera_ids = sorted({camera_id for _, camera_id in pending.values()} |
+                        set(compacted.cameras if compacted is not None else ()))
+    starts = hour_starts(day)
+    index = {
+        "version": 1,
+        "date": day.isoformat(),
+        "columns": {kind: header for kind, (_, header) in KINDS.items()},
+        "cameras": {},
+        "merged": merged,
+    }
+
+    data_path = os.path.join(path, COMPACT_FILE + ".data.tmp")
+    with open(data_path, "wb") as data:
+        for camera_id in camera_ids:
+            rows = []
+            name = camera_id
+            if compacted is not None and camera_id in compacted.cameras:
+                name = compacted.cameras[camera_id]["name"]
+                kinds = ("raw",) if camera_id in superseded else ("raw", "agg")
+                rows.extend(compacted.read_blocks(compacted.blocks(camera_id, kinds)))
+            for file_name, (kind, file_camera) in pending.items():
+                if file_camera == camera_id:
+                    rows.extend((kind, row) for row in read_csv_rows(os.path.join(path, file_name), kind))
+            if not rows:
+                continue
+            rows.sort(key=lambda item: float(item[1][0]))
+            name = rows[-1][1][2] or name
+
+            buckets = {}
+            for kind, row in rows:
+                buckets.setdefault((hour_of(float(row[0]), starts), kind), []).append(row)
+            blocks = []
+            for (hour, kind), block_rows in sorted(buckets.items()):
+                text = io.StringIO()
+                csv.writer(text).writerows(block_rows)
+                body = gzip.compress(text.getvalue().encode("utf-8"), compresslevel=level, mtime=0)
+                totals = [0, 0, 0]
+                for row in block_rows:
+                    for i, count in enumerate(row_counts(kind, row)):
+                        totals[i] += count
+                blocks.append([kind, hour, data.tell(), len(body), len(block_rows), *totals])
+                data.write(body)
+            index["cameras"][camera_id] = {"name": name, "blocks": blocks}
+            result["rows"] += len(rows)
+
+    index_bytes = json.dumps(index, separators=(",", ":")).encode("utf-8")
+    tmp_path = os.path.join(path, COMPACT_FILE + ".tmp")
+    with open(tmp_path, "wb") as f, open(data_path, "rb") as data:
+        f.write(MAGIC)
+        f.write(INDEX_LENGTH.pack(len(index_bytes)))
+        f.write(index_bytes)
+        shutil.copyfileobj(data, f)
+        f.flush()
+        os.fsync(f.fileno())
+    # Readers skip CSVs listed in "merged", so the swap is atomic for them
+    os.replace(tmp_path, os.path.join(path, COMPACT_FILE))
+    _remove(data_path)
+    for name in pending:
+        _remove(os.path.join(path, name))
+
+    result["cameras"] = len(index["cameras"])
+    result["bytes_out"] = os.path.getsize(os.path.join(path, COMPACT_FILE))
+    return result
+
+def compact_closed_partitions(before=None, root=DATA_LAKE_PATH, level=DATA_LAKE_COMPRESS_LEVEL):
+    """Compact every partition older than `before` (default: today); yields compact_partition results."""
+    before = before or datetime.date.today()
+    for day in partition_days(root):
+        if day >= before:
+            break
+        yield compact_partition(day, root, level)
@@ -0,0 +1,182 @@
+import os
+
+import cv2
+import numpy as np
+
+from app.config import (
+    DETECTOR_BACKEND, YOLO_MODEL_PATH, ONNX_MODEL_PATH, OPENVINO_MODEL_PATH,
+    CONF_THRESHOLD, IOU_THRESHOLD, VEHICLE_CLASSES
+)
+from app.services.inference import run_model, EMPTY_DETECTIONS, YOLO_INFER_KWARGS
+
+# Detector backends.
+#
+# Every backend exposes detect(frame, **overrides) -> (N, 6) float32 array of
+# [x1, y1, x2, y2, conf, coco_class] in frame pixel coordinates, so CameraAgent and
+# the inference worker processes do not care which runtime produced the boxes.
+
+class Detector:
+    name = "base"
+    # Whether detect() may be called from several threads at once without model_lock
+    thread_safe = False
+
+    def detect(self, frame, **overrides):
+        raise NotImplementedError
+
+class UltralyticsDetector(Detector):
+    """Eager PyTorch through ultralytics (the original path, supports TTA)."""
+    name = "ultralytics"
+
+    def __init__(self, model_path=YOLO_MODEL_PATH):
+        from ultralytics import YOLO
+        self.model = YOLO(model_path)
+
+    def detect(self, frame, **overrides):
+        return run_model(self.model, frame, **overrides)
+
+def letterbox(frame, size, color=114):
+    """
+    Resize keeping aspect ratio and pad to size x size (YOLOv8 preprocessing).
+    Returns (image, scale, (pad_x, pad_y)).
+    """
+    h, w = frame.shape[:2]
+    scale = min(size / float(h), size / float(w))
+    new_w, new_h = int(round(w * scale)), int(round(h * scale))
+    resized = cv2.resize(frame, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+    pad_x, pad_y = (size - new_w) // 2, (size - new_h) // 2
+    out = np.full((size, size, 3), color, dtype=np.uint8)
+    out[pad_y:pad_y + new_h, pad_x:pad_x + new_w] = resized
+    return out, scale, (pad_x, pad_y)
+
+def preprocess(frame, size, dtype=np.float32):
+    """BGR frame -> NCHW RGB blob in [0, 1], plus the letterbox transform."""
+    image, scale, pad = letterbox(frame, size)
+    blob = cv2.dnn.blobFromImage(image, 1.0 / 255.0, swapRB=True)
+    return blob.astype(dtype, copy=False), scale, pad
+
+def postprocess(output, scale, pad, frame_shape, conf=CONF_THRESHOLD, iou=IOU_THRESHOLD,
+                classes=VEHICLE_CLASSES):
+    """
+    Decode a raw YOLOv8 head output of shape (1, 4 + num_classes, anchors) into
+    the detection array, with class-aware NMS.
+    """
+    preds = np.squeeze(output, axis=0).T          # (anchors, 4 + nc)
+    scores_all = preds[:, 4:]
+    class_ids = scores_all.argmax(axis=1)
+    scores = scores_all[np.arange(len(preds)), class_ids]
+
+    keep = scores >= conf
+    if classes is not None:
+        keep &= np.isin(class_ids, classes)
+    if not keep.any():
+        return EMPTY_DETECTIONS
+    boxes, scores, class_ids = preds[keep, :4], scores[keep], class_ids[keep]
+
+    # cx, cy, w, h in letterbox space -> x, y, w, h in frame space
+    xywh = np.empty_like(boxes)
+    xywh[:, 0] = (boxes[:, 0] - boxes[:, 2] / 2 - pad[0]) / scale
+    xywh[:, 1] = (boxes[:, 1] - boxes[:, 3] / 2 - pad[1]) / scale
+    xywh[:, 2] = boxes[:, 2] / scale
+    xywh[:, 3] = boxes[:, 3] / scale
+
+    idx = cv2.dnn.NMSBoxesBatched(xywh.tolist(), scores.tolist(), class_ids.tolist(), conf, iou)
+    if len(idx) == 0:
+        return EMPTY_DETECTIONS
+    idx = np.asarray(idx).reshape(-1)
+
+    h, w = frame_shape[:2]
+    out = np.empty((len(idx), 6), dtype=np.float32)
+    out[:, 0] = np.clip(xywh[idx, 0], 0, w)
+    out[:, 1] = np.clip(xywh[idx, 1], 0, h)
+    out[:, 2] = np.clip(xywh[idx, 0] + xywh[idx, 2], 0, w)
+    out[:, 3] = np.clip(xywh[idx, 1] + xywh[idx, 3], 0, h)
+    out[:, 4] = scores[idx]
+    out[:, 5] = class_ids[idx]
+    return out
+
+class ExportedGraphDetector(Detector):
+    """
+    Shared pre/post-processing for exported YOLOv8 graphs. Test-time augmentation
+    is not part of an exported graph, so 'augment' overrides are ignored.
+    """
+    thread_safe = True
+
+    def __init__(self, static_size=None):
+        # Fixed input size if the graph was exported without dynamic axes
+        self.static_size = static_size
+        self.input_dtype = np.float32
+
+    def _input_size(self, overrides):
+        if self.static_size:
+            return self.static_size
+        return int(overrides.get("imgsz", YOLO_INFER_KWARGS["imgsz"]))
+
+    def _run(self, blob):
+        raise NotImplementedError
+
+    def detect(self, frame, **overrides):
+        size = self._input_size(overrides)
+        blob, scale, pad = preprocess(frame, size, self.input_dtype)
+        output = self._run(blob)
+        return postprocess(
+            output.astype(np.float32, copy=False), scale, pad, frame.shape,
+            conf=overrides.get("conf", CONF_THRESHOLD),
+            iou=overrides.get("iou", IOU_THRESHOLD),
+            classes=overrides.get("classes", VEHICLE_CLASSES),
+        )
+
+class OnnxDetector(ExportedGraphDetector):
+    """ONNX Runtime on CPU (FP32, FP16 or INT8 QDQ graphs from scripts/export_detector.py)."""
+    name = "onnx"
+
+    def __init__(self, model_path=ONNX_MODEL_PATH, intra_op_threads=None):
+        import onnxruntime as ort
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if intra_op_threads:
+            options.intra_op_num_threads = intra_op_threads
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        size = model_input.shape[-1]
+        super().__init__(static_size=size if isinstance(size, int) else None)
+        if model_input.type == "tensor(float16)":
+            self.input_dtype = np.float16
+
+    def _run(self, blob):
+        return self.session.run(None, {self.input_name: blob})[0]
+
+class OpenVinoDetector(ExportedGraphDetector):
+    """OpenVINO runtime on CPU (IR exported by scripts/export_detector.py)."""
+    name = "openvino"
+
+    def __init__(self, model_path=OPENVINO_MODEL_PATH):
+        import openvino as ov
+        core = ov.Core()
+        model = core.read_model(model_path)
+        self.compiled = core.compile_model(model, "CPU", {"PERFORMANCE_HINT": "THROUGHPUT"})
+        partial_shape = model.input(0).get_partial_shape()
+        size = partial_shape[3].get_length() if partial_shape[3].is_static else None
+        super().__init__(static_size=size)
+
+    def _run(self, blob):
+        # One infer request per call keeps concurrent callers independent
+        request = self.compiled.create_infer_request()
+        request.infer({0: blob})
+        return request.get_output_tensor(0).data.copy()
+
+BACKENDS = {
+    "ultralytics": (UltralyticsDetector, YOLO_MODEL_PATH),
+    "onnx": (OnnxDetector, ONNX_MODEL_PATH),
+    "openvino": (OpenVinoDetector, OPENVINO_MODEL_PATH),
+}
+
+def create_detector(backend=DETECTOR_BACKEND, model_path=None):
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown detector backend '{backend}' (choose from {', '.join(BACKENDS)})")
+    cls, default_path = BACKENDS[backend]
+    path = model_path or default_path
+    # ultralytics resolves/downloads .pt weights itself; exported graphs must exist locally
+    if backend != "ultralytics" and not os.path.exists(path):
+        raise FileNotFoundError(f"Model for backend '{backend}' not found at {path} (see scripts/export_detector.py)")
+    return cls(path)
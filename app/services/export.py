@@ -0,0 +1,159 @@
+import csv
+import datetime
+import io
+import json
+import sqlite3
+import struct
+
+import numpy as np
+
+from app.config import EXPORT_BATCH_SIZE
+from app.database import DB_PATH
+
+# Streaming export of traffic_history.
+#
+# Rows are pulled with fetchmany() in EXPORT_BATCH_SIZE batches and turned into
+# output chunks one batch at a time, so memory stays flat however large the
+# range is. The same generators back scripts/export_data.py and /api/export.
+
+COUNT_FIELDS = ["total_count", "car_count", "motorcycle_count", "new_count", "new_cars", "new_motors"]
+# "Timestamp" is second-precision local time for people; "Unix Timestamp" is the
+# exact stored value, so bulk_import can dedupe re-imported exports
+CSV_HEADER = ["Timestamp", "Camera ID", "Location Name", "Total Count", "Car Count", "Motorcycle Count",
+              "New Count", "New Cars", "New Motors", "Unix Timestamp"]
+
+def iter_history_batches(start_ts=None, end_ts=None, camera_ids=None, batch_size=EXPORT_BATCH_SIZE,
+                         db_path=DB_PATH):
+    """Yield lists of (camera_id, timestamp, *COUNT_FIELDS) rows ordered by camera, then time."""
+    conditions = []
+    params = []
+    if camera_ids:
+        conditions.append(f"camera_id IN ({','.join('?' * len(camera_ids))})")
+        params.extend(camera_ids)
+    if start_ts is not None:
+        conditions.append("timestamp >= ?")
+        params.append(start_ts)
+    if end_ts is not None:
+        conditions.append("timestamp < ?")
+        params.append(end_ts)
+    where_clause = ("WHERE " + " AND ".join(conditions)) if conditions else ""
+
+    # Read-only connection: never blocks the agents' inserts for longer than a page read
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        cursor = conn.execute(f"""
+            SELECT camera_id, timestamp, {', '.join(COUNT_FIELDS)}
+            FROM traffic_history
+            {where_clause}
+            ORDER BY camera_id, timestamp
+        """, params)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield rows
+    finally:
+        conn.close()
+
+def local_time_str(ts):
+    # Same text as SQLite datetime(timestamp, 'unixepoch', 'localtime')
+    return datetime.datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M:%S")
+
+def csv_chunks(batches, camera_names=None):
+    """CSV text, one chunk per batch (header first)."""
+    camera_names = camera_names or {}
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(CSV_HEADER)
+    for rows in batches:
+        for cam_id, ts, *counts in rows:
+            writer.writerow([local_time_str(ts), cam_id, camera_names.get(cam_id, cam_id), *counts, ts])
+        yield buf.getvalue()
+        buf.seek(0)
+        buf.truncate()
+    if buf.tell():
+        yield buf.getvalue()
+
+def ndjson_chunks(batches, camera_names=None):
+    """Newline-delimited JSON, one object per row."""
+    camera_names = camera_names or {}
+    for rows in batches:
+        lines = []
+        for cam_id, ts, *counts in rows:
+            record = {"ts": ts, "time": local_time_str(ts), "camera_id": cam_id,
+                      "camera_name": camera_names.get(cam_id, cam_id)}
+            record.update(zip(COUNT_FIELDS, counts))
+            lines.append(json.dumps(record))
+        yield "\n".join(lines) + "\n"
+
+# Binary columnar format (.stc)
+#
+#   file header:  b"STXC" | u16 version | u16 number of count columns
+#   per chunk:    u32 rows | u16 cameras | cameras x (u8 len, utf-8 id)
+#                 u16[rows] camera index | f64[rows] timestamp | i32[rows] per count column
+#   end marker:   u32 0
+#
+# All little-endian. Camera ids are dictionary-encoded per chunk, so a chunk is
+# self-contained and can be decoded without reading the rest of the file.
+
+COLUMNAR_MAGIC = b"STXC"
+COLUMNAR_VERSION = 1
+
+def columnar_chunks(batches):
+    yield COLUMNAR_MAGIC + struct.pack("<HH", COLUMNAR_VERSION, len(COUNT_FIELDS))
+    for rows in batches:
+        cam_ids = [r[0] for r in rows]
+        cameras = list(dict.fromkeys(cam_ids))
+        index = {cam_id: i for i, cam_id in enumerate(cameras)}
+
+        parts = [struct.pack("<IH", len(rows), len(cameras))]
+        for cam_id in cameras:
+            encoded = cam_id.encode("utf-8")
+            parts.append(struct.pack("<B", len(encoded)) + encoded)
+        parts.append(np.fromiter((index[c] for c in cam_ids), dtype="<u2", count=len(rows)).tobytes())
+        parts.append(np.fromiter((r[1] for r in rows), dtype="<f8", count=len(rows)).tobytes())
+        counts = np.array([r[2:] for r in rows], dtype="<i4").reshape(len(rows), len(COUNT_FIELDS))
+        for col in range(len(COUNT_FIELDS)):
+            parts.append(np.ascontiguousarray(counts[:, col]).tobytes())
+        yield b"".join(parts)
+    yield struct.pack("<I", 0)
+
+def read_columnar(f):
+    """Decode a .stc stream. Yields one dict of column arrays per chunk (camera_id as an object array)."""
+    header = f.read(8)
+    if header[:4] != COLUMNAR_MAGIC:
+        raise ValueError("Not a columnar traffic export")
+    _, n_cols = struct.unpack("<HH", header[4:])
+    while True:
+        (n_rows,) = struct.unpack("<I", f.read(4))
+        if n_rows == 0:
+            return
+        (n_cameras,) = struct.unpack("<H", f.read(2))
+        cameras = []
+        for _ in range(n_cameras):
+            (length,) = struct.unpack("<B", f.read(1))
+            cameras.append(f.read(length).decode("utf-8"))
+        codes = np.frombuffer(f.read(2 * n_rows), dtype="<u2")
+        chunk = {
+            "camera_id": np.array(cameras, dtype=object)[codes],
+            "timestamp": np.frombuffer(f.read(8 * n_rows), dtype="<f8"),
+        }
+        for name in COUNT_FIELDS[:n_cols]:
+            chunk[name] = np.frombuffer(f.read(4 * n_rows), dtype="<i4")
+        yield chunk
+
+FORMATS = {
+    # name: (extension, mimetype, binary)
+    "csv": ("csv", "text/csv", False),
+    "ndjson": ("ndjson", "application/x-ndjson", False),
+    "columnar": ("stc", "application/octet-stream", True),
+}
+
+def export_chunks(fmt, batches, camera_names=None):
+    if fmt == "csv":
+        return csv_chunks(batches, camera_names)
+    if fmt == "ndjson":
+        return ndjson_chunks(batches, camera_names)
+    if fmt == "columnar":
+        return columnar_chunks(batches)
+    raise ValueError(f"Unknown export format '{fmt}' (choose from {', '.join(FORMATS)})")
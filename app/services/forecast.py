@@ -0,0 +1,284 @@
+import datetime
+import json
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from app.config import (
+    FORECAST_HISTORY_DAYS, FORECAST_REFIT_SECONDS, FORECAST_FULL_RELOAD_SECONDS,
+    FORECAST_WEEK_DECAY, FORECAST_DAY_DECAY, FORECAST_LAGS, FORECAST_RIDGE_ALPHA,
+    FORECAST_MAX_AR_HORIZON, FORECAST_MIN_SLOT_WEIGHT, FORECAST_CACHE_SIZE
+)
+from app.database import get_db_connection
+from app.services.backfill import utc_offset
+from app.services.metrics import registry
+
+# Traffic forecasting.
+#
+# Per camera, hourly vehicle flow (SUM(new_count) per local hour) is modelled as
+#   seasonal baseline (day-of-week x hour, recency weighted; falls back to the
+#                      hour-of-day profile, then the camera mean)
+#   + ridge AR on recent residuals (lags FORECAST_LAGS), iterated for future hours.
+# Every camera is fitted and scored at once with (cameras x hours) NumPy arrays.
+
+WEEK_SLOTS = 7 * 24
+
+def hour_index(ts, offset):
+    """Local hours since the epoch."""
+    return int((ts + offset) // 3600)
+
+def week_slot(hours):
+    """SQLite-style weekday (0 = Sunday) * 24 + hour, for local hour indices. 1970-01-01 was a Thursday."""
+    hours = np.asarray(hours)
+    return ((hours // 24 + 4) % 7) * 24 + hours % 24
+
+class ForecastModel:
+    """Fitted parameters for all cameras; immutable once built."""
+
+    def __init__(self, camera_ids, weekly, daily, beta, scale, z_tail, last_hour, offset, version):
+        self.camera_ids = camera_ids
+        self.index = {cam_id: i for i, cam_id in enumerate(camera_ids)}
+        self.weekly = weekly            # (C, 168) baseline per weekday/hour slot
+        self.daily = daily              # (C, 24) hour-of-day profile
+        self.beta = beta                # (C, len(FORECAST_LAGS)) AR coefficients on scaled residuals
+        self.scale = scale              # (C,) residual scale
+        self.z_tail = z_tail            # (C, max lag) latest scaled residuals
+        self.last_hour = last_hour      # last complete local hour used for fitting
+        self.offset = offset
+        self.version = version
+        self.fitted_at = time.time()
+
+    def _residual_path(self, steps):
+        """Scaled residual forecasts for hours last_hour+1 .. last_hour+steps, shape (C, steps)."""
+        lags = FORECAST_LAGS
+        buf = [self.z_tail[:, -k] for k in range(self.z_tail.shape[1], 0, -1)]
+        out = np.zeros((len(self.camera_ids), steps))
+        for step in range(steps):
+            z = sum(self.beta[:, j] * buf[-lag] for j, lag in enumerate(lags))
+            buf.append(z)
+            out[:, step] = z
+        return out
+
+    def predict_hours(self, hours):
+        """Forecast vehicles/hour for every camera at the given local hour indices, shape (C, len(hours))."""
+        hours = np.asarray(hours, dtype=np.int64)
+        pred = self.weekly[:, week_slot(hours)]
+        ahead = hours - self.last_hour
+        use_ar = (ahead >= 1) & (ahead <= FORECAST_MAX_AR_HORIZON)
+        if use_ar.any():
+            path = self._residual_path(int(ahead[use_ar].max()))
+            pred[:, use_ar] += self.scale[:, None] * path[:, ahead[use_ar] - 1]
+        return np.maximum(pred, 0.0)
+
+    def predict_at(self, ts):
+        """Forecast for every camera at one timestamp, shape (C,)."""
+        return self.predict_hours([hour_index(ts, self.offset)])[:, 0]
+
+def fit(camera_ids, hourly, first_hour, offset, version):
+    """
+    hourly: (C, H) vehicles per local hour starting at first_hour; NaN where the
+    camera produced no rows (offline). The last column is the last complete hour.
+    """
+    n_cams, n_hours = hourly.shape
+    hours = first_hour + np.arange(n_hours)
+    last_hour = hours[-1]
+    observed = ~np.isnan(hourly)
+    y = np.where(observed, hourly, 0.0)
+    age_days = (last_hour - hours) // 24
+
+    # Seasonal baselines as weighted one-hot projections (no per-camera loops)
+    slots = week_slot(hours)
+    week_onehot = np.zeros((n_hours, WEEK_SLOTS))
+    week_onehot[np.arange(n_hours), slots] = 1.0
+    day_onehot = np.zeros((n_hours, 24))
+    day_onehot[np.arange(n_hours), hours % 24] = 1.0
+
+    w_week = FORECAST_WEEK_DECAY ** (age_days // 7)
+    w_day = FORECAST_DAY_DECAY ** age_days
+    week_den = (observed * w_week) @ week_onehot
+    week_num = (y * w_week) @ week_onehot
+    day_den = (observed * w_day) @ day_onehot
+    day_num = (y * w_day) @ day_onehot
+
+    counts = observed.sum(axis=1)
+    cam_mean = np.divide(y.sum(axis=1), counts, out=np.zeros(n_cams), where=counts > 0)
+    daily = np.where(day_den > 0, day_num / np.maximum(day_den, 1e-12), cam_mean[:, None])
+    weekly = np.where(
+        week_den >= FORECAST_MIN_SLOT_WEIGHT,
+        week_num / np.maximum(week_den, 1e-12),
+        daily[:, np.arange(WEEK_SLOTS) % 24]
+    )
+
+    # Residuals, scaled per camera so one ridge alpha fits all
+    resid = np.where(observed, hourly - weekly[:, slots], np.nan)
+    scale = np.nanstd(np.where(observed.any(axis=1)[:, None], resid, 0.0), axis=1)
+    scale = np.nan_to_num(scale) + 1.0
+    z = resid / scale[:, None]
+
+    lags = np.asarray(FORECAST_LAGS)
+    max_lag = int(lags.max())
+    if n_hours > max_lag + 1:
+        target = z[:, max_lag:]
+        design = np.stack([z[:, max_lag - lag:n_hours - lag] for lag in lags], axis=2)   # (C, T, L)
+        valid = ~np.isnan(target) & ~np.isnan(design).any(axis=2)
+        sample_w = np.where(valid, w_day[max_lag:], 0.0)
+        design = np.nan_to_num(design)
+        target = np.nan_to_num(target)
+        xtx = np.einsum("cti,ctj,ct->cij", design, design, sample_w)
+        xty = np.einsum("cti,ct,ct->ci", design, target, sample_w)
+        xtx += FORECAST_RIDGE_ALPHA * np.eye(len(lags))
+        beta = np.linalg.solve(xtx, xty[..., None])[..., 0]
+    else:
+        beta = np.zeros((n_cams, len(lags)))
+
+    z_tail = np.nan_to_num(z[:, -max_lag:]) if n_hours >= max_lag else np.zeros((n_cams, max_lag))
+    return ForecastModel(camera_ids, weekly, daily, beta, scale, z_tail, int(last_hour), offset, version)
+
+class ForecastEngine:
+    """
+    Hourly rollups kept in memory and topped up from rows newer than a rowid
+    watermark, plus the current fitted model. Refits happen in the background
+    every FORECAST_REFIT_SECONDS; callers always get the latest finished model.
+    """
+
+    def __init__(self):
+        self.rollups = {}            # camera_id -> {local hour index: vehicles}
+        self.last_rowid = 0
+        self.loaded_at = 0.0
+        self.model = None
+        self.version = 0
+        self._lock = threading.Lock()
+        self._refit_thread = None
+        # Serialized batch responses keyed by model version and request
+        self._batch_cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+
+    def _pull(self, offset, full):
+        now = time.time()
+        if full:
+            self.rollups = {}
+            self.last_rowid = 0
+            self.loaded_at = now
+        since = now - FORECAST_HISTORY_DAYS * 86400
+        conn = get_db_connection()
+        try:
+            top = conn.execute("SELECT MAX(id) FROM traffic_history").fetchone()[0] or 0
+            rows = conn.execute("""
+                SELECT camera_id, CAST((timestamp + ?) / 3600 AS INTEGER) AS hour, SUM(new_count)
+                FROM traffic_history
+                WHERE id > ? AND id <= ? AND timestamp >= ?
+                GROUP BY camera_id, hour
+            """, (offset, self.last_rowid, top, since)).fetchall()
+        finally:
+            conn.close()
+        for cam_id, hour, total in rows:
+            cam = self.rollups.setdefault(cam_id, {})
+            cam[hour] = cam.get(hour, 0) + (total or 0)
+        self.last_rowid = top
+
+        # Drop hours that fell out of the window
+        oldest = hour_index(since, offset)
+        for cam in self.rollups.values():
+            for hour in [h for h in cam if h < oldest]:
+                del cam[hour]
+
+    def refresh(self, full=False, camera_ids=None):
+        """Pull new rows and refit. camera_ids adds cameras with no data yet (forecast 0)."""
+        with self._lock:
+            now = time.time()
+            offset = utc_offset(now)
+            full = full or not self.loaded_at or now - self.loaded_at > FORECAST_FULL_RELOAD_SECONDS
+            self._pull(offset, full)
+
+            cams = sorted(set(self.rollups) | set(camera_ids or ()))
+            last_hour = hour_index(now, offset) - 1          # current hour is still filling
+            first_hour = last_hour - FORECAST_HISTORY_DAYS * 24 + 1
+            hourly = np.full((len(cams), last_hour - first_hour + 1), np.nan)
+            for i, cam_id in enumerate(cams):
+                for hour, total in self.rollups.get(cam_id, {}).items():
+                    if first_hour <= hour <= last_hour:
+                        hourly[i, hour - first_hour] = total
+            self.version += 1
+            self.model = fit(cams, hourly, first_hour, offset, self.version)
+            return self.model
+
+    def get_model(self, camera_ids=None):
+        """Latest model; fits synchronously the first time, then refits in the background when stale."""
+        model = self.model
+        if model is None:
+            return self.refresh(camera_ids=camera_ids)
+        stale = time.time() - model.fitted_at > FORECAST_REFIT_SECONDS
+        missing = camera_ids and any(c not in model.index for c in camera_ids)
+        if (stale or missing) and not (self._refit_thread and self._refit_thread.is_alive()):
+            self._refit_thread = threading.Thread(
+                target=self.refresh, kwargs={"camera_ids": camera_ids}, name="forecast-refit", daemon=True
+            )
+            self._refit_thread.start()
+        return model
+
+    def predict(self, camera_ids, ts):
+        """{camera_id: vehicles/hour} at ts for the given cameras, scored in one pass."""
+        model = self.get_model(camera_ids)
+        values = model.predict_at(ts)
+        return {cam_id: float(values[model.index[cam_id]]) if cam_id in model.index else 0.0
+                for cam_id in camera_ids}
+
+    def batch_json(self, cameras, hours, week_grid=False):
+        """
+        JSON body with forecasts for every camera over the `hours` hours starting
+        at the current one, or (week_grid) a weekday x hour grid over the next week.
+        Bodies are cached per model version, start hour and camera set, so
+        repeated dashboard/time-slider requests within the hour are a dict lookup.
+        """
+        camera_ids = [cam["id"] for cam in cameras]
+        model = self.get_model(camera_ids)
+        start = hour_index(time.time(), model.offset)
+        key = (model.version, start, hours, week_grid, hash(tuple(camera_ids)))
+        with self._cache_lock:
+            body = self._batch_cache.get(key)
+            if body is not None:
+                self._batch_cache.move_to_end(key)
+        registry.inc("forecast_batch_requests_total", 1, "Batch forecast requests by cache result",
+                     cache="hit" if body is not None else "miss")
+        if body is not None:
+            return body
+
+        hour_range = start + np.arange(hours)
+        values = np.rint(model.predict_hours(hour_range)).astype(int)
+        rows = [model.index.get(cam_id) for cam_id in camera_ids]
+        payload = {
+            "status": "success",
+            "model_version": model.version,
+            "fitted_at": model.fitted_at,
+            "start": datetime.datetime.fromtimestamp(start * 3600 - model.offset).isoformat(),
+        }
+        if week_grid:
+            # grid[weekday][hour], weekday 0 = Sunday, each slot at its next occurrence
+            slots = week_slot(hour_range)
+            order = np.argsort(slots)
+            payload["grid_axes"] = {"weekday": list(range(7)), "hour": list(range(24))}
+            payload["cameras"] = [
+                {"camera_id": cam["id"], "camera_name": cam.get("name"),
+                 "grid": (values[row, order].reshape(7, 24).tolist() if row is not None
+                          else [[0] * 24 for _ in range(7)])}
+                for cam, row in zip(cameras, rows)
+            ]
+        else:
+            payload["hours"] = [int(h * 3600 - model.offset) for h in hour_range]
+            payload["cameras"] = [
+                {"camera_id": cam["id"], "camera_name": cam.get("name"),
+                 "forecast": values[row].tolist() if row is not None else [0] * hours}
+                for cam, row in zip(cameras, rows)
+            ]
+        body = json.dumps(payload, separators=(",", ":"))
+
+        with self._cache_lock:
+            self._batch_cache[key] = body
+            # Entries of older model versions/hours age out first
+            while len(self._batch_cache) > FORECAST_CACHE_SIZE:
+                self._batch_cache.popitem(last=False)
+        return body
+
+engine = ForecastEngine()
@@ -0,0 +1,84 @@
+import random
+import threading
+
+from app.config import (
+    CAMERA_FAILURE_THRESHOLD, CAMERA_BACKOFF_BASE, CAMERA_BACKOFF_MAX, CAMERA_BACKOFF_JITTER,
+    CAMERA_MAX_CONCURRENT_CONNECTS
+)
+
+# Per-camera connection health (circuit breaker).
+#
+# closed:    connect every cycle.
+# open:      after CAMERA_FAILURE_THRESHOLD consecutive failures, skip the camera
+#            until retry_at; the wait doubles with every failed probe (capped at
+#            CAMERA_BACKOFF_MAX) and is jittered so dead cameras do not probe in step.
+# half_open: retry_at has passed and one probe connection is in flight; success
+#            closes the breaker, failure reopens it with a longer wait.
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+HEALTH_CODES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+HEALTH_NAMES = {v: k for k, v in HEALTH_CODES.items()}
+
+# Connection attempts in flight across all cameras (VideoCapture opens block for
+# up to the open timeout, so unbounded attempts pile up threads and sockets)
+connect_slots = threading.BoundedSemaphore(CAMERA_MAX_CONCURRENT_CONNECTS)
+
+def health_dict(state, failures, retry_at):
+    """JSON form used by /api/stats (also rebuilt from the shared live state)."""
+    return {"state": state, "consecutive_failures": failures, "retry_at": retry_at if state != CLOSED else None}
+
+class CameraHealth:
+    def __init__(self, threshold=CAMERA_FAILURE_THRESHOLD, base=CAMERA_BACKOFF_BASE, cap=CAMERA_BACKOFF_MAX,
+                 jitter=CAMERA_BACKOFF_JITTER, rng=None):
+        self.threshold = threshold
+        self.base = base
+        self.cap = cap
+        self.jitter = jitter
+        self.rng = rng or random
+        self.state = CLOSED
+        self.failures = 0       # consecutive
+        self.retry_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self, now):
+        """True if the camera should try to connect now (moves open -> half_open when due)."""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and now >= self.retry_at:
+                self.state = HALF_OPEN
+                return True
+            return False
+
+    def skip(self):
+        """An allowed attempt did not happen (no free connect slot); the next cycle may probe again."""
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self.state = OPEN
+
+    def backoff(self):
+        """Seconds until the next probe after the current run of failures."""
+        delay = min(self.cap, self.base * 2 ** max(0, self.failures - self.threshold))
+        return delay * (1 - self.jitter * self.rng.random())
+
+    def record_success(self):
+        """Returns the previous state (so callers can log recoveries)."""
+        with self._lock:
+            previous = self.state
+            self.state = CLOSED
+            self.failures = 0
+            self.retry_at = 0.0
+            return previous
+
+    def record_failure(self, now):
+        """Returns the new state."""
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN or self.failures >= self.threshold:
+                self.state = OPEN
+                self.retry_at = now + self.backoff()
+            return self.state
+
+    def snapshot(self):
+        with self._lock:
+            return health_dict(self.state, self.failures, self.retry_at)
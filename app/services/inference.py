@@ -0,0 +1,274 @@
+import multiprocessing as mp
+import os
+import queue
+import threading
+import itertools
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from app.config import (
+    CONF_THRESHOLD, IOU_THRESHOLD, VEHICLE_CLASSES,
+    INFERENCE_SLOT_SHAPE, INFERENCE_THREADS_PER_PROCESS, INFERENCE_TIMEOUT
+)
+
+# Detection array layout returned by every inference path: one row per box
+# [x1, y1, x2, y2, confidence, coco_class_id]
+DETECTION_COLUMNS = 6
+EMPTY_DETECTIONS = np.zeros((0, DETECTION_COLUMNS), dtype=np.float32)
+
+# imgsz=1280 for better small object detection, augment=True for TTA (Robustness)
+YOLO_INFER_KWARGS = {
+    "conf": CONF_THRESHOLD,
+    "iou": IOU_THRESHOLD,
+    "classes": VEHICLE_CLASSES,
+    "verbose": False,
+    "imgsz": 1280,
+    "augment": True,
+    "agnostic_nms": False,
+}
+
+def run_model(model, frame, **overrides):
+    """
+    Run the YOLO model on a frame and return an (N, 6) float32 detection array.
+    overrides replace entries of YOLO_INFER_KWARGS (e.g. a smaller imgsz for ROI crops).
+    """
+    kwargs = dict(YOLO_INFER_KWARGS, **overrides) if overrides else YOLO_INFER_KWARGS
+    results = model(frame, **kwargs)
+    return results_to_array(results)
+
+def results_to_array(results):
+    if not results:
+        return EMPTY_DETECTIONS
+    parts = []
+    for result in results:
+        boxes = result.boxes
+        if boxes is None or len(boxes) == 0:
+            continue
+        parts.append(np.hstack([
+            boxes.xyxy.cpu().numpy(),
+            boxes.conf.cpu().numpy().reshape(-1, 1),
+            boxes.cls.cpu().numpy().reshape(-1, 1),
+        ]).astype(np.float32))
+    if not parts:
+        return EMPTY_DETECTIONS
+    return np.vstack(parts)
+
+def _worker_main(worker_idx, slot_names, slot_shape, task_queue, result_queue, running, backend, model_path,
+                 small_spec, num_threads):
+    """Entry point of one inference process. Holds its own model copies."""
+    if num_threads:
+        os.environ["OMP_NUM_THREADS"] = str(num_threads)
+        try:
+            import torch
+            torch.set_num_threads(num_threads)
+        except ImportError:
+            pass
+
+    from app.services.detectors import create_detector
+    detectors = {"large": create_detector(backend, model_path)}
+    if small_spec:
+        # Cascade first stage
+        detectors["small"] = create_detector(*small_spec)
+
+    slots = [shared_memory.SharedMemory(name=name) for name in slot_names]
+    print(f"[INFO] Inference worker {worker_idx} ready (pid {os.getpid()})")
+    result_queue.put(("ready", worker_idx, None))
+
+    try:
+        while True:
+            task = task_queue.get()
+            if task is None:
+                break
+            task_id, slot_idx, shape, payload, stage, overrides = task
+            # Shared memory, written synchronously: survives the process dying mid-task
+            running[worker_idx] = task_id
+            try:
+                if payload is not None:
+                    # Oversized frame sent inline instead of through a slot
+                    frame = payload
+                else:
+                    # Zero-copy view onto the shared slot
+                    frame = np.ndarray(shape, dtype=np.uint8, buffer=slots[slot_idx].buf)
+                result_queue.put((task_id, detectors[stage].detect(frame, **overrides), None))
+            except Exception as e:
+                result_queue.put((task_id, None, str(e)))
+            running[worker_idx] = -1
+    finally:
+        for shm in slots:
+            shm.close()
+
+class InferenceProcessPool:
+    """
+    N inference processes, each with its own model, fed through shared-memory frame slots.
+
+    The parent copies a frame into a free slot (one memcpy, no pickling) and queues
+    only the slot index. Workers read the frame in place and send back the small
+    detection array. Slots are recycled once the result arrives, when the caller
+    gives up waiting, or when the worker running the task dies (it is restarted).
+    """
+
+    def __init__(self, num_workers, backend, model_path=None, small_spec=None,
+                 slot_shape=INFERENCE_SLOT_SHAPE, threads_per_worker=INFERENCE_THREADS_PER_PROCESS):
+        self.num_workers = num_workers
+        self.slot_shape = tuple(slot_shape)
+        self.slot_bytes = int(np.prod(self.slot_shape))
+        self._ctx = mp.get_context("spawn")
+        self._task_queue = self._ctx.Queue()
+        self._result_queue = self._ctx.Queue()
+        # Two slots per worker so the next frame can be staged while one is in flight
+        self._slots = [shared_memory.SharedMemory(create=True, size=self.slot_bytes)
+                       for _ in range(num_workers * 2)]
+        self._free_slots = queue.Queue()
+        for idx in range(len(self._slots)):
+            self._free_slots.put(idx)
+        self._pending = {}   # task_id -> (Future, slot_idx)
+        self._pending_lock = threading.Lock()
+        self._ids = itertools.count()
+        self._ready = threading.Semaphore(0)
+        self._processes = []
+        # Task id each worker is running (-1 = idle), so a dead worker's task can be failed
+        self._running = self._ctx.Array("q", [-1] * num_workers, lock=False)
+        self._stopping = False
+        self._collector = None
+        self._backend = backend
+        self._model_path = model_path
+        # (backend, model_path) of the cascade small model, if any
+        self._small_spec = small_spec
+        self._threads_per_worker = threads_per_worker
+
+    def _spawn(self, idx):
+        proc = self._ctx.Process(
+            target=_worker_main,
+            args=(idx, [shm.name for shm in self._slots], self.slot_shape, self._task_queue, self._result_queue,
+                  self._running, self._backend, self._model_path, self._small_spec, self._threads_per_worker),
+            name=f"inference-{idx}",
+            daemon=True
+        )
+        proc.start()
+        return proc
+
+    def start(self, wait_ready=True):
+        for idx in range(self.num_workers):
+            self._processes.append(self._spawn(idx))
+
+        self._collector = threading.Thread(target=self._collect, name="inference-collector", daemon=True)
+        self._collector.start()
+
+        if wait_ready:
+            for _ in range(self.num_workers):
+                self._ready.acquire()
+        print(f"[INFO] Inference pool started with {self.num_workers} processes")
+
+    def submit(self, frame, stage="large", slot_timeout=INFERENCE_TIMEOUT, **overrides):
+        """
+        Queue a frame for detection on the "large" (or cascade "small") model.
+        Returns a Future resolving to an (N, 6) array; the Future's task_id can be
+        passed to abandon(). Raises TimeoutError if no slot frees up in slot_timeout.
+        """
+        future = Future()
+        task_id = next(self._ids)
+        future.task_id = task_id
+
+        frame = np.ascontiguousarray(frame, dtype=np.uint8)
+        slot_idx = payload = None
+        if frame.nbytes <= self.slot_bytes:
+            try:
+                slot_idx = self._free_slots.get(timeout=slot_timeout)
+            except queue.Empty:
+                raise TimeoutError(f"No free inference slot within {slot_timeout}s")
+            view = np.ndarray(frame.shape, dtype=np.uint8, buffer=self._slots[slot_idx].buf)
+            view[...] = frame
+        else:
+            # Oversized frame: pickled inline, no slot needed
+            payload = frame
+
+        with self._pending_lock:
+            self._pending[task_id] = (future, slot_idx)
+        self._task_queue.put((task_id, slot_idx, frame.shape, payload, stage, overrides))
+        return future
+
+    def detect(self, frame, timeout=None, stage="large", **overrides):
+        slot_timeout = INFERENCE_TIMEOUT if timeout is None else timeout
+        future = self.submit(frame, stage=stage, slot_timeout=slot_timeout, **overrides)
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeout:
+            self.abandon(future.task_id)
+            raise
+
+    def abandon(self, task_id, error=None):
+        """
+        Stop waiting for a task: its slot goes back to the pool and a late result is
+        dropped. A worker still reading the slot can only corrupt that dropped result.
+        """
+        with self._pending_lock:
+            future, slot_idx = self._pending.pop(task_id, (None, None))
+        if slot_idx is not None:
+            self._free_slots.put(slot_idx)
+        if future is not None and not future.done():
+            if error:
+                future.set_exception(RuntimeError(error))
+            else:
+                future.cancel()
+
+    def _check_workers(self):
+        """Restart dead workers and fail the task each one was running."""
+        for idx, proc in enumerate(self._processes):
+            if proc.is_alive() or self._stopping:
+                continue
+            print(f"[WARN] Inference worker {idx} died (exit code {proc.exitcode}); restarting")
+            task_id = self._running[idx]
+            self._running[idx] = -1
+            if task_id >= 0:
+                self.abandon(task_id, error=f"Inference worker {idx} died")
+            self._processes[idx] = self._spawn(idx)
+
+    def _collect(self):
+        last_check = time.monotonic()
+        while True:
+            if time.monotonic() - last_check >= 1.0:
+                self._check_workers()
+                last_check = time.monotonic()
+            try:
+                task_id, detections, error = self._result_queue.get(timeout=1.0)
+            except queue.Empty:
+                continue
+            except (EOFError, OSError):
+                break
+            if task_id == "ready":
+                self._ready.release()
+                continue
+            if task_id is None:
+                break
+            with self._pending_lock:
+                future, slot_idx = self._pending.pop(task_id, (None, None))
+            if slot_idx is not None:
+                self._free_slots.put(slot_idx)
+            if future is None:
+                continue
+            if error:
+                future.set_exception(RuntimeError(error))
+            else:
+                future.set_result(detections)
+
+    def stop(self):
+        self._stopping = True
+        for _ in self._processes:
+            self._task_queue.put(None)
+        for proc in self._processes:
+            proc.join(timeout=10)
+            if proc.is_alive():
+                proc.terminate()
+        self._result_queue.put((None, None, None))
+        if self._collector:
+            self._collector.join(timeout=5)
+        with self._pending_lock:
+            for future, _ in self._pending.values():
+                future.cancel()
+            self._pending.clear()
+        for shm in self._slots:
+            shm.close()
+            shm.unlink()
@@ -0,0 +1,130 @@
+import datetime
+import multiprocessing as mp
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+from app.config import DATA_LAKE_PATH, LAKE_SCAN_PROCESSES, LAKE_DAY_CACHE_SIZE
+from app.services.datalake import day_summary, partition_signature
+from app.services.metrics import registry
+
+# Multi-day data-lake reports (/api/datalake/range).
+#
+# A report is the sum of per-day summaries (datalake.day_summary: vehicle totals
+# per camera and hour). Days missing from the cache are scanned in parallel on a
+# process pool, since scanning loose CSVs is CPU bound. Closed days are cached
+# until their partition's files change (compaction, late rows, backfills), which
+# partition_signature detects with one listdir + stat per day; today is always
+# rescanned.
+
+RANGE_FIELDS = ["period", "total", "car", "motorcycle"]
+
+def _scan_day(day_iso, root):
+    """Process-pool task (module level so it pickles)."""
+    return day_summary(datetime.date.fromisoformat(day_iso), root=root)
+
+class RangeAnalytics:
+    def __init__(self, root=DATA_LAKE_PATH, processes=LAKE_SCAN_PROCESSES, cache_size=LAKE_DAY_CACHE_SIZE):
+        self.root = root
+        self.processes = processes
+        self.cache_size = cache_size
+        self._cache = OrderedDict()     # date -> (partition signature, summary)
+        self._lock = threading.Lock()
+        self._pool = None
+
+    def _executor(self):
+        with self._lock:
+            if self._pool is None:
+                # spawn: workers must not inherit the server's threads and sockets
+                self._pool = ProcessPoolExecutor(self.processes, mp_context=mp.get_context("spawn"))
+            return self._pool
+
+    def day_summaries(self, days):
+        """({day: summary or None}, number of days served from the cache)."""
+        today = datetime.date.today()
+        summaries = {}
+        misses = []
+        hits = 0
+        for day in days:
+            signature = partition_signature(day, self.root)
+            if signature is None:
+                summaries[day] = None
+                continue
+            with self._lock:
+                cached = self._cache.get(day)
+                if cached is not None and cached[0] == signature:
+                    self._cache.move_to_end(day)
+                    summaries[day] = cached[1]
+                    hits += 1
+                    continue
+            misses.append((day, signature))
+
+        if len(misses) > 1 and self.processes > 0:
+            scanned = list(self._executor().map(_scan_day, [day.isoformat() for day, _ in misses],
+                                                [self.root] * len(misses)))
+        else:
+            scanned = [day_summary(day, root=self.root) for day, _ in misses]
+
+        for (day, signature), summary in zip(misses, scanned):
+            summaries[day] = summary
+            if day < today and summary is not None:
+                with self._lock:
+                    self._cache[day] = (signature, summary)
+                    self._cache.move_to_end(day)
+                    while len(self._cache) > self.cache_size:
+                        self._cache.popitem(last=False)
+
+        registry.inc("lake_range_days_total", hits, "Days summed by range reports", source="cache")
+        registry.inc("lake_range_days_total", len(misses), "Days summed by range reports", source="scan")
+        return summaries, hits
+
+    def report(self, start, end, camera_ids=None, breakdown="daily"):
+        """Totals by camera and a daily or hourly series by class for [start, end] (dates, inclusive)."""
+        days = [start + datetime.timedelta(days=i) for i in range((end - start).days + 1)]
+        summaries, cached = self.day_summaries(days)
+        wanted = set(camera_ids) if camera_ids else None
+
+        totals = {"total": 0, "car": 0, "motorcycle": 0}
+        by_camera = {}
+        series = []
+        for day in days:
+            periods = [[0, 0, 0] for _ in range(24 if breakdown == "hourly" else 1)]
+            for camera_id, camera in (summaries[day] or {}).items():
+                if wanted is not None and camera_id not in wanted:
+                    continue
+                entry = by_camera.setdefault(camera_id, {"name": camera["name"], "total": 0, "car": 0, "motorcycle": 0})
+                for hour, (total, cars, motors) in camera["hours"].items():
+                    counts = periods[int(hour) if breakdown == "hourly" else 0]
+                    counts[0] += total
+                    counts[1] += cars
+                    counts[2] += motors
+                    entry["total"] += total
+                    entry["car"] += cars
+                    entry["motorcycle"] += motors
+            for i, (total, cars, motors) in enumerate(periods):
+                period = f"{day.isoformat()} {i:02d}:00" if breakdown == "hourly" else day.isoformat()
+                series.append({"period": period, "total": total, "car": cars, "motorcycle": motors})
+                totals["total"] += total
+                totals["car"] += cars
+                totals["motorcycle"] += motors
+
+        return {
+            "start": start.isoformat(),
+            "end": end.isoformat(),
+            "breakdown": breakdown,
+            "camera_ids": sorted(wanted) if wanted is not None else None,
+            "totals": totals,
+            "by_camera": by_camera,
+            "series": series,
+            "days": len(days),
+            "days_cached": cached,
+            "days_missing": [day.isoformat() for day in days if summaries[day] is None],
+        }
+
+    def stop(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+
+analytics = RangeAnalytics()
@@ -0,0 +1,321 @@
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+
+from app.config import LIVE_STATE_FILE, LIVE_FRAME_FILE, LIVE_STATE_CAPACITY, LIVE_FRAME_MAX_BYTES
+from app.services.nowcast import snapshot_dict
+from app.services.health import health_dict, HEALTH_CODES, HEALTH_NAMES
+
+# Shared live-state files.
+#
+# One ingest process (running the camera agents) writes; any number of web workers
+# read through mmap without taking locks. Each record is guarded by a sequence
+# counter (seqlock): the writer bumps it to odd before writing and to even after,
+# readers retry if they saw an odd value or the counter moved while they copied.
+# Within the ingest process, publishes come from several thread pools, so the
+# writer serialises slot allocation and each seq/body/seq write with a lock.
+
+MAGIC = b"STLS"
+LAYOUT_VERSION = 3
+
+# Header: magic, version, capacity, camera_count, view_seq, view_camera_id
+HEADER = struct.Struct("<4sIIIQ36s")
+HEADER_SIZE = 128
+
+# Fixed per-camera record. Append new fields at the end and bump LAYOUT_VERSION.
+SLOT_FIELDS = [
+    ("camera_id", "36s"),
+    ("status", "B"),
+    ("last_update", "d"),
+    ("current_count", "q"),
+    ("current_cars", "q"),
+    ("current_motors", "q"),
+    ("accumulated_count", "q"),
+    ("accumulated_cars", "q"),
+    ("accumulated_motors", "q"),
+    # Nowcast (NaN = not available yet)
+    ("nowcast_level", "d"),
+    ("nowcast_trend", "d"),
+    ("nowcast_baseline", "d"),
+    ("nowcast_z", "d"),
+    ("nowcast_anomaly", "B"),
+    # Connection circuit breaker (see app/services/health.py)
+    ("health_state", "B"),
+    ("health_failures", "I"),
+    ("health_retry_at", "d"),
+]
+SEQ = struct.Struct("<Q")
+SLOT_BODY = struct.Struct("<" + "".join(fmt for _, fmt in SLOT_FIELDS))
+SLOT_SIZE = 256
+assert SEQ.size + SLOT_BODY.size <= SLOT_SIZE
+
+STATUS_CODES = {"unknown": 0, "online": 1, "offline": 2}
+STATUS_NAMES = {v: k for k, v in STATUS_CODES.items()}
+
+# Frame file: seq, active buffer index, length of each buffer; then two JPEG buffers
+FRAME_HEADER = struct.Struct("<QIII36s")
+FRAME_HEADER_SIZE = 64
+
+_MAX_READ_RETRIES = 100
+
+def _encode_id(camera_id):
+    return camera_id.encode("utf-8")[:36]
+
+def _decode_id(raw):
+    return raw.rstrip(b"\x00").decode("utf-8", errors="replace")
+
+def _open_mmap(path, size, create):
+    if create:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temp file and rename so readers never see a half-initialised file
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.truncate(size)
+        os.replace(tmp_path, path)
+    fd = os.open(path, os.O_RDWR if create else os.O_RDONLY)
+    try:
+        access = mmap.ACCESS_WRITE if create else mmap.ACCESS_READ
+        return mmap.mmap(fd, size, access=access)
+    finally:
+        os.close(fd)
+
+class LiveStateWriter:
+    """Ingest side: publishes per-camera counters into the shared table."""
+
+    def __init__(self, path=LIVE_STATE_FILE, capacity=LIVE_STATE_CAPACITY):
+        self.path = path
+        self.capacity = capacity
+        self._mm = _open_mmap(path, HEADER_SIZE + capacity * SLOT_SIZE, create=True)
+        self._slots = {}
+        # Reentrant: slot_for publishes the new slot's empty row
+        self._lock = threading.RLock()
+        self._write_header()
+
+    def _write_header(self):
+        HEADER.pack_into(self._mm, 0, MAGIC, LAYOUT_VERSION, self.capacity, len(self._slots), 0, b"")
+
+    def slot_for(self, camera_id):
+        idx = self._slots.get(camera_id)
+        if idx is None:
+            with self._lock:
+                idx = self._slots.get(camera_id)
+                if idx is None:
+                    if len(self._slots) >= self.capacity:
+                        raise ValueError("Live state table is full; raise LIVE_STATE_CAPACITY")
+                    idx = len(self._slots)
+                    # Count is published after the slot exists so readers never see an empty row
+                    self.publish_raw(idx, camera_id, "unknown", 0.0, (0, 0, 0, 0, 0, 0))
+                    self._slots[camera_id] = idx
+                    struct.pack_into("<I", self._mm, 12, len(self._slots))
+        return idx
+
+    def publish(self, camera_id, stats):
+        """Publish a CameraAgent stats dict (the g.global_stats entry)."""
+        current = stats.get("current_class_counts", {})
+        accumulated = stats.get("accumulated_class_counts", {})
+        nowcast = stats.get("nowcast")
+        health = stats.get("health")
+        self.publish_raw(
+            self.slot_for(camera_id), camera_id,
+            stats.get("status", "unknown"),
+            stats.get("last_update", time.time()),
+            (stats.get("current_count", 0), current.get("0", 0), current.get("1", 0),
+             stats.get("accumulated_count", 0), accumulated.get("0", 0), accumulated.get("1", 0)),
+            nowcast,
+            health,
+        )
+
+    def publish_raw(self, idx, camera_id, status, last_update, counters, nowcast=None, health=None):
+        if nowcast is None:
+            nowcast_values = (math.nan, math.nan, math.nan, math.nan, 0)
+        else:
+            nowcast_values = (
+                nowcast["rate_per_hour"], nowcast["trend_per_hour"],
+                math.nan if nowcast["baseline_per_hour"] is None else nowcast["baseline_per_hour"],
+                math.nan if nowcast["z_score"] is None else nowcast["z_score"],
+                int(nowcast["anomaly"]),
+            )
+        if health is None:
+            health_values = (0, 0, 0.0)
+        else:
+            health_values = (HEALTH_CODES[health["state"]], health["consecutive_failures"], health["retry_at"] or 0.0)
+        body = SLOT_BODY.pack(
+            _encode_id(camera_id), STATUS_CODES.get(status, 0), float(last_update),
+            *(int(c) for c in counters), *nowcast_values, *health_values
+        )
+        offset = HEADER_SIZE + idx * SLOT_SIZE
+        with self._lock:
+            seq = SEQ.unpack_from(self._mm, offset)[0]
+            SEQ.pack_into(self._mm, offset, seq + 1)  # odd: write in progress
+            self._mm[offset + SEQ.size:offset + SEQ.size + SLOT_BODY.size] = body
+            SEQ.pack_into(self._mm, offset, seq + 2)
+
+    def requested_view(self):
+        """Camera id most recently requested by any web worker's /video_feed (or None)."""
+        _, _, _, _, view_seq, raw_id = HEADER.unpack_from(self._mm, 0)
+        return _decode_id(raw_id) if view_seq else None
+
+    def close(self):
+        self._mm.close()
+
+class LiveStateReader:
+    """Web side: lock-free reads of the shared table. Reopens if the ingest restarts."""
+
+    def __init__(self, path=LIVE_STATE_FILE):
+        self.path = path
+        self._mm = None
+        self._inode = None
+
+    def _ensure_open(self):
+        try:
+            inode = os.stat(self.path).st_ino
+        except FileNotFoundError:
+            self._close()
+            return False
+        if self._mm is None or inode != self._inode:
+            self._close()
+            size = os.path.getsize(self.path)
+            if size < HEADER_SIZE:
+                return False
+            self._mm = _open_mmap(self.path, size, create=False)
+            self._inode = inode
+            magic, version = HEADER.unpack_from(self._mm, 0)[:2]
+            if magic != MAGIC or version != LAYOUT_VERSION:
+                self._close()
+                return False
+        return True
+
+    def _close(self):
+        if self._mm is not None:
+            self._mm.close()
+        self._mm = None
+        self._inode = None
+
+    def read_all(self):
+        """Return {camera_id: {field: value}} for every published camera."""
+        if not self._ensure_open():
+            return {}
+        count = HEADER.unpack_from(self._mm, 0)[3]
+        result = {}
+        for idx in range(count):
+            record = self._read_slot(idx)
+            if record:
+                result[record["camera_id"]] = record
+        return result
+
+    def _read_slot(self, idx):
+        offset = HEADER_SIZE + idx * SLOT_SIZE
+        for _ in range(_MAX_READ_RETRIES):
+            seq1 = SEQ.unpack_from(self._mm, offset)[0]
+            if seq1 & 1:
+                continue
+            values = SLOT_BODY.unpack_from(self._mm, offset + SEQ.size)
+            if SEQ.unpack_from(self._mm, offset)[0] == seq1:
+                record = dict(zip((name for name, _ in SLOT_FIELDS), values))
+                record["camera_id"] = _decode_id(record["camera_id"])
+                record["status"] = STATUS_NAMES.get(record["status"], "unknown")
+                return record
+        return None
+
+    def request_view(self, camera_id):
+        """Ask the ingest process to render this camera into the frame slot."""
+        if not self._ensure_open():
+            return
+        # The reader's own map is read-only; use a short-lived writable map for the header
+        fd = os.open(self.path, os.O_RDWR)
+        try:
+            with mmap.mmap(fd, HEADER_SIZE, access=mmap.ACCESS_WRITE) as mm:
+                view_seq = HEADER.unpack_from(mm, 0)[4]
+                struct.pack_into("<36s", mm, 24, _encode_id(camera_id))
+                struct.pack_into("<Q", mm, 16, view_seq + 1)
+        finally:
+            os.close(fd)
+
+def merge_live_stats(sources, live):
+    """Overlay live counters onto a traffic_stats.json style 'sources' dict."""
+    for cam_id, rec in live.items():
+        src = sources.setdefault(cam_id, {})
+        src["status"] = rec["status"]
+        src["last_update"] = rec["last_update"]
+        src["current_count"] = rec["current_count"]
+        src["current_class_counts"] = {"0": rec["current_cars"], "1": rec["current_motors"]}
+        src["accumulated_count"] = rec["accumulated_count"]
+        src["accumulated_class_counts"] = {"0": rec["accumulated_cars"], "1": rec["accumulated_motors"]}
+        if not math.isnan(rec["nowcast_level"]):
+            src["nowcast"] = snapshot_dict(
+                rec["nowcast_level"], rec["nowcast_trend"],
+                None if math.isnan(rec["nowcast_baseline"]) else rec["nowcast_baseline"],
+                None if math.isnan(rec["nowcast_z"]) else rec["nowcast_z"],
+                rec["nowcast_anomaly"],
+            )
+        src["health"] = health_dict(HEALTH_NAMES.get(rec["health_state"], "closed"),
+                                    rec["health_failures"], rec["health_retry_at"])
+    return sources
+
+class FrameSlotWriter:
+    """Double-buffered JPEG slot for the live view, written by the ingest process."""
+
+    def __init__(self, path=LIVE_FRAME_FILE, max_bytes=LIVE_FRAME_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._mm = _open_mmap(path, FRAME_HEADER_SIZE + 2 * max_bytes, create=True)
+        self._seq = 0
+        self._active = 0
+        self._lengths = [0, 0]
+        self._camera_id = b""
+
+    def publish(self, jpeg_bytes, camera_id=""):
+        if len(jpeg_bytes) > self.max_bytes:
+            return False
+        # Odd seq marks a write in progress to the inactive buffer; readers of the
+        # active buffer are unaffected
+        FRAME_HEADER.pack_into(self._mm, 0, self._seq + 1, self._active, *self._lengths, self._camera_id)
+        target = 1 - self._active
+        offset = FRAME_HEADER_SIZE + target * self.max_bytes
+        self._mm[offset:offset + len(jpeg_bytes)] = jpeg_bytes
+        self._lengths[target] = len(jpeg_bytes)
+        self._active = target
+        self._camera_id = _encode_id(camera_id)
+        # Header update is the commit point
+        self._seq += 2
+        FRAME_HEADER.pack_into(self._mm, 0, self._seq, self._active, *self._lengths, self._camera_id)
+        return True
+
+    def close(self):
+        self._mm.close()
+
+class FrameSlotReader:
+    def __init__(self, path=LIVE_FRAME_FILE):
+        self.path = path
+        self._mm = None
+        self._inode = None
+
+    def read(self):
+        """Return (seq, camera_id, jpeg_bytes) of the latest frame, or (0, None, None)."""
+        try:
+            inode = os.stat(self.path).st_ino
+        except FileNotFoundError:
+            return 0, None, None
+        if self._mm is None or inode != self._inode:
+            if self._mm is not None:
+                self._mm.close()
+            self._mm = _open_mmap(self.path, os.path.getsize(self.path), create=False)
+            self._inode = inode
+        max_bytes = (len(self._mm) - FRAME_HEADER_SIZE) // 2
+        for _ in range(_MAX_READ_RETRIES):
+            seq, active, len0, len1, raw_id = FRAME_HEADER.unpack_from(self._mm, 0)
+            if seq == 0:
+                return 0, None, None
+            # Even or odd, 'active' names a buffer the writer is not touching right now
+            length = len0 if active == 0 else len1
+            offset = FRAME_HEADER_SIZE + active * max_bytes
+            data = bytes(self._mm[offset:offset + length])
+            # Valid unless a publish completed (and another could have started
+            # overwriting this buffer) while we were copying
+            seq_after = FRAME_HEADER.unpack_from(self._mm, 0)[0]
+            if seq_after <= (seq & ~1) + 2:
+                return seq & ~1, _decode_id(raw_id), data
+        return 0, None, None
@@ -0,0 +1,175 @@
+import threading
+import time
+import bisect
+from contextlib import contextmanager
+from functools import wraps
+
+# Bucket upper bounds in seconds. Covers sub-millisecond bookkeeping up to the
+# 20s FFmpeg connect timeout.
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+    0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0
+)
+
+class Histogram:
+    """
+    Cumulative latency histogram with Prometheus semantics.
+    One instance per (metric, label set). Updates are a bisect plus three adds.
+    """
+    __slots__ = ("bounds", "counts", "total", "count", "_lock")
+
+    def __init__(self, bounds=DEFAULT_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.total = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        idx = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[idx] += 1
+            self.total += value
+            self.count += 1
+
+    def snapshot(self):
+        with self._lock:
+            return list(self.counts), self.total, self.count
+
+class MetricsRegistry:
+    def __init__(self):
+        self._histograms = {}
+        self._counters = {}
+        self._gauges = {}
+        self._help = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(sorted(labels.items())) if labels else ()
+
+    def histogram(self, name, help_text="", **labels):
+        key = (name, self._key(labels))
+        hist = self._histograms.get(key)
+        if hist is None:
+            with self._lock:
+                hist = self._histograms.setdefault(key, Histogram())
+                if help_text:
+                    self._help.setdefault(name, help_text)
+        return hist
+
+    def observe(self, name, value, help_text="", **labels):
+        self.histogram(name, help_text, **labels).observe(value)
+
+    def inc(self, name, amount=1, help_text="", **labels):
+        key = (name, self._key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+            if help_text:
+                self._help.setdefault(name, help_text)
+
+    def set_gauge(self, name, value, help_text="", **labels):
+        key = (name, self._key(labels))
+        with self._lock:
+            self._gauges[key] = value
+            if help_text:
+                self._help.setdefault(name, help_text)
+
+    def clear(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+            self._gauges.clear()
+
+    def render_prometheus(self):
+        """Render all metrics in the Prometheus text exposition format (0.0.4)."""
+        lines = []
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+            counters = sorted(self._counters.items())
+            gauges = sorted(self._gauges.items())
+
+        seen = set()
+        for (name, labels), hist in histograms:
+            if name not in seen:
+                seen.add(name)
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} histogram")
+            counts, total, count = hist.snapshot()
+            cumulative = 0
+            for bound, c in zip(hist.bounds, counts):
+                cumulative += c
+                lines.append(f"{name}_bucket{_format_labels(labels, le=_format_value(bound))} {cumulative}")
+            lines.append(f"{name}_bucket{_format_labels(labels, le='+Inf')} {count}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {total:.6f}")
+            lines.append(f"{name}_count{_format_labels(labels)} {count}")
+
+        for kind, items in (("counter", counters), ("gauge", gauges)):
+            for (name, labels), value in items:
+                if name not in seen:
+                    seen.add(name)
+                    if name in self._help:
+                        lines.append(f"# HELP {name} {self._help[name]}")
+                    lines.append(f"# TYPE {name} {kind}")
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+        return "\n".join(lines) + "\n"
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_value(value):
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+def _format_labels(labels, **extra):
+    items = list(labels) + list(extra.items())
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in items) + "}"
+
+# Process-wide registry
+registry = MetricsRegistry()
+
+STAGE_METRIC = "camera_stage_duration_seconds"
+ROUTE_METRIC = "http_request_duration_seconds"
+
+@contextmanager
+def stage_timer(stage, camera_id, camera_name=""):
+    """Time a CameraAgent pipeline stage, labelled per camera."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        registry.observe(
+            STAGE_METRIC, time.perf_counter() - start,
+            "Latency of each camera pipeline stage",
+            camera_id=camera_id, camera=camera_name, stage=stage
+        )
+
+def timed_route(endpoint):
+    """Decorator recording Flask view latency under a fixed endpoint label."""
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            status = "error"
+            try:
+                response = fn(*args, **kwargs)
+                status = _status_of(response)
+                return response
+            finally:
+                registry.observe(
+                    ROUTE_METRIC, time.perf_counter() - start,
+                    "Latency of instrumented API routes",
+                    endpoint=endpoint, status=status
+                )
+        return wrapper
+    return decorator
+
+def _status_of(response):
+    # Views return either a Response or a (Response, status) tuple
+    if isinstance(response, tuple) and len(response) > 1:
+        return str(response[1])
+    return str(getattr(response, "status_code", 200))
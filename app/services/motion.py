@@ -0,0 +1,65 @@
+import time
+
+import cv2
+
+from app.config import (
+    MOTION_GATE_WIDTH, MOTION_GATE_PIXEL_DELTA, MOTION_GATE_THRESHOLD, MOTION_GATE_REFRESH_SECONDS
+)
+
+class MotionGate:
+    """
+    Cheap pre-inference check for unchanged scenes.
+
+    The frame is shrunk to a small grayscale thumbnail and compared with the
+    thumbnail of the last frame that was actually inferred. The score is the
+    fraction of pixels whose intensity moved by more than MOTION_GATE_PIXEL_DELTA.
+    Comparing against the last inferred frame (not the previous one) means slow
+    changes still add up and eventually trigger inference.
+    """
+
+    def __init__(self, threshold=MOTION_GATE_THRESHOLD, refresh_seconds=MOTION_GATE_REFRESH_SECONDS,
+                 width=MOTION_GATE_WIDTH, pixel_delta=MOTION_GATE_PIXEL_DELTA):
+        self.threshold = threshold
+        self.refresh_seconds = refresh_seconds
+        self.width = width
+        self.pixel_delta = pixel_delta
+        self.reference = None
+        self.last_inference_time = 0.0
+        self.last_score = 1.0
+        self.total = 0
+        self.skipped = 0
+
+    def _thumbnail(self, frame):
+        h, w = frame.shape[:2]
+        height = max(1, int(h * self.width / float(w)))
+        small = cv2.resize(frame, (self.width, height), interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        # Blur suppresses compression noise and sensor flicker
+        return cv2.GaussianBlur(small, (3, 3), 0)
+
+    def score(self, thumb):
+        if self.reference is None or self.reference.shape != thumb.shape:
+            return 1.0
+        diff = cv2.absdiff(thumb, self.reference)
+        return cv2.countNonZero(cv2.threshold(diff, self.pixel_delta, 255, cv2.THRESH_BINARY)[1]) / float(diff.size)
+
+    def should_skip(self, frame, now=None):
+        """True if the frame is close enough to the last inferred one to reuse its detections."""
+        now = time.time() if now is None else now
+        thumb = self._thumbnail(frame)
+        self.last_score = self.score(thumb)
+        self.total += 1
+
+        refresh_due = (now - self.last_inference_time) >= self.refresh_seconds
+        if self.last_score < self.threshold and not refresh_due:
+            self.skipped += 1
+            return True
+
+        self.reference = thumb
+        self.last_inference_time = now
+        return False
+
+    @property
+    def skip_rate(self):
+        return self.skipped / float(self.total) if self.total else 0.0
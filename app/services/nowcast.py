@@ -0,0 +1,212 @@
+import json
+import math
+import os
+import shutil
+import threading
+import time
+
+from app.config import (
+    NOWCAST_STATE_FILE, NOWCAST_LEVEL_SECONDS, NOWCAST_TREND_SECONDS, NOWCAST_GAP_SECONDS,
+    NOWCAST_BASELINE_WEEKS, NOWCAST_MIN_BASELINE, NOWCAST_MIN_COVERAGE, NOWCAST_ANOMALY_Z,
+    NOWCAST_CLEAR_Z, NOWCAST_HORIZONS
+)
+
+# Real-time nowcasting and anomaly flags.
+#
+# Per camera, every cycle's new_count updates (O(1), no DB access):
+#   - a Holt filter (level + trend) of vehicle flow in vehicles/hour for the
+#     nowcast, and a plain EWMA of the same flow for anomaly scoring (the trend
+#     term would add its own noise), both with time-constant smoothing so
+#     irregular cycle intervals are handled;
+#   - the open local-hour bucket. When it closes, its total (scaled up if the
+#     camera was offline part of the hour) updates a running mean/variance for
+#     that weekday x hour slot (Welford, turning exponential after
+#     NOWCAST_BASELINE_WEEKS samples so the baseline follows drift).
+# The z-score compares the EWMA to the slot baseline; its spread includes the
+# counting noise of the smoothed level itself, so quiet cameras do not flap.
+
+def local_slot(timestamp):
+    """(local hour index, weekday * 24 + hour) with weekday 0 = Sunday, as in SQLite's %w."""
+    t = time.localtime(timestamp)
+    return int((timestamp + t.tm_gmtoff) // 3600), ((t.tm_wday + 1) % 7) * 24 + t.tm_hour
+
+def horizon_counts(level, trend):
+    """Expected vehicles over each NOWCAST_HORIZONS window (minutes) from now."""
+    result = {}
+    for minutes in NOWCAST_HORIZONS:
+        h = minutes / 60.0
+        result[f"next_{minutes}m"] = max(0, int(round(level * h + trend * h * h / 2)))
+    return result
+
+def snapshot_dict(level, trend, baseline, z, anomaly):
+    """API shape of one camera's nowcast (also rebuilt from live-state fields)."""
+    result = {"rate_per_hour": round(level, 1), "trend_per_hour": round(trend, 1)}
+    result.update(horizon_counts(level, trend))
+    result["baseline_per_hour"] = None if baseline is None else round(baseline, 1)
+    result["z_score"] = None if z is None else round(z, 2)
+    result["anomaly"] = bool(anomaly)
+    return result
+
+class CameraNowcast:
+    """Holt level/trend, open hourly bucket and weekday x hour baselines for one camera."""
+
+    def __init__(self):
+        self.level = 0.0
+        self.trend = 0.0
+        self.rate = 0.0
+        self.last_ts = None
+        self.warm_since = None
+        self.bucket = None
+        self.bucket_slot = None
+        self.bucket_sum = 0
+        self.bucket_seconds = 0.0
+        self.baseline = {}        # slot -> [n, mean, var]
+        self.z = None
+        self.anomaly = False
+
+    def add_bucket(self, slot, hourly_count):
+        stats = self.baseline.get(slot)
+        if stats is None:
+            stats = self.baseline[slot] = [0, 0.0, 0.0]
+        stats[0] += 1
+        a = 1.0 / min(stats[0], NOWCAST_BASELINE_WEEKS)
+        d = hourly_count - stats[1]
+        stats[1] += a * d
+        stats[2] = (1 - a) * (stats[2] + a * d * d)
+
+    def observe(self, timestamp, new_count):
+        """Add one cycle's new vehicles. Returns True if the anomaly flag switched on."""
+        hour, slot = local_slot(timestamp)
+        dt = None if self.last_ts is None else timestamp - self.last_ts
+        online = dt is not None and 0 < dt <= NOWCAST_GAP_SECONDS
+
+        if hour != self.bucket:
+            if self.bucket is not None and self.bucket_seconds >= NOWCAST_MIN_COVERAGE * 3600:
+                self.add_bucket(self.bucket_slot, self.bucket_sum * 3600.0 / min(self.bucket_seconds, 3600.0))
+            self.bucket, self.bucket_slot = hour, slot
+            self.bucket_sum, self.bucket_seconds = 0, 0.0
+        self.bucket_sum += new_count
+
+        base = self.baseline.get(slot)
+        if not online:
+            # First cycle or back from an outage: restart from the baseline
+            self.level = self.rate = base[1] if base else 0.0
+            self.trend = 0.0
+            self.warm_since = timestamp
+        else:
+            self.bucket_seconds += dt
+            hours = dt / 3600.0
+            rate = new_count / hours
+            predicted = self.level + self.trend * hours
+            alpha = 1.0 - math.exp(-dt / NOWCAST_LEVEL_SECONDS)
+            beta = 1.0 - math.exp(-dt / NOWCAST_TREND_SECONDS)
+            level = predicted + alpha * (rate - predicted)
+            self.trend += beta * ((level - self.level) / hours - self.trend)
+            self.level = max(level, 0.0)
+            self.rate += alpha * (rate - self.rate)
+        self.last_ts = timestamp
+
+        was_anomaly = self.anomaly
+        self.z = None
+        self.anomaly = False
+        if base and base[0] >= NOWCAST_MIN_BASELINE:
+            # Spread of the slot's hourly totals (sample variance while n is small)
+            # plus the Poisson noise of a rate smoothed over NOWCAST_LEVEL_SECONDS
+            # (var = 3600 * rate / (2 * tau) in vehicles/hour)
+            n = base[0]
+            var = base[2] * n / (n - 1) if n < NOWCAST_BASELINE_WEEKS else base[2]
+            spread = math.sqrt(var + 3600.0 * max(base[1], 1.0) / (2 * NOWCAST_LEVEL_SECONDS))
+            self.z = (self.rate - base[1]) / spread
+            warm = timestamp - self.warm_since >= NOWCAST_LEVEL_SECONDS
+            # Hysteresis: a flagged camera stays flagged until |z| drops below NOWCAST_CLEAR_Z
+            self.anomaly = warm and abs(self.z) >= (NOWCAST_CLEAR_Z if was_anomaly else NOWCAST_ANOMALY_Z)
+        return self.anomaly and not was_anomaly
+
+    def snapshot(self):
+        base = self.baseline.get(self.bucket_slot) if self.bucket_slot is not None else None
+        baseline = base[1] if base and base[0] >= NOWCAST_MIN_BASELINE else None
+        return snapshot_dict(self.level, self.trend, baseline, self.z, self.anomaly)
+
+    def to_dict(self):
+        return {
+            "level": self.level, "trend": self.trend, "rate": self.rate, "last_ts": self.last_ts,
+            "bucket": self.bucket, "bucket_slot": self.bucket_slot,
+            "bucket_sum": self.bucket_sum, "bucket_seconds": self.bucket_seconds,
+            "baseline": {str(slot): stats for slot, stats in self.baseline.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        cam = cls()
+        cam.level = data.get("level", 0.0)
+        cam.trend = data.get("trend", 0.0)
+        cam.rate = data.get("rate", cam.level)
+        cam.last_ts = data.get("last_ts")
+        cam.warm_since = cam.last_ts
+        cam.bucket = data.get("bucket")
+        cam.bucket_slot = data.get("bucket_slot")
+        cam.bucket_sum = data.get("bucket_sum", 0)
+        cam.bucket_seconds = data.get("bucket_seconds", 0.0)
+        cam.baseline = {int(slot): list(stats) for slot, stats in data.get("baseline", {}).items()}
+        return cam
+
+class NowcastStore:
+    """Per-camera nowcasters, kept in memory by the ingest process and persisted to NOWCAST_STATE_FILE."""
+
+    def __init__(self, path=NOWCAST_STATE_FILE):
+        self.path = path
+        self.cameras = {}
+        self._lock = threading.Lock()
+        self._dirty = False
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return self
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+            self.cameras = {cam_id: CameraNowcast.from_dict(state) for cam_id, state in data.items()}
+        except Exception as e:
+            print(f"[ERROR] Failed to load nowcast state: {e}")
+        return self
+
+    def _camera(self, camera_id):
+        cam = self.cameras.get(camera_id)
+        if cam is None:
+            cam = self.cameras[camera_id] = CameraNowcast()
+        return cam
+
+    def observe(self, camera_id, timestamp, new_count):
+        """Update one camera and return its snapshot plus whether an anomaly just started."""
+        with self._lock:
+            cam = self._camera(camera_id)
+            started = cam.observe(timestamp, new_count)
+            self._dirty = True
+            return cam.snapshot(), started
+
+    def add_bucket(self, camera_id, slot, hourly_count):
+        """Feed a closed hourly total for a weekday x hour slot (used when seeding from the DB)."""
+        with self._lock:
+            self._camera(camera_id).add_bucket(slot, hourly_count)
+            self._dirty = True
+
+    def snapshot(self, camera_id):
+        with self._lock:
+            cam = self.cameras.get(camera_id)
+            return cam.snapshot() if cam is not None else None
+
+    def save(self):
+        with self._lock:
+            data = {cam_id: cam.to_dict() for cam_id, cam in self.cameras.items()}
+            self._dirty = False
+        try:
+            temp_file = self.path + ".tmp"
+            with open(temp_file, 'w') as f:
+                json.dump(data, f, separators=(",", ":"))
+            shutil.move(temp_file, self.path)
+        except Exception as e:
+            print(f"[ERROR] Failed to save nowcast state: {e}")
+
+    def save_if_dirty(self):
+        if self._dirty:
+            self.save()
@@ -0,0 +1,159 @@
+import datetime
+import heapq
+import json
+import random
+import time
+
+import numpy as np
+
+from app.config import CLASS_MAPPING, DATA_LAKE_PATH, REPLAY_SPEED, REPLAY_SEED, REPLAY_HISTORY_BATCH
+import app.globals as g
+from app.database import insert_history_batch
+from app.utils import save_stats
+from app.services.camera import CameraAgent
+from app.services.clock import SimClock
+from app.services.datalake import read_rows, day_summary
+from app.services.response_cache import notify_data_changed, camera_tag
+
+# Replays recorded data-lake detections through CameraAgent.process_detections
+# (static-object filter, traffic multiplier, stats, history, nowcasts and
+# thresholds) under a simulated clock, at N x real time or as fast as possible.
+#
+# The lake only holds frames that had detections and were not reused by the
+# motion gate, so replays see those frames; every logged timestamp is one frame.
+
+# Internal class id -> a COCO class that CLASS_MAPPING maps back to it
+COCO_CLASS = {internal: coco for coco, internal in sorted(CLASS_MAPPING.items(), reverse=True)}
+
+def _to_detections(rows):
+    """Raw lake rows of one frame -> (N, 6) [x1, y1, x2, y2, conf, coco_class]."""
+    detections = np.empty((len(rows), 6), dtype=np.float32)
+    for i, row in enumerate(rows):
+        x1, y1, x2, y2 = json.loads(row[5])
+        detections[i] = (x1, y1, x2, y2, float(row[4]), COCO_CLASS[int(row[3])])
+    return detections
+
+def recorded_frames(camera_id, start_ts, end_ts, root=DATA_LAKE_PATH):
+    """(timestamp, camera_id, detections) for each frame one camera logged in [start_ts, end_ts)."""
+    frame_ts, rows = None, []
+    for _, row in read_rows(camera_id, start_ts, end_ts, root=root):
+        ts = float(row[0])
+        if ts != frame_ts and rows:
+            yield frame_ts, camera_id, _to_detections(rows)
+            rows = []
+        frame_ts = ts
+        rows.append(row)
+    if rows:
+        yield frame_ts, camera_id, _to_detections(rows)
+
+def lake_cameras(start_ts, end_ts, root=DATA_LAKE_PATH):
+    """{camera_id: name} of every camera with data in the lake between start_ts and end_ts."""
+    cameras = {}
+    day = datetime.date.fromtimestamp(start_ts)
+    while day <= datetime.date.fromtimestamp(end_ts):
+        for camera_id, camera in (day_summary(day, root=root) or {}).items():
+            cameras.setdefault(camera_id, camera["name"])
+        day += datetime.timedelta(days=1)
+    return cameras
+
+class ReplayAgent(CameraAgent):
+    """A CameraAgent fed recorded detections instead of a stream."""
+    SAVE_INTERVAL = float("inf")  # run_replay saves once at the end
+    LOG_CYCLES = False
+
+    def __init__(self, source_config, clock, rng, output_root=None, history_batch=REPLAY_HISTORY_BATCH):
+        super().__init__(source_config, None, clock=clock, rng=rng)
+        # None: do not log detections again (they came from the lake)
+        self.datalake_root = output_root
+        self.history_batch = history_batch
+        self._pending = []
+
+    def log_to_datalake(self, detections, timestamp):
+        if self.datalake_root is not None:
+            super().log_to_datalake(detections, timestamp)
+
+    def write_history(self, records):
+        # One transaction per batch instead of per frame
+        self._pending.extend(records)
+        if len(self._pending) >= self.history_batch:
+            self.flush()
+
+    def flush(self):
+        rowid = insert_history_batch(self._pending)
+        if rowid:
+            g.global_stats[self.source_id]["db_rowid"] = rowid
+        self._pending = []
+
+def run_replay(start_ts, end_ts, camera_ids=None, speed=REPLAY_SPEED, seed=REPLAY_SEED,
+               root=DATA_LAKE_PATH, output_root=None, progress=None):
+    """
+    Replay [start_ts, end_ts) of the lake at `root` into g.global_stats, the
+    history DB and the threshold/nowcast stores of the current data directory.
+
+    speed is simulated seconds per real second (0 = no pacing). Each camera gets
+    its own RNG seeded from (seed, camera_id), so runs with the same seed produce
+    the same counts. progress(sim_ts, frames) is called once per simulated hour.
+    Returns a summary dict (frames, detections, counted vehicles per camera, timings).
+    """
+    cameras = lake_cameras(start_ts, end_ts, root)
+    if camera_ids:
+        cameras = {camera_id: cameras[camera_id] for camera_id in camera_ids if camera_id in cameras}
+
+    clock = SimClock(start_ts)
+    agents = {}
+    for camera_id, name in cameras.items():
+        agents[camera_id] = ReplayAgent({"id": camera_id, "name": name, "url": ""}, clock,
+                                        random.Random(f"{seed}:{camera_id}"), output_root)
+        # Counts of this run only
+        stats = g.global_stats[camera_id]
+        stats["accumulated_count"] = 0
+        stats["accumulated_class_counts"] = {k: 0 for k in stats["accumulated_class_counts"]}
+
+    frames = detections = 0
+    next_progress = start_ts + 3600
+    started = time.perf_counter()
+    streams = [recorded_frames(camera_id, start_ts, end_ts, root) for camera_id in agents]
+    for ts, camera_id, frame_detections in heapq.merge(*streams, key=lambda frame: frame[0]):
+        if speed > 0:
+            delay = (ts - start_ts) / speed - (time.perf_counter() - started)
+            if delay > 0:
+                time.sleep(delay)
+        while progress is not None and ts >= next_progress:
+            progress(next_progress, frames)
+            next_progress += 3600
+        clock.advance_to(ts)
+        agents[camera_id].process_detections(frame_detections)
+        frames += 1
+        detections += len(frame_detections)
+
+    for agent in agents.values():
+        agent.flush()
+    notify_data_changed(*[camera_tag(camera_id) for camera_id in agents], *(["datalake"] if output_root else []))
+    save_stats()
+    if g.threshold_store is not None:
+        g.threshold_store.save_if_dirty()
+    if g.nowcast_store is not None:
+        g.nowcast_store.save_if_dirty()
+
+    wall = time.perf_counter() - started
+    by_camera = {
+        camera_id: {
+            "name": cameras[camera_id],
+            "vehicles": g.global_stats[camera_id]["accumulated_count"],
+            "class_counts": dict(g.global_stats[camera_id]["accumulated_class_counts"]),
+        }
+        for camera_id in agents
+    }
+    return {
+        "start": start_ts,
+        "end": end_ts,
+        "seed": seed,
+        "speed": speed,
+        "frames": frames,
+        "detections": detections,
+        "vehicles": sum(camera["vehicles"] for camera in by_camera.values()),
+        "by_camera": by_camera,
+        "sim_seconds": end_ts - start_ts,
+        "wall_seconds": round(wall, 3),
+        "speedup": round((end_ts - start_ts) / wall, 1) if wall > 0 else None,
+    }
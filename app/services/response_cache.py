@@ -0,0 +1,191 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from app.config import RESPONSE_CACHE_SIZE, RESPONSE_CACHE_INVALIDATION_LOG, RESPONSE_CACHE_INVALIDATION_POLL
+from app.services.metrics import registry
+
+# In-process cache for expensive GET-style responses.
+#
+# Entries hold serialized bodies (plus lazily compressed variants, see
+# responses.encoded_response), are keyed by endpoint + normalized parameters,
+# expire at a per-entry deadline, are evicted LRU beyond RESPONSE_CACHE_SIZE and
+# carry tags (e.g. "camera:<id>", "datalake") so bulk writes can drop exactly
+# the entries they affect. Concurrent misses for the same key are coalesced:
+# one caller computes, the others wait for its result (single flight).
+#
+# Writers that land rows call notify_data_changed(), which also appends the tags
+# to a shared log that every cache polls, so imports and replays run as scripts
+# (or in another worker) reach the server processes too. Live camera inserts only
+# touch the newest history bucket and are covered by the bucket-aligned TTLs.
+
+ALL_CAMERAS = "camera:*"
+
+def camera_tag(camera_id):
+    return f"camera:{camera_id}" if camera_id else ALL_CAMERAS
+
+def seconds_to_boundary(interval, now=None, max_age=None):
+    """Seconds until the next interval-aligned boundary (when a new bucket starts), capped at max_age."""
+    now = time.time() if now is None else now
+    remaining = interval - (now % interval)
+    return min(remaining, max_age) if max_age else remaining
+
+class CachedBody:
+    __slots__ = ("body", "status", "variants")
+
+    def __init__(self, body, status=200):
+        self.body = body
+        self.status = status
+        self.variants = {}          # content-encoding -> compressed body
+
+class _Flight:
+    __slots__ = ("event", "result", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+class ResponseCache:
+    def __init__(self, max_entries=RESPONSE_CACHE_SIZE, shared_log=RESPONSE_CACHE_INVALIDATION_LOG,
+                 poll_interval=RESPONSE_CACHE_INVALIDATION_POLL):
+        self.max_entries = max_entries
+        self.shared_log = shared_log
+        self.poll_interval = poll_interval
+        self._log_offset = self._log_size()     # earlier invalidations predate this cache
+        self._next_poll = 0.0
+        self._log_lock = threading.Lock()
+        self._entries = OrderedDict()       # key -> (expires, tags, value)
+        self._flights = {}
+        self._lock = threading.Lock()
+        self._generation = 0                # bumped by invalidate()
+
+    def get_or_compute(self, endpoint, key, ttl, compute, tags=()):
+        """
+        Cached value for (endpoint, key), else compute() once across concurrent callers.
+        compute() returns (value, cacheable); uncacheable results are handed to the
+        waiting callers but not stored. Exceptions propagate to every waiter.
+        """
+        full_key = (endpoint, key)
+        now = time.time()
+        self.poll_shared(now)
+        with self._lock:
+            entry = self._entries.get(full_key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(full_key)
+                result = "hit"
+            else:
+                entry = None
+                flight = self._flights.get(full_key)
+                leader = flight is None
+                if leader:
+                    flight = self._flights[full_key] = _Flight()
+                    generation = self._generation
+                result = "miss" if leader else "coalesced"
+        registry.inc("response_cache_requests_total", 1, "Response cache lookups by result",
+                     endpoint=endpoint, result=result)
+        if entry is not None:
+            return entry[2]
+
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        cacheable = False
+        try:
+            value, cacheable = compute()
+            flight.result = value
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(full_key, None)
+                # Not stored if an invalidation ran while computing (it may predate the new data)
+                if flight.error is None and cacheable and ttl > 0 and generation == self._generation:
+                    self._entries[full_key] = (time.time() + ttl, frozenset(tags), flight.result)
+                    self._entries.move_to_end(full_key)
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+                size = len(self._entries)
+            flight.event.set()
+        registry.set_gauge("response_cache_entries", size, "Entries in the response cache")
+        return value
+
+    def invalidate(self, *tags):
+        """
+        Drop entries carrying any of the tags. A camera tag also drops all-camera
+        entries; ALL_CAMERAS drops every camera-tagged entry.
+        """
+        tags = set(tags)
+        every_camera = ALL_CAMERAS in tags
+        if any(tag.startswith("camera:") for tag in tags):
+            tags.add(ALL_CAMERAS)
+
+        def affected(entry_tags):
+            return bool(entry_tags & tags) or (every_camera and any(t.startswith("camera:") for t in entry_tags))
+
+        with self._lock:
+            self._generation += 1
+            stale = [key for key, (_, entry_tags, _) in self._entries.items() if affected(entry_tags)]
+            for key in stale:
+                del self._entries[key]
+        if stale:
+            registry.inc("response_cache_invalidations_total", len(stale), "Entries dropped by invalidation")
+        return len(stale)
+
+    def _log_size(self):
+        try:
+            return os.path.getsize(self.shared_log)
+        except OSError:
+            return 0
+
+    def publish(self, *tags):
+        """Append tags to the shared log (one line per call; small O_APPEND writes do not interleave)."""
+        os.makedirs(os.path.dirname(self.shared_log), exist_ok=True)
+        with open(self.shared_log, "a") as f:
+            f.write(" ".join(tags) + "\n")
+
+    def poll_shared(self, now=None):
+        """Apply tags other processes appended to the shared log (at most every poll_interval)."""
+        now = time.time() if now is None else now
+        if now < self._next_poll or not self._log_lock.acquire(blocking=False):
+            return
+        try:
+            self._next_poll = now + self.poll_interval
+            size = self._log_size()
+            if size < self._log_offset:
+                self._log_offset = 0        # log was truncated
+            if size == self._log_offset:
+                return
+            with open(self.shared_log, "rb") as f:
+                f.seek(self._log_offset)
+                data = f.read(size - self._log_offset)
+            # A line still being written is picked up on the next poll
+            complete = data[:data.rfind(b"\n") + 1]
+            self._log_offset += len(complete)
+            tags = {tag for line in complete.decode("utf-8", "replace").splitlines() for tag in line.split()}
+            if tags:
+                self.invalidate(*tags)
+        finally:
+            self._log_lock.release()
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+cache = ResponseCache()
+
+def notify_data_changed(*tags):
+    """Rows landed for these tags: drop matching entries here and in every process sharing DATA_DIR."""
+    if not tags:
+        return
+    cache.invalidate(*tags)
+    try:
+        cache.publish(*tags)
+    except OSError as e:
+        print(f"[WARN] Could not publish cache invalidation: {e}")
@@ -0,0 +1,86 @@
+import gzip
+import json
+import zlib
+
+from flask import Response, request
+
+from app.config import RESPONSE_COMPRESS_MIN_BYTES, RESPONSE_COMPRESS_LEVEL
+
+try:
+    import orjson
+except ImportError:  # optional: falls back to the stdlib encoder
+    orjson = None
+
+# Response encoding for the hot JSON endpoints.
+#
+# - dumps(): orjson when installed (several times faster, returns bytes), else
+#   compact stdlib json.
+# - to_columnar(): list of records -> parallel arrays per field, so keys are sent
+#   once instead of once per row (selected with ?format=columnar).
+# - json_response(): gzip/deflate when the client accepts it and the body is big
+#   enough to be worth the CPU.
+
+def dumps(obj):
+    """Serialize to compact JSON bytes."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(obj, separators=(",", ":")).encode("utf-8")
+
+def to_columnar(rows, fields=None):
+    """{"format": "columnar", "length": n, "columns": {field: [values...]}} from a list of dicts."""
+    if fields is None:
+        fields = list(rows[0]) if rows else []
+    return {
+        "format": "columnar",
+        "length": len(rows),
+        "columns": {field: [row.get(field) for row in rows] for field in fields},
+    }
+
+def wants_columnar():
+    return request.args.get("format") == "columnar"
+
+def negotiate_encoding():
+    """'gzip', 'deflate' or None from the request's Accept-Encoding (q-values honoured)."""
+    accepted = request.accept_encodings
+    best = None
+    for encoding in ("gzip", "deflate"):
+        quality = accepted[encoding]
+        if quality > 0 and (best is None or quality > best[1]):
+            best = (encoding, quality)
+    return best[0] if best else None
+
+def compress(body, encoding, level=RESPONSE_COMPRESS_LEVEL):
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=level, mtime=0)
+    # HTTP "deflate" is the zlib format (RFC 9110), not raw deflate
+    return zlib.compress(body, level)
+
+def encoded_response(body, status=200, mimetype="application/json", variants=None):
+    """
+    Response for an already serialized body, compressed when negotiated.
+    variants: optional dict memoizing compressed bodies per encoding (cached responses).
+    """
+    if isinstance(body, str):
+        body = body.encode("utf-8")
+    encoding = negotiate_encoding() if len(body) >= RESPONSE_COMPRESS_MIN_BYTES else None
+    if encoding:
+        if variants is None:
+            body = compress(body, encoding)
+        else:
+            compressed = variants.get(encoding)
+            if compressed is None:
+                compressed = variants[encoding] = compress(body, encoding)
+            body = compressed
+    response = Response(body, status=status, mimetype=mimetype)
+    response.vary.add("Accept-Encoding")
+    if encoding:
+        response.headers["Content-Encoding"] = encoding
+    return response
+
+def cached_response(cached):
+    """Response for a response_cache.CachedBody; each encoding is compressed once per entry."""
+    return encoded_response(cached.body, cached.status, variants=cached.variants)
+
+def json_response(obj, status=200):
+    """Drop-in for jsonify() on hot endpoints: fast encoder plus negotiated compression."""
+    return encoded_response(dumps(obj), status=status)
@@ -0,0 +1,110 @@
+import math
+
+import numpy as np
+
+# Model input stride; crop-scaled image sizes are rounded up to a multiple of this
+MODEL_STRIDE = 32
+
+class RegionOfInterest:
+    """
+    Per-camera polygon ROIs in normalized frame coordinates (0..1).
+
+    Config format (cctv_config.json):
+        "roi": [[[x, y], [x, y], [x, y], ...], ...]   # one or more polygons
+
+    Only the bounding box of all polygons is sent to the model. Detections are
+    shifted back to full-frame coordinates and dropped when their center lies
+    outside every polygon.
+    """
+
+    def __init__(self, polygons):
+        self.polygons = [np.asarray(p, dtype=np.float32) for p in polygons]
+
+    @classmethod
+    def from_config(cls, roi):
+        if not roi:
+            return None
+        return cls(validate_polygons(roi))
+
+    def to_config(self):
+        return [[[round(float(x), 5), round(float(y), 5)] for x, y in poly] for poly in self.polygons]
+
+    def pixel_polygons(self, frame_shape):
+        h, w = frame_shape[:2]
+        return [poly * np.array([w, h], dtype=np.float32) for poly in self.polygons]
+
+    def crop_box(self, frame_shape, padding=8):
+        """Pixel bounding box (x0, y0, x1, y1) covering all polygons."""
+        h, w = frame_shape[:2]
+        points = np.vstack(self.pixel_polygons(frame_shape))
+        x0 = max(0, int(math.floor(points[:, 0].min())) - padding)
+        y0 = max(0, int(math.floor(points[:, 1].min())) - padding)
+        x1 = min(w, int(math.ceil(points[:, 0].max())) + padding)
+        y1 = min(h, int(math.ceil(points[:, 1].max())) + padding)
+        return x0, y0, x1, y1
+
+    def crop(self, frame):
+        """Return (cropped_view, (x_offset, y_offset))."""
+        x0, y0, x1, y1 = self.crop_box(frame.shape)
+        return frame[y0:y1, x0:x1], (x0, y0)
+
+    def to_frame_coords(self, detections, offset):
+        if len(detections) == 0:
+            return detections
+        shifted = detections.copy()
+        shifted[:, [0, 2]] += offset[0]
+        shifted[:, [1, 3]] += offset[1]
+        return shifted
+
+    def filter(self, detections, frame_shape):
+        """Keep detections whose box center lies inside any polygon."""
+        if len(detections) == 0:
+            return detections
+        cx = (detections[:, 0] + detections[:, 2]) / 2.0
+        cy = (detections[:, 1] + detections[:, 3]) / 2.0
+        inside = np.zeros(len(detections), dtype=bool)
+        for poly in self.pixel_polygons(frame_shape):
+            inside |= points_in_polygon(cx, cy, poly)
+        return detections[inside]
+
+def scaled_imgsz(crop_shape, frame_shape, base_imgsz):
+    """
+    Model input size for a crop that keeps the same pixels-per-object as running
+    the full frame at base_imgsz, so small vehicles are not lost and the model does
+    proportionally less work.
+    """
+    scale = max(crop_shape[:2]) / float(max(frame_shape[:2]))
+    size = int(math.ceil(base_imgsz * scale / MODEL_STRIDE)) * MODEL_STRIDE
+    return max(MODEL_STRIDE * 2, min(base_imgsz, size))
+
+def points_in_polygon(xs, ys, poly):
+    """Vectorized even-odd ray casting test."""
+    inside = np.zeros(len(xs), dtype=bool)
+    n = len(poly)
+    for i in range(n):
+        x1, y1 = poly[i]
+        x2, y2 = poly[(i + 1) % n]
+        crosses = (y1 > ys) != (y2 > ys)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            x_at = (x2 - x1) * (ys - y1) / (y2 - y1) + x1
+        inside ^= crosses & (xs < x_at)
+    return inside
+
+def validate_polygons(roi):
+    """Check an ROI payload and return it as a list of [[x, y], ...] polygons."""
+    if not isinstance(roi, list) or not roi:
+        raise ValueError("ROI must be a non-empty list of polygons")
+    polygons = []
+    for poly in roi:
+        if not isinstance(poly, list) or len(poly) < 3:
+            raise ValueError("Each ROI polygon needs at least 3 points")
+        points = []
+        for point in poly:
+            if not isinstance(point, (list, tuple)) or len(point) != 2:
+                raise ValueError("ROI points must be [x, y] pairs")
+            x, y = float(point[0]), float(point[1])
+            if not (0.0 <= x <= 1.0 and 0.0 <= y <= 1.0):
+                raise ValueError("ROI coordinates must be normalized to 0..1")
+            points.append([x, y])
+        polygons.append(points)
+    return polygons
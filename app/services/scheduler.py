@@ -0,0 +1,207 @@
+import heapq
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app.config import (
+    PROCESS_INTERVAL, CAPTURE_WORKERS, INFERENCE_WORKERS, VIEW_PRIORITY_BOOST
+)
+import app.globals as g
+from app.services.metrics import registry
+
+class CameraScheduler:
+    """
+    Runs CameraAgents on a fixed thread budget instead of one thread per camera.
+
+    Each camera has a due time in a min-heap. When cameras come due they are ordered
+    by priority (the camera currently being viewed is boosted), and
+    are dispatched to a bounded capture pool. Captured frames are handed to a separate,
+    smaller inference pool so slow or dead streams never hold up the model.
+    """
+
+    def __init__(self, capture_workers=CAPTURE_WORKERS, inference_workers=INFERENCE_WORKERS):
+        self.capture_workers = capture_workers
+        self.inference_workers = inference_workers
+        self._capture_pool = ThreadPoolExecutor(max_workers=capture_workers, thread_name_prefix="capture")
+        self._inference_pool = ThreadPoolExecutor(max_workers=inference_workers, thread_name_prefix="inference")
+        # Bound outstanding work so the executors' internal queues never grow unbounded
+        self._capture_slots = threading.Semaphore(capture_workers)
+        self._inference_slots = threading.Semaphore(inference_workers * 2)
+
+        self._agents = {}       # camera_id -> agent
+        self._intervals = {}    # camera_id -> seconds between cycles
+        self._priorities = {}   # camera_id -> base priority (higher runs first)
+        self._in_flight = set()
+        self._due = []          # (due_ts, seq, camera_id)
+        self._entry_seq = {}    # camera_id -> seq of its live heap entry
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._running = False
+        self._thread = None
+
+    # --- Registration ---
+
+    def add(self, agent, interval=None, priority=0):
+        with self._cond:
+            cam_id = agent.source_id
+            self._agents[cam_id] = agent
+            self._intervals[cam_id] = float(interval or PROCESS_INTERVAL)
+            self._priorities[cam_id] = priority
+            self._push(cam_id, time.time())
+
+    def remove(self, camera_id):
+        with self._cond:
+            agent = self._agents.pop(camera_id, None)
+            self._intervals.pop(camera_id, None)
+            self._priorities.pop(camera_id, None)
+            self._entry_seq.pop(camera_id, None)
+            if agent:
+                agent.stop()
+            # Stale heap entries are dropped lazily when popped
+
+    def set_interval(self, camera_id, interval):
+        with self._cond:
+            if camera_id in self._agents:
+                self._intervals[camera_id] = float(interval)
+
+    def set_priority(self, camera_id, priority):
+        with self._cond:
+            if camera_id in self._agents:
+                self._priorities[camera_id] = priority
+
+    def promote(self, camera_id):
+        """Make a camera due immediately (e.g. a viewer just opened its feed)."""
+        with self._cond:
+            if camera_id in self._agents and camera_id not in self._in_flight:
+                self._push(camera_id, time.time())
+
+    def __contains__(self, camera_id):
+        return camera_id in self._agents
+
+    # --- Lifecycle ---
+
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._dispatch_loop, name="camera-scheduler", daemon=True)
+        self._thread.start()
+        print(f"[INFO] Camera scheduler started ({self.capture_workers} capture / {self.inference_workers} inference workers)")
+
+    def stop(self, wait=True):
+        with self._cond:
+            self._running = False
+            for agent in self._agents.values():
+                agent.stop()
+            self._cond.notify_all()
+        if self._thread and wait:
+            self._thread.join(timeout=5)
+        self._capture_pool.shutdown(wait=wait, cancel_futures=True)
+        self._inference_pool.shutdown(wait=wait, cancel_futures=True)
+
+    # --- Dispatch ---
+
+    def _push(self, camera_id, due):
+        # Replaces any earlier entry for this camera; the old one becomes stale
+        seq = next(self._seq)
+        self._entry_seq[camera_id] = seq
+        heapq.heappush(self._due, (due, seq, camera_id))
+        self._cond.notify()
+
+    def _effective_priority(self, camera_id):
+        priority = self._priorities.get(camera_id, 0)
+        agent = self._agents.get(camera_id)
+        if agent is not None and agent.source_url == g.VIDEO_SOURCE:
+            priority += VIEW_PRIORITY_BOOST
+        return priority
+
+    def _next_ready(self):
+        """Pop every due camera and return the highest-priority one (or None)."""
+        now = time.time()
+        ready = []
+        while self._due and self._due[0][0] <= now:
+            due_ts, seq, cam_id = heapq.heappop(self._due)
+            if self._entry_seq.get(cam_id) != seq or cam_id in self._in_flight:
+                continue
+            ready.append((-self._effective_priority(cam_id), due_ts, seq, cam_id))
+        if not ready:
+            return None
+        ready.sort()
+        _, due_ts, _, cam_id = ready[0]
+        # Put the rest back; they keep their original due time so they run next
+        for _, other_due, other_seq, other_id in ready[1:]:
+            heapq.heappush(self._due, (other_due, other_seq, other_id))
+        registry.observe("scheduler_dispatch_lag_seconds", now - due_ts,
+                         "Delay between a camera becoming due and being dispatched")
+        return cam_id
+
+    def _dispatch_loop(self):
+        while True:
+            # Wait for a free capture slot before picking work so priority is decided late
+            self._capture_slots.acquire()
+            with self._cond:
+                cam_id = None
+                while self._running:
+                    cam_id = self._next_ready()
+                    if cam_id is not None:
+                        break
+                    timeout = (self._due[0][0] - time.time()) if self._due else None
+                    self._cond.wait(timeout=timeout if timeout is None else max(0.0, timeout))
+                if not self._running:
+                    self._capture_slots.release()
+                    return
+                self._in_flight.add(cam_id)
+                agent = self._agents[cam_id]
+                registry.set_gauge("scheduler_queue_depth", len(self._due),
+                                   "Cameras waiting in the scheduler heap")
+            try:
+                self._capture_pool.submit(self._capture_job, agent)
+            except RuntimeError:
+                # Pool shut down underneath us
+                self._capture_slots.release()
+                return
+
+    def _capture_job(self, agent):
+        started = time.time()
+        handed_off = False
+        try:
+            if agent.is_mirror():
+                agent.mirror_step()
+                return
+            frame = agent.capture()
+            if frame is not None and agent.running:
+                self._inference_slots.acquire()
+                try:
+                    self._inference_pool.submit(self._inference_job, agent, frame, started)
+                    handed_off = True
+                except RuntimeError:
+                    # Inference pool shut down (stop/restart): give the slot back; _complete
+                    # below reschedules the camera, or drops it if the scheduler is stopping
+                    self._inference_slots.release()
+                    if not self._running:
+                        agent.stop()
+        except Exception as e:
+            print(f"[ERROR] Capture failed for {agent.source_name}: {e}")
+        finally:
+            self._capture_slots.release()
+            if not handed_off:
+                self._complete(agent.source_id, started)
+
+    def _inference_job(self, agent, frame, started):
+        try:
+            agent.process(frame)
+        except Exception as e:
+            print(f"[ERROR] Processing failed for {agent.source_name}: {e}")
+        finally:
+            self._inference_slots.release()
+            self._complete(agent.source_id, started)
+
+    def _complete(self, camera_id, started):
+        with self._cond:
+            self._in_flight.discard(camera_id)
+            if camera_id in self._agents and self._running:
+                # Keep a fixed cadence, but never schedule in the past after a slow cycle.
+                # Cameras with an open circuit breaker sleep until their next probe.
+                due = max(time.time(), started + self._intervals[camera_id], self._agents[camera_id].health.retry_at)
+                self._push(camera_id, due)
@@ -0,0 +1,177 @@
+import heapq
+import math
+import threading
+
+from app.config import SPATIAL_CELL_DEG, SPATIAL_REGION_DEG
+
+# Spatial index over camera coordinates.
+#
+# Cameras are bucketed into a uniform lat/lng grid (SPATIAL_CELL_DEG per cell),
+# so a viewport query touches only the cells it overlaps and a k-nearest query
+# searches rings of cells outwards from the query point. Regions are coarser
+# grid cells (SPATIAL_REGION_DEG) unless a camera's config names its "region".
+# The index is rebuilt when the camera list is replaced or invalidate() is called
+# after coordinates are edited (see index_for).
+
+EARTH_RADIUS_M = 6371008.8
+METRES_PER_DEG = math.pi * EARTH_RADIUS_M / 180
+
+def parse_coordinate(value):
+    """Float latitude/longitude from a config value (number or numeric string); None if unusable."""
+    if value is None or isinstance(value, bool):
+        return None
+    try:
+        coord = float(value.strip() if isinstance(value, str) else value)
+    except (TypeError, ValueError):
+        return None
+    return coord if math.isfinite(coord) else None
+
+def normalize_coordinates(sources):
+    """Coerce lat/lng of every camera config entry to floats (None when missing or invalid), in place."""
+    for cam in sources:
+        for key in ("lat", "lng"):
+            if key in cam:
+                cam[key] = parse_coordinate(cam[key])
+        if cam.get("lat") is not None and not -90 <= cam["lat"] <= 90:
+            cam["lat"] = None
+        if cam.get("lng") is not None and not -180 <= cam["lng"] <= 180:
+            cam["lng"] = None
+    return sources
+
+def haversine_m(lat1, lng1, lat2, lng2):
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp, dl = p2 - p1, math.radians(lng2 - lng1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(a)))
+
+def _cell(lat, lng, size):
+    return int(math.floor(lat / size)), int(math.floor(lng / size))
+
+class SpatialIndex:
+    """Uniform grid over the cameras that have coordinates."""
+
+    def __init__(self, sources, cell_deg=SPATIAL_CELL_DEG, region_deg=SPATIAL_REGION_DEG):
+        self.cell_deg = cell_deg
+        self.cameras = []                 # (lat, lng, camera config)
+        self.cells = {}                   # (row, col) -> [index into self.cameras]
+        self.regions = {}                 # region id -> [index into self.cameras]
+        for cam in sources:
+            lat, lng = parse_coordinate(cam.get("lat")), parse_coordinate(cam.get("lng"))
+            if lat is None or lng is None:
+                continue
+            idx = len(self.cameras)
+            self.cameras.append((lat, lng, cam))
+            self.cells.setdefault(_cell(lat, lng, cell_deg), []).append(idx)
+            region = cam.get("region")
+            if not region:
+                row, col = _cell(lat, lng, region_deg)
+                region = f"grid:{row}:{col}"
+            self.regions.setdefault(str(region), []).append(idx)
+
+        rows = [row for row, _ in self.cells] or [0]
+        cols = [col for _, col in self.cells] or [0]
+        self._row_range = (min(rows), max(rows))
+        self._col_range = (min(cols), max(cols))
+        self.region_info = {region: self._region_info(members) for region, members in self.regions.items()}
+
+    def _region_info(self, members):
+        lats = [self.cameras[i][0] for i in members]
+        lngs = [self.cameras[i][1] for i in members]
+        return {
+            "lat": sum(lats) / len(lats), "lng": sum(lngs) / len(lngs),
+            "bbox": [min(lngs), min(lats), max(lngs), max(lats)],
+            "camera_ids": [self.cameras[i][2]["id"] for i in members],
+        }
+
+    def __len__(self):
+        return len(self.cameras)
+
+    def within(self, south, west, north, east):
+        """Camera configs inside the bounding box (inclusive)."""
+        row0, col0 = _cell(south, west, self.cell_deg)
+        row1, col1 = _cell(north, east, self.cell_deg)
+        row0, row1 = max(row0, self._row_range[0]), min(row1, self._row_range[1])
+        col0, col1 = max(col0, self._col_range[0]), min(col1, self._col_range[1])
+        if row0 > row1 or col0 > col1:
+            return []
+        if (row1 - row0 + 1) * (col1 - col0 + 1) <= len(self.cells):
+            keys = ((row, col) for row in range(row0, row1 + 1) for col in range(col0, col1 + 1))
+        else:
+            # Zoomed far out: cheaper to walk the occupied cells
+            keys = (key for key in self.cells if row0 <= key[0] <= row1 and col0 <= key[1] <= col1)
+        result = []
+        for key in keys:
+            for idx in self.cells.get(key, ()):
+                lat, lng, cam = self.cameras[idx]
+                if south <= lat <= north and west <= lng <= east:
+                    result.append(cam)
+        return result
+
+    def nearest(self, lat, lng, k):
+        """Up to k (distance in metres, camera config) pairs, closest first."""
+        if not self.cameras or k <= 0:
+            return []
+        row, col = _cell(lat, lng, self.cell_deg)
+        (row0, row1), (col0, col1) = self._row_range, self._col_range
+        if not (row0 <= row <= row1 and col0 <= col <= col1):
+            # Outside the occupied grid: the rings up to the first camera would all be empty
+            return self._nearest_scan(lat, lng, k)
+        max_ring = max(row - row0, row1 - row, col - col0, col1 - col)
+        # Sparse grids (cameras in distant clusters) make rings mostly empty; past
+        # this many cell lookups a scan of every camera is cheaper
+        budget = 4 * len(self.cells) + 64
+        found = []
+        for ring in range(max_ring + 1):
+            if ring == 0:
+                keys = [(row, col)]
+            else:
+                keys = [(row + dr, col + dc) for dr in range(-ring, ring + 1) for dc in (-ring, ring)]
+                keys += [(row + dr, col + dc) for dr in (-ring, ring) for dc in range(-ring + 1, ring)]
+            budget -= len(keys)
+            if budget < 0:
+                return self._nearest_scan(lat, lng, k)
+            for key in keys:
+                for idx in self.cells.get(key, ()):
+                    c_lat, c_lng, cam = self.cameras[idx]
+                    found.append((haversine_m(lat, lng, c_lat, c_lng), cam))
+            if len(found) >= k:
+                found.sort(key=lambda item: item[0])
+                # Anything beyond ring r is at least r cells away along one axis
+                # (longitude cells shrink towards the poles, hence the cosine)
+                far_lat = min(abs(lat) + (ring + 1) * self.cell_deg, 90.0)
+                bound = ring * self.cell_deg * METRES_PER_DEG * math.cos(math.radians(far_lat))
+                if found[k - 1][0] <= bound:
+                    break
+        found.sort(key=lambda item: item[0])
+        return found[:k]
+
+    def _nearest_scan(self, lat, lng, k):
+        """Brute-force nearest: distance to every camera, sorted."""
+        found = [(haversine_m(lat, lng, c_lat, c_lng), cam) for c_lat, c_lng, cam in self.cameras]
+        return heapq.nsmallest(k, found, key=lambda item: item[0])
+
+    def regions_within(self, south, west, north, east):
+        """Region ids whose bounding box overlaps the given box."""
+        return [region for region, info in self.region_info.items()
+                if info["bbox"][0] <= east and info["bbox"][2] >= west
+                and info["bbox"][1] <= north and info["bbox"][3] >= south]
+
+_index = None
+_index_key = None
+_index_lock = threading.Lock()
+
+def invalidate():
+    """Drop the shared index (call after editing camera coordinates in place)."""
+    global _index
+    with _index_lock:
+        _index = None
+
+def index_for(sources):
+    """Shared index for the camera list; O(1) unless the list changed."""
+    global _index, _index_key
+    key = (id(sources), len(sources))
+    with _index_lock:
+        if _index is None or key != _index_key:
+            _index = SpatialIndex(sources)
+            _index_key = key
+        return _index
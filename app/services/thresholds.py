@@ -0,0 +1,270 @@
+import json
+import os
+import shutil
+import threading
+import time
+
+from app.config import (
+    THRESHOLDS_FILE, THRESHOLD_SKETCH_FILE, THRESHOLD_QUANTILES, DEFAULT_THRESHOLDS,
+    THRESHOLD_MIN_COVERAGE, THRESHOLD_GAP_SECONDS
+)
+
+# Online congestion thresholds.
+#
+# Each camera's vehicle flow is summed into local-time hourly buckets (the same
+# grouping scripts/analyze_thresholds.py uses). When a bucket closes, its total is
+# fed into P² quantile estimators, so p50/p75/p90 stay current without rescanning
+# traffic_history. State is a handful of floats per camera and is served from memory.
+#
+# Hours the camera was only partly online (the first hour after a restart, an
+# outage) would read as quiet hours and drag the percentiles down: each bucket
+# tracks its online seconds like the nowcaster does, buckets below
+# THRESHOLD_MIN_COVERAGE are dropped and the rest are scaled to a full hour.
+
+class P2Quantile:
+    """P² streaming quantile estimator (Jain & Chlamtac, 1985): five markers, O(1) per update."""
+
+    def __init__(self, p):
+        self.p = p
+        self.count = 0
+        self.heights = []                                    # marker heights q0..q4
+        self.positions = [1, 2, 3, 4, 5]                      # actual marker positions
+        self.desired = [1, 1 + 2 * p, 1 + 4 * p, 3 + 2 * p, 5]
+        self.increments = [0, p / 2, p, (1 + p) / 2, 1]
+
+    def add(self, x):
+        x = float(x)
+        self.count += 1
+        if self.count <= 5:
+            self.heights.append(x)
+            self.heights.sort()
+            return
+
+        q, n = self.heights, self.positions
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = 0
+            while x >= q[k + 1]:
+                k += 1
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self.desired[i] += self.increments[i]
+
+        # Adjust the three middle markers towards their desired positions
+        for i in range(1, 4):
+            d = self.desired[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                d = 1 if d > 0 else -1
+                candidate = self._parabolic(i, d)
+                if q[i - 1] < candidate < q[i + 1]:
+                    q[i] = candidate
+                else:
+                    q[i] = q[i] + d * (q[i + d] - q[i]) / (n[i + d] - n[i])
+                n[i] += d
+
+    def _parabolic(self, i, d):
+        q, n = self.heights, self.positions
+        return q[i] + d / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i]) +
+            (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1])
+        )
+
+    def value(self):
+        if not self.heights:
+            return 0.0
+        if self.count > 5:
+            return self.heights[2]
+        # Too few samples for the markers: exact linear-interpolated percentile
+        pos = self.p * (len(self.heights) - 1)
+        lo = int(pos)
+        hi = min(lo + 1, len(self.heights) - 1)
+        return self.heights[lo] + (self.heights[hi] - self.heights[lo]) * (pos - lo)
+
+    def to_dict(self):
+        return {
+            "p": self.p, "count": self.count, "heights": self.heights,
+            "positions": self.positions, "desired": self.desired
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(data["p"])
+        sketch.count = data["count"]
+        sketch.heights = list(data["heights"])
+        sketch.positions = list(data["positions"])
+        sketch.desired = list(data["desired"])
+        return sketch
+
+def hour_bucket(timestamp):
+    """Local-time hour key, matching strftime('%Y-%m-%d %H', ..., 'localtime') in SQLite."""
+    return time.strftime("%Y-%m-%d %H", time.localtime(timestamp))
+
+def full_hour_count(total, seconds):
+    """A bucket's total scaled to a full hour, or None if it covers too little of it."""
+    if seconds < THRESHOLD_MIN_COVERAGE * 3600:
+        return None
+    return total * 3600.0 / min(seconds, 3600.0)
+
+class CameraSketch:
+    """Open hourly bucket plus the quantile estimators over closed buckets."""
+
+    def __init__(self):
+        self.bucket = None
+        self.bucket_sum = 0
+        self.bucket_seconds = 0.0   # online time within the open bucket
+        self.last_ts = None
+        self.max = 0
+        self.quantiles = {q: P2Quantile(q / 100.0) for q in THRESHOLD_QUANTILES}
+
+    def observe(self, timestamp, new_count):
+        """Add one cycle's new vehicles. Returns True if an hourly bucket was closed into the sketch."""
+        bucket = hour_bucket(timestamp)
+        closed = False
+        if bucket != self.bucket:
+            if self.bucket is not None:
+                closed = self.add_bucket(self.bucket_sum, self.bucket_seconds)
+            self.bucket = bucket
+            self.bucket_sum = 0
+            self.bucket_seconds = 0.0
+        self.bucket_sum += new_count
+        dt = None if self.last_ts is None else timestamp - self.last_ts
+        if dt is not None and 0 < dt <= THRESHOLD_GAP_SECONDS:
+            self.bucket_seconds += dt
+        self.last_ts = timestamp
+        return closed
+
+    def add_bucket(self, hourly_count, seconds=3600.0):
+        """Feed a closed bucket covering `seconds` of online time. Returns False if it was dropped."""
+        hourly_count = full_hour_count(hourly_count, seconds)
+        if hourly_count is None:
+            return False
+        for sketch in self.quantiles.values():
+            sketch.add(hourly_count)
+        self.max = max(self.max, int(hourly_count))
+        return True
+
+    @property
+    def samples(self):
+        return next(iter(self.quantiles.values())).count
+
+    def thresholds(self):
+        result = {f"p{q}": int(sketch.value()) for q, sketch in self.quantiles.items()}
+        result["max"] = self.max
+        return result
+
+    def to_dict(self):
+        return {
+            "bucket": self.bucket, "bucket_sum": self.bucket_sum, "bucket_seconds": self.bucket_seconds,
+            "last_ts": self.last_ts, "max": self.max,
+            "quantiles": {str(q): s.to_dict() for q, s in self.quantiles.items()}
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls()
+        sketch.bucket = data.get("bucket")
+        sketch.bucket_sum = data.get("bucket_sum", 0)
+        sketch.bucket_seconds = data.get("bucket_seconds", 0.0)
+        sketch.last_ts = data.get("last_ts")
+        sketch.max = data.get("max", 0)
+        for q, state in data.get("quantiles", {}).items():
+            if int(q) in sketch.quantiles:
+                sketch.quantiles[int(q)] = P2Quantile.from_dict(state)
+        return sketch
+
+class ThresholdStore:
+    """
+    Per-camera sketches, kept in memory and persisted to THRESHOLD_SKETCH_FILE.
+    The ingest process updates and saves; read-only (web) stores reload the file
+    when it changes on disk.
+    """
+
+    def __init__(self, path=THRESHOLD_SKETCH_FILE, legacy_path=THRESHOLDS_FILE, read_only=False):
+        self.path = path
+        self.legacy_path = legacy_path
+        self.read_only = read_only
+        self.sketches = {}
+        self.legacy = {}
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._mtime = None
+
+    def load(self):
+        # Batch thresholds from analyze_thresholds.py are only a fallback for
+        # cameras whose sketch has no closed buckets yet
+        if os.path.exists(self.legacy_path):
+            try:
+                with open(self.legacy_path, 'r') as f:
+                    self.legacy = json.load(f)
+            except Exception as e:
+                print(f"[WARN] Failed to load {self.legacy_path}: {e}")
+        self._load_sketches()
+        return self
+
+    def _load_sketches(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            mtime = os.path.getmtime(self.path)
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+            sketches = {cam_id: CameraSketch.from_dict(state) for cam_id, state in data.items()}
+            with self._lock:
+                self.sketches = sketches
+                self._mtime = mtime
+        except Exception as e:
+            print(f"[ERROR] Failed to load threshold sketches: {e}")
+
+    def refresh(self):
+        """Pick up a newer file written by the ingest process (read-only stores)."""
+        if not self.read_only or not os.path.exists(self.path):
+            return
+        if os.path.getmtime(self.path) != self._mtime:
+            self._load_sketches()
+
+    def observe(self, camera_id, timestamp, new_count):
+        with self._lock:
+            sketch = self.sketches.get(camera_id)
+            if sketch is None:
+                sketch = self.sketches[camera_id] = CameraSketch()
+            closed = sketch.observe(timestamp, new_count)
+            self._dirty = True
+        return closed
+
+    def add_bucket(self, camera_id, hourly_count, seconds=3600.0):
+        """Feed an already-closed hourly total (used when seeding from the DB). Returns False if dropped."""
+        with self._lock:
+            sketch = self.sketches.get(camera_id)
+            if sketch is None:
+                sketch = self.sketches[camera_id] = CameraSketch()
+            self._dirty = True
+            return sketch.add_bucket(hourly_count, seconds)
+
+    def thresholds(self, camera_id):
+        with self._lock:
+            sketch = self.sketches.get(camera_id)
+            if sketch is not None and sketch.samples:
+                return sketch.thresholds()
+        return self.legacy.get(camera_id, DEFAULT_THRESHOLDS)
+
+    def save(self):
+        with self._lock:
+            data = {cam_id: sketch.to_dict() for cam_id, sketch in self.sketches.items()}
+            self._dirty = False
+        try:
+            temp_file = self.path + ".tmp"
+            with open(temp_file, 'w') as f:
+                json.dump(data, f, separators=(",", ":"))
+            shutil.move(temp_file, self.path)
+        except Exception as e:
+            print(f"[ERROR] Failed to save threshold sketches: {e}")
+
+    def save_if_dirty(self):
+        if self._dirty and not self.read_only:
+            self.save()
@@ -1,4 +1,3 @@
-import csv
 import datetime
 import json
 import os
@@ -8,10 +7,18 @@ import shutil
 import random
 import math
 from collections import deque
-from app.config import CONFIG_FILE, STATS_FILE, HISTORY_MAX_LEN
+from app.config import CONFIG_FILE, STATS_FILE, HISTORY_MAX_LEN, INGEST_LOCK_FILE
 import app.globals as g
 
-from app.database import insert_history_batch, clear_all_history
+try:
+    import fcntl
+except ImportError:  # optional: no ingest lock on platforms without flock
+    fcntl = None
+
+from app.database import insert_history_batch, clear_all_history, get_camera_history
+from app.services.backfill import backfill_sql, write_datalake_aggregates
+from app.services.datalake import day_summary
+from app.services.spatial import normalize_coordinates
 
 def get_camera_profile(name):
     """
@@ -187,7 +194,10 @@ def generate_varied_history(hours=24):
                     item["new_motors"]
                 ))
             try:
-                insert_history_batch(db_records)
+                rowid = insert_history_batch(db_records)
+                if rowid:
+                    # Rows up to here are in the counters (see scripts/sync_stats_db.py)
+                    stats["db_rowid"] = rowid
             except Exception as e:
                 print(f"[ERROR] Failed to insert history batch for {source_id}: {e}")
 
@@ -209,45 +219,15 @@ def backfill_camera_history(new_id, template_id, hours=24, generate_datalake=Fal
     else:
         start_ts = now - float(hours) * 3600.0
 
-    if template_id not in g.global_stats:
-        return {"status": "error", "message": "Template source not found"}
-
-    template_stats = g.global_stats[template_id]
-    template_history = list(template_stats.get("history", []))
-    if not template_history:
-        return {"status": "error", "message": "Template has no history data"}
+    # The copy runs as INSERT ... SELECT inside SQLite (app/services/backfill.py);
+    # with start_date the template's last day is tiled over every day of the range
+    def report(done, total):
+        print(f"[INFO] Backfill {new_id}: {done}/{total} days")
 
-    items_to_add = []
-    if start_date:
-        last_ts = template_history[-1]["ts"]
-        pattern_start = last_ts - 86400
-        pattern_items = [h for h in template_history if h["ts"] > pattern_start]
-        if not pattern_items:
-            pattern_items = template_history
-
-        daily_pattern = []
-        for item in pattern_items:
-            dt = datetime.datetime.fromtimestamp(item["ts"])
-            secs = dt.hour * 3600 + dt.minute * 60 + dt.second + dt.microsecond / 1e6
-            daily_pattern.append((secs, item))
-        daily_pattern.sort(key=lambda x: x[0])
-
-        loop_date = datetime.datetime.fromtimestamp(start_ts).date()
-        end_date = datetime.datetime.fromtimestamp(now).date()
-        while loop_date <= end_date:
-            day_start = datetime.datetime.combine(loop_date, datetime.time.min).timestamp()
-            for secs, item in daily_pattern:
-                new_ts = day_start + secs
-                if new_ts < start_ts:
-                    continue
-                if new_ts > now:
-                    break
-                new_item = item.copy()
-                new_item["ts"] = new_ts
-                items_to_add.append(new_item)
-            loop_date += datetime.timedelta(days=1)
-    else:
-        items_to_add = [h for h in template_history if h.get("ts", 0) >= start_ts]
+    try:
+        result = backfill_sql(new_id, template_id, start_ts, now, shift_days=bool(start_date), progress=report)
+    except ValueError as e:
+        return {"status": "error", "message": str(e)}
 
     if new_id not in g.global_stats:
         name = next((s["name"] for s in g.CCTV_SOURCES if s["id"] == new_id), "Unknown")
@@ -261,35 +241,17 @@ def backfill_camera_history(new_id, template_id, hours=24, generate_datalake=Fal
         }
 
     dst = g.global_stats[new_id]
-    dst["history"] = deque(maxlen=HISTORY_MAX_LEN)
-    dst["accumulated_count"] = 0
-    dst["accumulated_class_counts"] = {"0": 0, "1": 0}
-    for item in items_to_add:
-        dst["history"].append(item)
-        dst["accumulated_count"] += item.get("new_count", 0)
-        dst["accumulated_class_counts"]["0"] += item.get("new_cars", 0)
-        dst["accumulated_class_counts"]["1"] += item.get("new_motors", 0)
-
-    if items_to_add:
-        # Sync to SQLite
-        db_records = []
-        for item in items_to_add:
-            db_records.append((
-                new_id,
-                item["ts"],
-                item.get("count", 0),
-                item.get("cars", 0),
-                item.get("motors", 0),
-                item.get("new_count", 0),
-                item.get("new_cars", 0),
-                item.get("new_motors", 0)
-            ))
-        try:
-            insert_history_batch(db_records)
-        except Exception as e:
-            print(f"[ERROR] Failed to insert backfill batch to DB: {e}")
-
-        last = items_to_add[-1]
+    dst["accumulated_count"] = result["new_count"]
+    dst["accumulated_class_counts"] = {"0": result["new_cars"], "1": result["new_motors"]}
+    if result["last_rowid"]:
+        dst["db_rowid"] = result["last_rowid"]
+    # Hot history: only the newest HISTORY_MAX_LEN backfilled rows are loaded back
+    dst["history"] = deque(
+        get_camera_history(new_id, start_ts=start_ts, end_ts=now, limit=HISTORY_MAX_LEN),
+        maxlen=HISTORY_MAX_LEN
+    )
+    if dst["history"]:
+        last = dst["history"][-1]
         dst["current_count"] = last.get("count", 0)
         dst["current_class_counts"] = {
             "0": last.get("new_cars", 0),
@@ -298,33 +260,13 @@ def backfill_camera_history(new_id, template_id, hours=24, generate_datalake=Fal
 
     save_stats()
 
-    if generate_datalake and items_to_add:
-        from collections import defaultdict
-        items_by_date = defaultdict(list)
-        for item in items_to_add:
-            ts = item.get("ts", now)
-            dt = datetime.datetime.fromtimestamp(ts)
-            date_key = (dt.year, dt.month, dt.day)
-            items_by_date[date_key].append(item)
-
-        name = dst.get("name", new_id)
-        for (year, month, day), day_items in items_by_date.items():
-            base = os.path.join("/var/www/vehicle-counter/data_lake/raw", str(year), f"{month:02d}", f"{day:02d}")
-            os.makedirs(base, exist_ok=True)
-            fp = os.path.join(base, f"traffic_log_{new_id}.csv")
-            file_exists = os.path.isfile(fp)
-            with open(fp, "a", newline="") as f:
-                w = csv.writer(f)
-                if not file_exists:
-                    w.writerow(["timestamp", "source_id", "source_name", "class_id", "confidence", "bbox"])
-                for item in day_items:
-                    ts = item.get("ts")
-                    for _ in range(item.get("new_cars", 0)):
-                        w.writerow([ts, new_id, name, "car", "0.50", "[0,0,0,0]"])
-                    for _ in range(item.get("new_motors", 0)):
-                        w.writerow([ts, new_id, name, "motorcycle", "0.50", "[0,0,0,0]"])
-
-    return {"status": "success", "message": "Backfill completed"}
+    if generate_datalake and result["rows"]:
+        write_datalake_aggregates(new_id, dst.get("name", new_id), result["first_rowid"], start_ts, now)
+
+    return {
+        "status": "success",
+        "message": f"Backfill completed: {result['rows']} rows in {result['seconds']:.1f}s"
+    }
 
 def get_datalake_stats(date_str=None):
     """
@@ -339,15 +281,14 @@ def get_datalake_stats(date_str=None):
         except ValueError:
             return {"error": "Invalid date format. Use YYYY-MM-DD"}
             
-    # Path to Data Lake partition
-    partition_path = os.path.join(
-        "/var/www/vehicle-counter/data_lake/raw", 
-        str(now.year), 
-        f"{now.month:02d}", 
-        f"{now.day:02d}"
-    )
-    
-    if not os.path.exists(partition_path):
+    try:
+        # Compacted days are answered from their index; only loose CSVs are scanned
+        summary = day_summary(now.date())
+    except Exception as e:
+        print(f"[ERROR] Failed to read Data Lake: {e}")
+        return {"error": str(e)}
+
+    if summary is None:
         return {"total_vehicles": 0, "by_camera": {}, "date": now.strftime("%Y-%m-%d"), "message": "No data found for this date"}
         
     stats = {
@@ -355,40 +296,22 @@ def get_datalake_stats(date_str=None):
         "total_vehicles": 0,
         "by_camera": {}
     }
-    
-    try:
-        # Iterate over all CSV files in the partition
-        for filename in os.listdir(partition_path):
-            if filename.endswith(".csv"):
-                filepath = os.path.join(partition_path, filename)
-                with open(filepath, 'r') as f:
-                    reader = csv.DictReader(f)
-                    for row in reader:
-                        stats["total_vehicles"] += 1
-                        
-                        src_name = row.get("source_name", "Unknown")
-                        cls_id = row.get("class_id", "unknown")
-                        
-                        if src_name not in stats["by_camera"]:
-                            stats["by_camera"][src_name] = {"total": 0, "car": 0, "motorcycle": 0}
-                            
-                        stats["by_camera"][src_name]["total"] += 1
-                        if cls_id == "car":
-                            stats["by_camera"][src_name]["car"] += 1
-                        elif cls_id == "motorcycle":
-                            stats["by_camera"][src_name]["motorcycle"] += 1
-                            
-        return stats
-    except Exception as e:
-        print(f"[ERROR] Failed to read Data Lake: {e}")
-        return {"error": str(e)}
+    for camera in summary.values():
+        by_camera = stats["by_camera"].setdefault(camera["name"], {"total": 0, "car": 0, "motorcycle": 0})
+        for total, cars, motors in camera["hours"].values():
+            stats["total_vehicles"] += total
+            by_camera["total"] += total
+            by_camera["car"] += cars
+            by_camera["motorcycle"] += motors
+    return stats
 
 def load_config():
     if not os.path.exists(CONFIG_FILE):
         return []
     try:
         with open(CONFIG_FILE, 'r') as f:
-            return json.load(f)
+            # Older entries store lat/lng as strings
+            return normalize_coordinates(json.load(f))
     except Exception as e:
         print(f"[ERROR] Failed to load config: {e}")
         return []
@@ -490,26 +413,50 @@ def save_stats():
             "last_update": time.time()
         }
         
-        # Atomic Write: Write to temp -> Move to final
-        temp_file = STATS_FILE + ".tmp"
-        backup_file = STATS_FILE + ".bak"
-        
-        # Write to temp file first
-        with open(temp_file, 'w') as f:
-            json.dump(final_data, f, indent=4)
-            
-        # If write successful, backup old file then replace
-        if os.path.exists(STATS_FILE):
-            try:
-                shutil.copy2(STATS_FILE, backup_file)
-            except Exception as e:
-                print(f"[WARN] Failed to create backup: {e}")
-                
-        shutil.move(temp_file, STATS_FILE)
+        write_stats_file(final_data)
         
     except Exception as e:
         print(f"[ERROR] Failed to save stats: {e}")
 
+def acquire_ingest_lock(blocking=True):
+    """
+    Exclusive lock marking the process that owns STATS_FILE (camera agents save
+    it every minute). Returns the open lock file, or None if another process
+    holds it and blocking is False. Released when the file is closed or the
+    process exits.
+    """
+    os.makedirs(os.path.dirname(INGEST_LOCK_FILE), exist_ok=True)
+    f = open(INGEST_LOCK_FILE, "a")
+    if fcntl is None:
+        return f
+    try:
+        fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        if not blocking:
+            f.close()
+            return None
+        print("[INFO] Waiting for the ingest lock (stats sync or another ingest process running)...")
+        fcntl.flock(f, fcntl.LOCK_EX)
+    return f
+
+def write_stats_file(data, indent=4):
+    """Atomic write of a traffic_stats.json document (temp file -> backup old -> move)."""
+    temp_file = STATS_FILE + ".tmp"
+    backup_file = STATS_FILE + ".bak"
+
+    # Write to temp file first
+    with open(temp_file, 'w') as f:
+        json.dump(data, f, indent=indent)
+
+    # If write successful, backup old file then replace
+    if os.path.exists(STATS_FILE):
+        try:
+            shutil.copy2(STATS_FILE, backup_file)
+        except Exception as e:
+            print(f"[WARN] Failed to create backup: {e}")
+
+    shutil.move(temp_file, STATS_FILE)
+
 def sync_stats_with_config():
     valid_ids = {src["id"] for src in g.CCTV_SOURCES}
     to_remove = [k for k in g.global_stats.keys() if k not in valid_ids]
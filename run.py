@@ -1,19 +1,38 @@
+import signal
+import time
 
 from app import create_app
-from app.services.camera import start_camera_agents
-from app.config import HOST_IP, HOST_PORT
+from app.services.camera import start_camera_agents, stop_camera_agents
+from app.config import HOST_IP, HOST_PORT, SERVICE_ROLE
 
 # Create Flask Application
 app = create_app()
 
+def _terminate(signum, frame):
+    # SIGTERM (serve.py, systemd, docker stop) shuts down like Ctrl+C
+    raise KeyboardInterrupt
+
 if __name__ == "__main__":
-    print(f"[INFO] Starting Vehicle Counter System...")
+    print(f"[INFO] Starting Vehicle Counter System (role: {SERVICE_ROLE})...")
+    signal.signal(signal.SIGTERM, _terminate)
     
     # Start Camera Agents (Background Threads)
     start_camera_agents()
-    
-    print(f"[INFO] Server running on http://{HOST_IP}:{HOST_PORT}")
-    
-    # Run Flask Server
-    # use_reloader=False is important when using background threads to avoid duplicates
-    app.run(host=HOST_IP, port=HOST_PORT, debug=False, use_reloader=False)
+
+    try:
+        if SERVICE_ROLE == "ingest":
+            # Agents only; web workers (wsgi.py / serve.py) read the shared live state
+            print("[INFO] Ingest process running. Press Ctrl+C to stop.")
+            while True:
+                time.sleep(1)
+        else:
+            print(f"[INFO] Server running on http://{HOST_IP}:{HOST_PORT}")
+            
+            # Run Flask Server (development; see serve.py for production)
+            # use_reloader=False is important when using background threads to avoid duplicates
+            app.run(host=HOST_IP, port=HOST_PORT, debug=False, use_reloader=False, threaded=True)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        # Flush stats/sketches so a restart loses nothing
+        stop_camera_agents()
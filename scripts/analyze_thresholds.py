@@ -1,12 +1,16 @@
+import argparse
 import sqlite3
 import os
 import sys
+import time
 import numpy as np
 
 # Add project root to path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from app.config import DATA_DIR
+from app.config import DATA_DIR, THRESHOLD_GAP_SECONDS
+from app.services.thresholds import ThresholdStore, hour_bucket
+from app.services.nowcast import NowcastStore
 
 DB_PATH = os.path.join(DATA_DIR, "traffic_data.db")
 
@@ -71,5 +75,107 @@ def analyze_traffic_distribution():
     conn.close()
     return thresholds
 
+def seed_sketches():
+    """
+    One-off bootstrap of the online threshold sketches from existing history.
+    Run with the camera agents stopped: it replaces camera_threshold_sketches.json.
+    """
+    if not os.path.exists(DB_PATH):
+        print("Database not found!")
+        return
+
+    conn = sqlite3.connect(DB_PATH)
+    c = conn.cursor()
+    store = ThresholdStore()
+    current_hour = hour_bucket(time.time())
+
+    # Chronological, so the sketches see buckets in the order the agents would.
+    # Online seconds per hour are the gaps between cycles, as the agents count them
+    c.execute("""
+        WITH cycles AS (
+            SELECT
+                camera_id,
+                strftime('%Y-%m-%d %H', datetime(timestamp, 'unixepoch', 'localtime')) as hour_str,
+                new_count,
+                timestamp - LAG(timestamp) OVER (PARTITION BY camera_id ORDER BY timestamp) as dt
+            FROM traffic_history
+        )
+        SELECT
+            camera_id,
+            hour_str,
+            SUM(new_count) as hourly_count,
+            SUM(CASE WHEN dt > 0 AND dt <= ? THEN dt ELSE 0 END) as online_seconds
+        FROM cycles
+        GROUP BY camera_id, hour_str
+        ORDER BY camera_id, hour_str
+    """, (THRESHOLD_GAP_SECONDS,))
+    buckets = dropped = 0
+    for cam_id, hour_str, hourly_count, online_seconds in c:
+        # The open hour keeps accumulating in the agents
+        if hour_str == current_hour:
+            continue
+        if store.add_bucket(cam_id, hourly_count or 0, online_seconds):
+            buckets += 1
+        else:
+            dropped += 1
+    conn.close()
+
+    store.save()
+    for cam_id in sorted(store.sketches):
+        t = store.thresholds(cam_id)
+        print(f"Cam {cam_id[:8]}... : Median={t['p50']}, Padat(75%)={t['p75']}, Macet(90%)={t['p90']}, Max={t['max']}")
+    print(f"Seeded {len(store.sketches)} cameras from {buckets} hourly buckets into {store.path} "
+          f"({dropped} partly covered hours skipped)")
+
+def seed_nowcast():
+    """
+    One-off bootstrap of the nowcast weekday x hour baselines from existing history.
+    Run with the camera agents stopped: it replaces nowcast_state.json.
+    """
+    if not os.path.exists(DB_PATH):
+        print("Database not found!")
+        return
+
+    conn = sqlite3.connect(DB_PATH)
+    c = conn.cursor()
+    store = NowcastStore()
+    current_hour = hour_bucket(time.time())
+
+    c.execute("""
+        SELECT
+            camera_id,
+            strftime('%Y-%m-%d %H', datetime(timestamp, 'unixepoch', 'localtime')) as hour_str,
+            CAST(strftime('%w', datetime(timestamp, 'unixepoch', 'localtime')) AS INTEGER) * 24
+                + CAST(strftime('%H', datetime(timestamp, 'unixepoch', 'localtime')) AS INTEGER) as slot,
+            SUM(new_count) as hourly_count
+        FROM traffic_history
+        GROUP BY camera_id, hour_str
+        ORDER BY camera_id, hour_str
+    """)
+    buckets = 0
+    for cam_id, hour_str, slot, hourly_count in c:
+        if hour_str == current_hour:
+            continue
+        store.add_bucket(cam_id, slot, hourly_count or 0)
+        buckets += 1
+    conn.close()
+
+    store.save()
+    for cam_id in sorted(store.cameras):
+        slots = store.cameras[cam_id].baseline
+        print(f"Cam {cam_id[:8]}... : {len(slots)} weekday/hour slots")
+    print(f"Seeded {len(store.cameras)} cameras from {buckets} hourly buckets into {store.path}")
+
 if __name__ == "__main__":
-    analyze_traffic_distribution()
+    parser = argparse.ArgumentParser(description="Per-camera congestion thresholds from hourly traffic history.")
+    parser.add_argument("--seed-sketches", action="store_true",
+                        help="Bootstrap the online sketches used by /api/predict_traffic instead of writing camera_thresholds.json")
+    parser.add_argument("--seed-nowcast", action="store_true",
+                        help="Bootstrap the nowcast weekday x hour baselines used for anomaly flags")
+    args = parser.parse_args()
+    if args.seed_sketches:
+        seed_sketches()
+    elif args.seed_nowcast:
+        seed_nowcast()
+    else:
+        analyze_traffic_distribution()
@@ -0,0 +1,82 @@
+import argparse
+import csv
+import datetime
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config import LAKE_SCAN_PROCESSES
+from app.services.datalake import RAW_FILE_PREFIX, RAW_HEADER, partition_dir, compact_closed_partitions, day_summary
+from app.services.lake_analytics import RangeAnalytics
+
+# Month-long data-lake report on a synthetic lake of raw detection logs:
+# one-day-at-a-time scans (what /api/datalake/stats costs per date) vs
+# /api/datalake/range cold on one process, cold on the process pool, warm from
+# the day cache, and cold again after compaction.
+
+def seed(root, cameras, days, rows_per_day, seed=0):
+    rng = np.random.default_rng(seed)
+    end = datetime.date.today()
+    dates = [end - datetime.timedelta(days=i) for i in range(days, 0, -1)]
+    for day in dates:
+        path = partition_dir(day, root)
+        os.makedirs(path, exist_ok=True)
+        day_start = datetime.datetime.combine(day, datetime.time.min).timestamp()
+        for cam in range(cameras):
+            ts = np.sort(day_start + rng.uniform(0, 86400, rows_per_day))
+            classes = rng.choice(["0", "1"], rows_per_day, p=[0.4, 0.6])
+            conf = rng.uniform(0.1, 0.99, rows_per_day)
+            with open(os.path.join(path, f"{RAW_FILE_PREFIX}cam-{cam:03d}.csv"), "w", newline="") as f:
+                writer = csv.writer(f)
+                writer.writerow(RAW_HEADER)
+                writer.writerows([t, f"cam-{cam:03d}", f"Camera {cam}", c, f"{p:.4f}", "[10, 20, 110, 220]"]
+                                 for t, c, p in zip(ts, classes, conf))
+    return dates
+
+def timed(label, fn):
+    t0 = time.perf_counter()
+    result = fn()
+    print(f"{label:<50} {time.perf_counter() - t0:>8.2f} s")
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark multi-day data-lake reports.")
+    parser.add_argument("--cameras", type=int, default=10)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--rows-per-day", type=int, default=5000, help="Detections per camera per day")
+    parser.add_argument("--processes", type=int, default=LAKE_SCAN_PROCESSES or 4)
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix="smarttraffic-lake-")
+    try:
+        dates = timed(f"seed {args.cameras} cameras x {args.days} days x {args.rows_per_day} rows",
+                      lambda: seed(root, args.cameras, args.days, args.rows_per_day))
+        start, end = dates[0], dates[-1]
+
+        timed("per-day scans, one after another", lambda: [day_summary(day, root=root) for day in dates])
+        single = timed("range report, cold, 1 process", lambda: RangeAnalytics(root, processes=0).report(start, end))
+
+        pooled = RangeAnalytics(root, processes=args.processes)
+        report = timed(f"range report, cold, {args.processes} processes", lambda: pooled.report(start, end))
+        assert report["totals"] == single["totals"]
+        timed("range report, warm (day cache)", lambda: pooled.report(start, end))
+        timed("range report, warm, hourly breakdown", lambda: pooled.report(start, end, breakdown="hourly"))
+        pooled.stop()
+
+        timed("compact all days", lambda: list(compact_closed_partitions(root=root)))
+        compacted = timed("range report after compaction, cold, 1 process",
+                          lambda: RangeAnalytics(root, processes=0).report(start, end))
+        assert compacted["totals"] == single["totals"]
+        print(f"\n{report['totals']['total']} vehicles over {report['days']} days")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
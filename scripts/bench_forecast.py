@@ -0,0 +1,70 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+from flask import Flask
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config import FORECAST_HISTORY_DAYS
+from app.services.backfill import utc_offset
+from app.services.forecast import engine, fit, hour_index, week_slot
+import app.globals as g
+
+# Latency of /api/forecast for synthetic camera fleets. The model is fitted from
+# generated hourly series (no database needed) and installed in the engine, so
+# the numbers cover scoring + serialization (miss) and the cached path (hit).
+
+def synthetic_model(n_cams, version, seed=0):
+    rng = np.random.default_rng(seed)
+    now = time.time()
+    offset = utc_offset(now)
+    last_hour = hour_index(now, offset) - 1
+    n_hours = FORECAST_HISTORY_DAYS * 24
+    hours = last_hour - n_hours + 1 + np.arange(n_hours)
+    profile = 60 + 50 * np.sin((week_slot(hours) % 24 - 6) / 24 * 2 * np.pi)
+    hourly = profile * rng.uniform(0.5, 2.0, (n_cams, 1)) + rng.normal(0, 8, (n_cams, n_hours))
+    hourly[rng.random(hourly.shape) < 0.02] = np.nan          # offline hours
+    camera_ids = [f"bench{i}" for i in range(n_cams)]
+    return fit(camera_ids, np.maximum(hourly, 0), int(hours[0]), offset, version)
+
+def timed_get(client, url, repeat):
+    times = []
+    size = 0
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        resp = client.get(url)
+        times.append(time.perf_counter() - t0)
+        assert resp.status_code == 200, resp.get_data(as_text=True)
+        size = len(resp.get_data())
+    return np.array(times) * 1000, size
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the batch forecast endpoint.")
+    parser.add_argument("--cameras", type=int, nargs="+", default=[50, 500])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    from app.routes import bp
+    app = Flask(__name__)
+    app.register_blueprint(bp)
+    client = app.test_client()
+
+    print(f"{'cameras':>7} {'request':<16} {'fit ms':>8} {'miss ms':>8} {'hit p50':>8} {'hit p95':>8} {'bytes':>9}")
+    for version, n_cams in enumerate(args.cameras, start=1):
+        t0 = time.perf_counter()
+        engine.model = synthetic_model(n_cams, version=1000 + version)
+        fit_ms = (time.perf_counter() - t0) * 1000
+        g.CCTV_SOURCES = [{"id": cam_id, "name": f"Camera {i}"} for i, cam_id in enumerate(engine.model.camera_ids)]
+
+        for url in ("/api/forecast?hours=24", "/api/forecast?hours=168", "/api/forecast?grid=week"):
+            miss, size = timed_get(client, url, 1)
+            hit, _ = timed_get(client, url, args.repeat)
+            print(f"{n_cams:>7} {url.split('?')[1]:<16} {fit_ms:>8.1f} {miss[0]:>8.2f} "
+                  f"{np.percentile(hit, 50):>8.2f} {np.percentile(hit, 95):>8.2f} {size:>9}")
+
+if __name__ == "__main__":
+    main()
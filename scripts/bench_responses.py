@@ -0,0 +1,102 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.routes import bucket_history, sources_columnar, HISTORY_FIELDS
+from app.services.responses import compress, orjson, to_columnar
+
+# Payload size and serialization time of /api/history and /api/stats responses:
+# row vs columnar layout, stdlib json (what jsonify uses) vs orjson, and
+# identity vs gzip/deflate. Synthetic 30-day history, 5-minute buckets.
+
+def synthetic_rows(camera_ids, days, step, seed=0):
+    """traffic_history-like rows (only the fields bucket_history reads)."""
+    rng = np.random.default_rng(seed)
+    start = time.time() - days * 86400
+    ts = start + np.arange(0, days * 86400, step)
+    rows = []
+    for cam_id in camera_ids:
+        cars = rng.poisson(3, len(ts))
+        motors = rng.poisson(5, len(ts))
+        rows.extend({"camera_id": cam_id, "ts": float(t), "new_count": int(c + m), "new_cars": int(c),
+                     "new_motors": int(m)} for t, c, m in zip(ts, cars, motors))
+    return rows
+
+def synthetic_sources(camera_ids, seed=0):
+    rng = np.random.default_rng(seed)
+    return {
+        cam_id: {
+            "name": f"Camera {i}", "status": "online", "last_update": time.time(),
+            "current_count": int(rng.integers(0, 40)),
+            "current_class_counts": {"0": int(rng.integers(0, 20)), "1": int(rng.integers(0, 20))},
+            "accumulated_count": int(rng.integers(0, 10 ** 6)),
+            "accumulated_class_counts": {"0": int(rng.integers(0, 10 ** 5)), "1": int(rng.integers(0, 10 ** 5))},
+            "nowcast": {"rate_per_hour": 120.5, "trend_per_hour": -3.2, "next_15m": 30, "next_30m": 60,
+                        "next_60m": 119, "baseline_per_hour": 110.0, "z_score": 0.4, "anomaly": False},
+        }
+        for i, cam_id in enumerate(camera_ids)
+    }
+
+def timed(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - t0)
+    return result, best * 1000
+
+def encoders():
+    yield "json", lambda obj: json.dumps(obj, separators=(",", ":")).encode("utf-8")
+    if orjson is not None:
+        yield "orjson", lambda obj: orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+
+def report(title, layouts, repeat):
+    print(f"\n{title}")
+    print(f"{'layout':<9} {'encoder':<7} {'bytes':>10} {'ser ms':>8} {'gzip B':>9} {'gzip ms':>8} {'defl B':>9} {'defl ms':>8}")
+    for layout, obj in layouts:
+        for name, encode in encoders():
+            body, ser_ms = timed(lambda: encode(obj), repeat)
+            gz, gz_ms = timed(lambda: compress(body, "gzip"), repeat)
+            zl, zl_ms = timed(lambda: compress(body, "deflate"), repeat)
+            print(f"{layout:<9} {name:<7} {len(body):>10} {ser_ms:>8.2f} {len(gz):>9} {gz_ms:>8.2f} {len(zl):>9} {zl_ms:>8.2f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare JSON response layouts, encoders and compression.")
+    parser.add_argument("--cameras", type=int, default=40)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--interval", type=int, default=300, help="History bucket size (seconds)")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    if orjson is None:
+        print("[WARN] orjson not installed; only the stdlib encoder is measured")
+
+    camera_ids = [f"cam-{i:04d}" for i in range(args.cameras)]
+    rows = synthetic_rows(camera_ids, args.days, step=60)
+
+    # All cameras summed (the dashboard's default chart)
+    history = bucket_history(rows, args.interval, "%d/%m %H:%M")
+    report(f"/api/history all cameras, {args.days}d @ {args.interval}s ({len(history)} buckets)",
+           [("rows", history), ("columnar", to_columnar(history, HISTORY_FIELDS))], args.repeat)
+
+    # One chart per camera (camera_id=...), all cameras
+    per_camera = {}
+    for r in rows:
+        per_camera.setdefault(r["camera_id"], []).append(r)
+    histories = {cam_id: bucket_history(cam_rows, args.interval, "%d/%m %H:%M") for cam_id, cam_rows in per_camera.items()}
+    report(f"/api/history per camera x {args.cameras}, {args.days}d @ {args.interval}s",
+           [("rows", histories), ("columnar", {cam_id: to_columnar(h, HISTORY_FIELDS) for cam_id, h in histories.items()})],
+           args.repeat)
+
+    sources = synthetic_sources(camera_ids)
+    report(f"/api/stats sources, {args.cameras} cameras",
+           [("rows", {"sources": sources}), ("columnar", {"sources": sources_columnar(sources)})], args.repeat)
+
+if __name__ == "__main__":
+    main()
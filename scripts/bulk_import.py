@@ -0,0 +1,38 @@
+import argparse
+import os
+import sys
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config import IMPORT_SEGMENT_ROWS
+from app.services.bulk_import import READERS, import_file
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk-load history rows into traffic_history (streaming, resumable, deduplicated).")
+    parser.add_argument("sources", nargs="+", help="Input files (.json stats, .ndjson/.jsonl, .csv; optionally .gz)")
+    parser.add_argument("--format", choices=list(READERS), help="Input format (default: from the file extension)")
+    parser.add_argument("--segment-rows", type=int, default=IMPORT_SEGMENT_ROWS,
+                        help="Rows per transaction and checkpoint")
+    parser.add_argument("--restart", action="store_true", help="Ignore checkpoints and re-read files from the start")
+    args = parser.parse_args()
+
+    for source in args.sources:
+        if not os.path.exists(source):
+            print(f"❌ {source}: not found")
+            continue
+        print(f"Importing {source}...")
+        result = import_file(
+            source, fmt=args.format, segment_rows=args.segment_rows, resume=not args.restart,
+            progress=lambda read, inserted: print(f"  {read:,} rows read, {inserted:,} inserted")
+        )
+        if result["skipped"]:
+            print(f"✅ {source}: already imported ({result['rows_read']:,} rows). Use --restart to re-check.")
+            continue
+        if result["resumed_from"]:
+            print(f"  (resumed after {result['resumed_from']:,} rows)")
+        print(f"✅ {source}: {result['rows_inserted']:,} new of {result['rows_read']:,} rows "
+              f"in {result['seconds']:.1f}s ({result['rows_per_sec']:,.0f} rows/s)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config import CLASS_MAPPING, CLASS_CAR, CLASS_MOTORCYCLE
+from app.services.detectors import create_detector
+from scripts.export_detector import sample_frames, DEFAULT_CALIBRATION_SOURCE
+
+def count_by_class(detections):
+    counts = {CLASS_CAR: 0, CLASS_MOTORCYCLE: 0}
+    for cls_id in detections[:, 5].astype(int):
+        counts[CLASS_MAPPING.get(cls_id, CLASS_CAR)] += 1
+    return counts
+
+def compare(reference, candidate, frames, tolerance):
+    """
+    Run both detectors on the same frames and compare per-frame vehicle counts.
+    Returns True if the mean relative count error is within tolerance.
+    """
+    ref_times, cand_times = [], []
+    errors = []
+    print(f"{'frame':>5} {'ref':>5} {'cand':>5} {'cars':>11} {'motors':>11}")
+    for i, frame in enumerate(frames):
+        t0 = time.perf_counter()
+        ref = reference.detect(frame, augment=False)
+        t1 = time.perf_counter()
+        cand = candidate.detect(frame)
+        t2 = time.perf_counter()
+        ref_times.append(t1 - t0)
+        cand_times.append(t2 - t1)
+
+        ref_counts, cand_counts = count_by_class(ref), count_by_class(cand)
+        errors.append(abs(len(ref) - len(cand)) / float(max(1, len(ref))))
+        print(f"{i:>5} {len(ref):>5} {len(cand):>5} "
+              f"{ref_counts[CLASS_CAR]:>5}/{cand_counts[CLASS_CAR]:<5} "
+              f"{ref_counts[CLASS_MOTORCYCLE]:>5}/{cand_counts[CLASS_MOTORCYCLE]:<5}")
+
+    mean_error = float(np.mean(errors)) if errors else 0.0
+    print(f"\nMean relative count error: {mean_error:.3f} (tolerance {tolerance:.3f})")
+    print(f"Latency  reference: {1000 * np.mean(ref_times):.1f} ms/frame  "
+          f"candidate: {1000 * np.mean(cand_times):.1f} ms/frame")
+    return mean_error <= tolerance
+
+def main():
+    parser = argparse.ArgumentParser(description="Parity check: box counts of an exported backend vs PyTorch.")
+    parser.add_argument("--backend", choices=["onnx", "openvino"], default="onnx")
+    parser.add_argument("--model", help="Exported model path (defaults to the backend's configured path)")
+    parser.add_argument("--source", default=DEFAULT_CALIBRATION_SOURCE, help="Video file or image directory")
+    parser.add_argument("--frames", type=int, default=20)
+    parser.add_argument("--tolerance", type=float, default=0.15,
+                        help="Max mean relative count difference (INT8 typically needs ~0.15)")
+    args = parser.parse_args()
+
+    frames = sample_frames(args.source, args.frames)
+    if not frames:
+        print(f"No frames read from {args.source}")
+        sys.exit(2)
+
+    reference = create_detector("ultralytics")
+    candidate = create_detector(args.backend, args.model)
+    ok = compare(reference, candidate, frames, args.tolerance)
+    print("PASS" if ok else "FAIL")
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+import argparse
+import datetime
+import os
+import sys
+import time
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config import DATA_LAKE_PATH, DATA_LAKE_COMPRESS_LEVEL
+from app.services.datalake import compact_partition, compact_closed_partitions, partition_dir
+
+# Compact closed data-lake days into one indexed, compressed file per day.
+# Safe to re-run (days without new CSVs are skipped) and to run next to the
+# server; schedule it once a night, e.g.
+#   15 0 * * *  cd /var/www/vehicle-counter && python scripts/compact_datalake.py
+
+def main():
+    parser = argparse.ArgumentParser(description="Compact data-lake day partitions.")
+    parser.add_argument("--date", help="Compact only this day (YYYY-MM-DD)")
+    parser.add_argument("--before", help="Compact days before this date (default: today)")
+    parser.add_argument("--root", default=DATA_LAKE_PATH, help=f"Data lake root (default: {DATA_LAKE_PATH})")
+    parser.add_argument("--level", type=int, default=DATA_LAKE_COMPRESS_LEVEL, help="gzip level")
+    args = parser.parse_args()
+
+    today = datetime.date.today()
+    try:
+        if args.date:
+            day = datetime.date.fromisoformat(args.date)
+            if day >= today:
+                print("[ERROR] Only closed days (before today) can be compacted")
+                return 1
+            if not os.path.isdir(partition_dir(day, args.root)):
+                print(f"[ERROR] No partition for {day}")
+                return 1
+            results = [compact_partition(day, args.root, args.level)]
+        else:
+            before = datetime.date.fromisoformat(args.before) if args.before else today
+            results = compact_closed_partitions(min(before, today), args.root, args.level)
+    except ValueError as e:
+        print(f"[ERROR] {e}")
+        return 1
+
+    started = time.time()
+    days = files = bytes_in = bytes_out = 0
+    for result in results:
+        if not result["files"]:
+            continue
+        days += 1
+        files += result["files"]
+        bytes_in += result["bytes_in"]
+        bytes_out += result["bytes_out"]
+        print(f"[INFO] {result['date']}: {result['files']} files, {result['cameras']} cameras, "
+              f"{result['rows']} rows, {result['bytes_in'] / 1e6:.1f} MB -> {result['bytes_out'] / 1e6:.1f} MB")
+    print(f"[INFO] Compacted {days} days ({files} files) in {time.time() - started:.1f}s, "
+          f"{bytes_in / 1e6:.1f} MB -> {bytes_out / 1e6:.1f} MB")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
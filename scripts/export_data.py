@@ -1,19 +1,23 @@
-import sqlite3
-import csv
-import os
-import json
+import argparse
 import datetime
+import gzip
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
 
-# Konfigurasi
-BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-DB_PATH = os.path.join(BASE_DIR, 'data/traffic_data.db')
-CONFIG_PATH = os.path.join(BASE_DIR, 'data/cctv_config.json')
-OUTPUT_FILE = os.path.join(BASE_DIR, 'data/exports/traffic_data_limited.csv')
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config import CONFIG_FILE, EXPORT_DIR, EXPORT_BATCH_SIZE
+from app.database import get_db_connection
+from app.services.export import FORMATS, iter_history_batches, export_chunks
 
 def load_camera_names():
     """Load camera configuration and return a dictionary mapping ID to Name."""
     try:
-        with open(CONFIG_PATH, 'r') as f:
+        with open(CONFIG_FILE, 'r') as f:
             cameras = json.load(f)
             # Create a dictionary: { "uuid": "Location Name" }
             return {cam["id"]: cam["name"] for cam in cameras}
@@ -21,66 +25,86 @@ def load_camera_names():
         print(f"Warning: Could not load camera config: {e}")
         return {}
 
-def export_limited_data(limit=100000):
-    """
-    Export N data terakhir dari database SQLite ke CSV, 
-    mengganti Camera ID dengan Nama Lokasi.
-    """
-    print(f"Loading camera names from: {CONFIG_PATH}")
-    camera_map = load_camera_names()
-    
-    print(f"Connecting to database: {DB_PATH}")
-    
+def parse_time(value):
+    """Epoch seconds, or an ISO date/datetime in local time."""
+    if value is None:
+        return None
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
-        # Query untuk mengambil data terakhir dengan LIMIT
-        query = f"""
-            SELECT 
-                datetime(timestamp, 'unixepoch', 'localtime') as time_str,
-                camera_id,
-                total_count,
-                car_count,
-                motorcycle_count
-            FROM traffic_history
-            ORDER BY timestamp DESC
-            LIMIT ?
-        """
-        
-        print(f"Executing query with LIMIT {limit}...")
-        cursor.execute(query, (limit,))
-        rows = cursor.fetchall()
-        
-        if not rows:
-            print("No data found in database.")
-            return
+        return float(value)
+    except ValueError:
+        return datetime.datetime.fromisoformat(value).timestamp()
 
-        # Tulis ke CSV
-        with open(OUTPUT_FILE, 'w', newline='', encoding='utf-8') as f:
-            writer = csv.writer(f)
-            # Header baru dengan Location Name
-            writer.writerow(['Timestamp', 'Location Name', 'Total Count', 'Car Count', 'Motorcycle Count'])
-            
-            count = 0
-            for row in rows:
-                ts, cam_id, total, cars, motors = row
-                # Ganti ID dengan Nama, atau gunakan ID jika nama tidak ditemukan
-                location_name = camera_map.get(cam_id, cam_id)
-                writer.writerow([ts, location_name, total, cars, motors])
-                count += 1
-            
-        print(f"✅ Berhasil export {count} baris data ke '{OUTPUT_FILE}'")
-        print(f"   (Camera ID telah diganti dengan Nama Lokasi)")
-        
-    except sqlite3.Error as e:
-        print(f"❌ Database error: {e}")
-    except Exception as e:
-        print(f"❌ Error: {e}")
+def open_output(path, compress):
+    if compress:
+        return gzip.open(path, "wb", compresslevel=6)
+    return open(path, "wb")
+
+def export_to_file(path, fmt, compress, start_ts, end_ts, camera_ids, batch_size, camera_names):
+    """Stream one export to a file. Returns the number of rows written."""
+    rows_written = 0
+
+    def counted(batches):
+        nonlocal rows_written
+        for rows in batches:
+            rows_written += len(rows)
+            yield rows
+
+    batches = counted(iter_history_batches(start_ts, end_ts, camera_ids, batch_size))
+    with open_output(path, compress) as f:
+        for chunk in export_chunks(fmt, batches, camera_names):
+            f.write(chunk if isinstance(chunk, bytes) else chunk.encode("utf-8"))
+    return rows_written
+
+def _export_shard(args):
+    camera_id, path, fmt, compress, start_ts, end_ts, batch_size, camera_names = args
+    return camera_id, path, export_to_file(path, fmt, compress, start_ts, end_ts, [camera_id],
+                                           batch_size, camera_names)
+
+def list_cameras():
+    # Answered from the (camera_id, timestamp) covering index
+    conn = get_db_connection()
+    try:
+        return [row[0] for row in conn.execute("SELECT DISTINCT camera_id FROM traffic_history")]
     finally:
-        if conn:
-            conn.close()
+        conn.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Streaming export of traffic_history (constant memory).")
+    parser.add_argument("--start", help="Start time (epoch or ISO, local time), inclusive")
+    parser.add_argument("--end", help="End time (epoch or ISO, local time), exclusive")
+    parser.add_argument("--camera", action="append", help="Camera ID to include (repeatable; default all)")
+    parser.add_argument("--format", choices=list(FORMATS), default="csv")
+    parser.add_argument("--gzip", action="store_true", help="Gzip-compress the output")
+    parser.add_argument("--output", help="Output file (or directory with --shard-by-camera)")
+    parser.add_argument("--shard-by-camera", action="store_true", help="Write one file per camera in parallel")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--batch-size", type=int, default=EXPORT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    start_ts, end_ts = parse_time(args.start), parse_time(args.end)
+    ext = FORMATS[args.format][0] + (".gz" if args.gzip else "")
+    camera_names = load_camera_names()
+    started = time.time()
+
+    if args.shard_by_camera:
+        out_dir = args.output or os.path.join(EXPORT_DIR, time.strftime("traffic_%Y%m%d_%H%M%S"))
+        os.makedirs(out_dir, exist_ok=True)
+        cameras = args.camera or list_cameras()
+        jobs = [(cam_id, os.path.join(out_dir, f"{cam_id}.{ext}"), args.format, args.gzip,
+                 start_ts, end_ts, args.batch_size, camera_names) for cam_id in cameras]
+        total = 0
+        with ProcessPoolExecutor(max_workers=args.workers) as executor:
+            for cam_id, path, rows in executor.map(_export_shard, jobs):
+                total += rows
+                print(f"  {camera_names.get(cam_id, cam_id)}: {rows} rows -> {path}")
+        print(f"✅ Exported {total} rows in {len(jobs)} shards to '{out_dir}' ({time.time() - started:.1f}s)")
+        return
+
+    output = args.output or os.path.join(EXPORT_DIR, f"traffic_data.{ext}")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    rows = export_to_file(output, args.format, args.gzip, start_ts, end_ts, args.camera,
+                          args.batch_size, camera_names)
+    print(f"✅ Exported {rows} rows to '{output}' ({time.time() - started:.1f}s)")
 
 if __name__ == "__main__":
-    # Menggunakan limit 100,000 sesuai permintaan
-    export_limited_data(100000)
+    main()
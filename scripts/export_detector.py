@@ -0,0 +1,132 @@
+import argparse
+import os
+import shutil
+import sys
+
+import cv2
+import numpy as np
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config import YOLO_MODEL_PATH, ONNX_MODEL_PATH, OPENVINO_MODEL_PATH, DATA_DIR
+from app.services.detectors import preprocess
+
+DEFAULT_CALIBRATION_SOURCE = os.path.join(DATA_DIR, "video", "traffic.mp4")
+
+def sample_frames(source, count):
+    """Take `count` evenly spaced frames from a video file or a directory of images."""
+    if os.path.isdir(source):
+        files = sorted(
+            os.path.join(source, f) for f in os.listdir(source)
+            if f.lower().endswith((".jpg", ".jpeg", ".png"))
+        )
+        step = max(1, len(files) // count)
+        frames = [cv2.imread(f) for f in files[::step][:count]]
+        return [f for f in frames if f is not None]
+
+    cap = cv2.VideoCapture(source)
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) or count
+    frames = []
+    for idx in np.linspace(0, total - 1, count).astype(int):
+        cap.set(cv2.CAP_PROP_POS_FRAMES, int(idx))
+        ret, frame = cap.read()
+        if ret:
+            frames.append(frame)
+    cap.release()
+    return frames
+
+def export_onnx(weights, output, imgsz, precision, calib_source, calib_frames):
+    from ultralytics import YOLO
+
+    print(f"Exporting {weights} to ONNX (imgsz={imgsz})...")
+    exported = YOLO(weights).export(format="onnx", imgsz=imgsz, simplify=True, dynamic=False)
+    fp32_path = output if precision == "fp32" else output.replace(".onnx", ".fp32.onnx")
+    shutil.move(exported, fp32_path)
+
+    if precision == "fp16":
+        import onnx
+        from onnxconverter_common import float16
+        model = float16.convert_float_to_float16(onnx.load(fp32_path), keep_io_types=False)
+        onnx.save(model, output)
+    elif precision == "int8":
+        quantize_onnx_int8(fp32_path, output, imgsz, calib_source, calib_frames)
+    print(f"Saved {precision.upper()} model to {output}")
+
+def quantize_onnx_int8(fp32_path, output, imgsz, calib_source, calib_frames):
+    """Static INT8 (QDQ) quantization calibrated on real camera frames."""
+    from onnxruntime.quantization import (
+        CalibrationDataReader, QuantFormat, QuantType, quantize_static, CalibrationMethod
+    )
+    import onnxruntime as ort
+
+    input_name = ort.InferenceSession(fp32_path, providers=["CPUExecutionProvider"]).get_inputs()[0].name
+    frames = sample_frames(calib_source, calib_frames)
+    if not frames:
+        raise RuntimeError(f"No calibration frames could be read from {calib_source}")
+    print(f"Calibrating INT8 on {len(frames)} frames from {calib_source}...")
+
+    class FrameReader(CalibrationDataReader):
+        def __init__(self):
+            self._iter = iter(frames)
+
+        def get_next(self):
+            frame = next(self._iter, None)
+            if frame is None:
+                return None
+            # Same preprocessing as OnnxDetector at inference time
+            blob, _, _ = preprocess(frame, imgsz)
+            return {input_name: blob}
+
+    quantize_static(
+        fp32_path, output, FrameReader(),
+        quant_format=QuantFormat.QDQ,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8,
+        per_channel=True,
+        calibrate_method=CalibrationMethod.MinMax,
+        extra_options={"ActivationSymmetric": False, "WeightSymmetric": True},
+    )
+
+def export_openvino(weights, output, imgsz, precision, data_yaml):
+    from ultralytics import YOLO
+
+    kwargs = {"format": "openvino", "imgsz": imgsz, "dynamic": False}
+    if precision == "fp16":
+        kwargs["half"] = True
+    elif precision == "int8":
+        if not data_yaml:
+            raise SystemExit("OpenVINO INT8 calibration needs --data (an ultralytics dataset yaml)")
+        kwargs["int8"] = True
+        kwargs["data"] = data_yaml
+
+    print(f"Exporting {weights} to OpenVINO {precision.upper()} (imgsz={imgsz})...")
+    exported_dir = YOLO(weights).export(**kwargs)
+    target_dir = os.path.dirname(output)
+    if os.path.abspath(exported_dir) != os.path.abspath(target_dir):
+        if os.path.exists(target_dir):
+            shutil.rmtree(target_dir)
+        shutil.move(exported_dir, target_dir)
+    print(f"Saved OpenVINO IR to {target_dir}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the YOLO .pt weights to a CPU-optimized detector backend.")
+    parser.add_argument("--format", choices=["onnx", "openvino"], default="onnx")
+    parser.add_argument("--precision", choices=["fp32", "fp16", "int8"], default="fp32")
+    parser.add_argument("--weights", default=YOLO_MODEL_PATH)
+    parser.add_argument("--output", help="Output model path (defaults to the path the backend loads)")
+    parser.add_argument("--imgsz", type=int, default=1280)
+    parser.add_argument("--calib-source", default=DEFAULT_CALIBRATION_SOURCE,
+                        help="Video file or image directory for INT8 calibration (ONNX)")
+    parser.add_argument("--calib-frames", type=int, default=64)
+    parser.add_argument("--data", help="Dataset yaml for OpenVINO INT8 calibration")
+    args = parser.parse_args()
+
+    if args.format == "onnx":
+        export_onnx(args.weights, args.output or ONNX_MODEL_PATH, args.imgsz, args.precision,
+                    args.calib_source, args.calib_frames)
+    else:
+        export_openvino(args.weights, args.output or OPENVINO_MODEL_PATH, args.imgsz, args.precision, args.data)
+
+if __name__ == "__main__":
+    main()
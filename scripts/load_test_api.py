@@ -0,0 +1,412 @@
+import argparse
+import csv
+import datetime
+import heapq
+import http.client
+import json
+import os
+import random
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+
+import numpy as np
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# HTTP load generator replaying the browser polling mix.
+#
+# Each virtual client is one open page:
+#   index.html      /api/stats every 1 s, /api/history?period=1h every 30 s
+#   dashboard.html  /api/stats every 10 s, predict clicks, data-lake date lookups
+# Clicks arrive as a Poisson process. By default a throwaway data set is seeded
+# (config, traffic_stats.json, SQLite history, a week of compacted data-lake
+# aggregates) and `serve.py --no-ingest` is started on it via
+# SMARTTRAFFIC_DATA_DIR / SMARTTRAFFIC_DATA_LAKE; --url targets a running server.
+# For every client count the report shows p50/p95/p99 and throughput per endpoint;
+# --output saves it and --compare fails (exit 1) when p95 regresses.
+#
+#   python scripts/load_test_api.py --clients 10,50,100,200 --duration 30
+#   python scripts/load_test_api.py --output base.json
+#   python scripts/load_test_api.py --compare base.json --max-regression 1.3
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def percentile(values, q):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))]
+
+# ---------------------------------------------------------------------------
+# Synthetic data set
+# ---------------------------------------------------------------------------
+
+def diurnal(hours):
+    """Relative traffic by hour of day: night trough, morning and evening peaks."""
+    return (0.25 + np.exp(-((hours - 7.5) ** 2) / 4) + 0.8 * np.exp(-((hours - 17.5) ** 2) / 6)
+            + 0.4 * np.exp(-((hours - 12.5) ** 2) / 10))
+
+LAKE_DAYS = 7
+
+def seed_datalake(cam_id, name, ts, cars, motors, interval):
+    """Backfill-style aggregate CSVs for the last LAKE_DAYS days of one camera."""
+    from app.services.datalake import AGG_FILE_PREFIX, AGG_HEADER, partition_dir
+
+    recent = ts >= ts[-1] - LAKE_DAYS * 86400
+    starts = (ts[recent] // interval) * interval
+    keys, inverse = np.unique(starts, return_inverse=True)
+    car_sums = np.bincount(inverse, weights=cars[recent]).astype(int)
+    motor_sums = np.bincount(inverse, weights=motors[recent]).astype(int)
+    by_day = {}
+    for start, c, m in zip(keys, car_sums, motor_sums):
+        day = datetime.date.fromtimestamp(start)
+        by_day.setdefault(day, []).append([float(start), cam_id, name, interval, int(c), int(m), int(c + m)])
+    for day, records in by_day.items():
+        path = partition_dir(day)
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, f"{AGG_FILE_PREFIX}{cam_id}.csv"), "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(AGG_HEADER)
+            writer.writerows(records)
+
+def seed_data(data_dir, cameras, days, step, history_points, seed):
+    """Write cctv_config.json, traffic_stats.json, traffic_data.db and a data lake into data_dir."""
+    os.environ["SMARTTRAFFIC_DATA_DIR"] = data_dir
+    os.environ["SMARTTRAFFIC_DATA_LAKE"] = os.path.join(data_dir, "data_lake")
+    from app.database import init_db, insert_history_batch
+    from app.services.datalake import compact_closed_partitions
+
+    rng = np.random.default_rng(seed)
+    os.makedirs(data_dir, exist_ok=True)
+    now = time.time()
+    camera_ids = [f"load-{i:04d}" for i in range(cameras)]
+
+    config = [{"id": cam_id, "name": f"Load Camera {i}", "url": "", "active": True,
+               "lat": float(-6.95 + rng.normal(0, 0.05)), "lng": float(107.62 + rng.normal(0, 0.05)),
+               "mirror_id": None}
+              for i, cam_id in enumerate(camera_ids)]
+    with open(os.path.join(data_dir, "cctv_config.json"), "w") as f:
+        json.dump(config, f, indent=4)
+
+    init_db()
+    t0 = time.time()
+    ts = np.arange(now - days * 86400, now, step)
+    shape = diurnal((ts % 86400) / 3600)
+    sources = {}
+    rows = 0
+    for i, cam_id in enumerate(camera_ids):
+        scale = rng.uniform(0.5, 2.0) * step / 60
+        cars = rng.poisson(4 * scale * shape)
+        motors = rng.poisson(6 * scale * shape)
+        totals = cars + motors
+        insert_history_batch([(cam_id, float(t), int(n), int(c), int(m), int(n), int(c), int(m))
+                              for t, n, c, m in zip(ts, totals, cars, motors)])
+        rows += len(ts)
+        seed_datalake(cam_id, config[i]["name"], ts, cars, motors, 300)
+        tail = slice(max(0, len(ts) - history_points), len(ts))
+        sources[cam_id] = {
+            "name": config[i]["name"],
+            "current_count": int(totals[-1]),
+            "current_class_counts": {"0": int(cars[-1]), "1": int(motors[-1])},
+            "accumulated_count": int(totals.sum()),
+            "accumulated_class_counts": {"0": int(cars.sum()), "1": int(motors.sum())},
+            # traffic_stats.json keeps a rolling in-memory history per camera
+            "history": [{"ts": float(t), "count": int(n), "cars": int(c), "motors": int(m),
+                         "new_count": int(n), "new_cars": int(c), "new_motors": int(m)}
+                        for t, n, c, m in zip(ts[tail], totals[tail], cars[tail], motors[tail])],
+            "status": "online",
+            "last_update": now,
+        }
+    stats = {
+        "sources": sources,
+        "global_total": {
+            "accumulated_count": sum(s["accumulated_count"] for s in sources.values()),
+            "cars": sum(s["accumulated_class_counts"]["0"] for s in sources.values()),
+            "motorcycles": sum(s["accumulated_class_counts"]["1"] for s in sources.values()),
+            "current_count": sum(s["current_count"] for s in sources.values()),
+            "current_cars": sum(s["current_class_counts"]["0"] for s in sources.values()),
+            "current_motorcycles": sum(s["current_class_counts"]["1"] for s in sources.values()),
+        },
+        "last_update": now,
+    }
+    with open(os.path.join(data_dir, "traffic_stats.json"), "w") as f:
+        json.dump(stats, f)
+    # Closed days as the nightly compaction leaves them; today stays loose
+    for _ in compact_closed_partitions():
+        pass
+    print(f"[INFO] Seeded {cameras} cameras, {rows} history rows in {time.time() - t0:.1f}s ({data_dir})")
+    return camera_ids
+
+def seeded_camera_ids(data_dir):
+    with open(os.path.join(data_dir, "cctv_config.json")) as f:
+        return [cam["id"] for cam in json.load(f)]
+
+# ---------------------------------------------------------------------------
+# Virtual clients
+# ---------------------------------------------------------------------------
+
+class Page:
+    """Request schedule of one open browser page; requests are (endpoint, method, path, body)."""
+
+    def __init__(self, kind, camera_ids, args, rng):
+        self.kind = kind
+        self.camera_ids = camera_ids
+        self.args = args
+        self.rng = rng
+
+    def schedule(self):
+        """[(period or None, mean gap for Poisson clicks, request factory)]."""
+        if self.kind == "index":
+            return [(1.0, None, self.stats), (30.0, None, self.history)]
+        return [(10.0, None, self.stats),
+                (None, self.args.predict_every, self.predict),
+                (None, self.args.datalake_every, self.datalake)]
+
+    def page_load(self):
+        loads = [("/api/sources", "GET", "/api/sources", None), self.stats()]
+        if self.kind == "index":
+            loads.append(self.history())
+        return loads
+
+    def stats(self):
+        return ("/api/stats", "GET", "/api/stats", None)
+
+    def history(self):
+        # Index chart defaults to 1h; half the pages have a camera selected
+        path = "/api/history?period=1h"
+        if self.rng.random() < 0.5:
+            path += "&camera_id=" + urllib.parse.quote(self.rng.choice(self.camera_ids))
+        return ("/api/history", "GET", path, None)
+
+    def predict(self):
+        # datetime-local input, "T" replaced by a space (dashboard.html)
+        target = datetime.datetime.now() + datetime.timedelta(hours=self.rng.randint(1, 24))
+        body = json.dumps({"target_time": target.strftime("%Y-%m-%d %H:00"), "force_scenario": None})
+        return ("/api/predict_traffic", "POST", "/api/predict_traffic", body)
+
+    def datalake(self):
+        day = datetime.date.today() - datetime.timedelta(days=self.rng.randint(0, 6))
+        return ("/api/datalake/stats", "GET", f"/api/datalake/stats?date={day.isoformat()}", None)
+
+class Client(threading.Thread):
+    """One page on one keep-alive connection; requests fire at their due time (or as soon as free)."""
+
+    def __init__(self, host, port, page, record_from, stop_at, results):
+        super().__init__(daemon=True)
+        self.host = host
+        self.port = port
+        self.page = page
+        self.record_from = record_from
+        self.stop_at = stop_at
+        self.results = results
+        self.conn = None
+
+    def request(self, endpoint, method, path, body):
+        started = time.time()
+        t0 = time.perf_counter()
+        ok = False
+        try:
+            if self.conn is None:
+                self.conn = http.client.HTTPConnection(self.host, self.port, timeout=60)
+            headers = {"Accept-Encoding": "gzip"}
+            if body is not None:
+                headers["Content-Type"] = "application/json"
+            self.conn.request(method, path, body=body, headers=headers)
+            resp = self.conn.getresponse()
+            resp.read()
+            ok = resp.status == 200
+        except (OSError, http.client.HTTPException):
+            if self.conn is not None:
+                self.conn.close()
+            self.conn = None
+        if started >= self.record_from:
+            self.results.append((endpoint, (time.perf_counter() - t0) * 1000, ok))
+
+    def run(self):
+        rng = self.page.rng
+        now = time.time()
+        queue = []
+        for i, (period, mean_gap, factory) in enumerate(self.page.schedule()):
+            first = now + (rng.uniform(0, period) if period else rng.expovariate(1 / mean_gap))
+            heapq.heappush(queue, (first, i, period, mean_gap, factory))
+        for request in self.page.page_load():
+            self.request(*request)
+        while True:
+            due, i, period, mean_gap, factory = heapq.heappop(queue)
+            if due >= self.stop_at:
+                break
+            delay = due - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            self.request(*factory())
+            next_due = due + (period if period else rng.expovariate(1 / mean_gap))
+            heapq.heappush(queue, (next_due, i, period, mean_gap, factory))
+        if self.conn is not None:
+            self.conn.close()
+
+def run_step(host, port, clients, camera_ids, args, seed):
+    """{endpoint: {requests, errors, rps, p50, p95, p99}} for `clients` concurrent pages."""
+    results = []
+    start = time.time()
+    record_from = start + args.warmup
+    stop_at = record_from + args.duration
+    threads = []
+    for i in range(clients):
+        rng = random.Random(seed * 100003 + i)
+        kind = "dashboard" if rng.random() < args.dashboard_share else "index"
+        # Pages are opened over the first second, not all at once
+        time.sleep(1.0 / max(clients, 1))
+        client = Client(host, port, Page(kind, camera_ids, args, rng), record_from, stop_at, results)
+        client.start()
+        threads.append(client)
+    for t in threads:
+        t.join(stop_at - time.time() + 60)
+
+    summary = {}
+    for endpoint in sorted({r[0] for r in results}) + ["total"]:
+        latencies = [ms for ep, ms, ok in results if ok and endpoint in (ep, "total")]
+        errors = sum(1 for ep, _, ok in results if not ok and endpoint in (ep, "total"))
+        summary[endpoint] = {
+            "requests": len(latencies) + errors, "errors": errors,
+            "rps": (len(latencies) + errors) / args.duration,
+            "p50": percentile(latencies, 50), "p95": percentile(latencies, 95), "p99": percentile(latencies, 99),
+        }
+    return summary
+
+def report(clients, summary):
+    print(f"\n{clients} clients")
+    print(f"{'endpoint':<22} {'requests':>8} {'errors':>6} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for endpoint, row in summary.items():
+        print(f"{endpoint:<22} {row['requests']:>8} {row['errors']:>6} {row['rps']:>8.1f} "
+              f"{row['p50']:>8.1f} {row['p95']:>8.1f} {row['p99']:>8.1f}")
+
+def compare(results, baseline, max_ratio):
+    """Print p95 ratios against a saved run; True when every endpoint is within max_ratio."""
+    print(f"\np95 vs baseline (limit {max_ratio:.2f}x)")
+    passed = True
+    for clients, summary in results.items():
+        for endpoint, row in summary.items():
+            base = baseline.get(clients, {}).get(endpoint)
+            if not base or not base["p95"] or base["p95"] != base["p95"]:
+                continue
+            ratio = row["p95"] / base["p95"]
+            failed = ratio > max_ratio or row["errors"] > base["errors"]
+            passed = passed and not failed
+            print(f"{clients:>5} {endpoint:<22} {base['p95']:>8.1f} -> {row['p95']:>8.1f} ms "
+                  f"({ratio:.2f}x){'  REGRESSION' if failed else ''}")
+    return passed
+
+# ---------------------------------------------------------------------------
+# Server
+# ---------------------------------------------------------------------------
+
+def start_server(data_dir, port, server, log_path):
+    env = dict(os.environ, SMARTTRAFFIC_DATA_DIR=data_dir,
+               SMARTTRAFFIC_DATA_LAKE=os.path.join(data_dir, "data_lake"))
+    log = open(log_path, "w")
+    proc = subprocess.Popen([sys.executable, os.path.join(BASE_DIR, "serve.py"), "--no-ingest",
+                             "--host", "127.0.0.1", "--port", str(port), "--server", server],
+                            cwd=BASE_DIR, env=env, stdout=log, stderr=subprocess.STDOUT)
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            break
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=2)
+            conn.request("GET", "/api/sources")
+            conn.getresponse().read()
+            conn.close()
+            return proc
+        except OSError:
+            time.sleep(0.2)
+    proc.kill()
+    with open(log_path) as f:
+        print(f.read()[-2000:])
+    raise RuntimeError("serve.py did not start; see the log above")
+
+def stop_server(proc):
+    proc.send_signal(signal.SIGTERM)
+    try:
+        proc.wait(30)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay the dashboard polling mix and report latency per endpoint.")
+    parser.add_argument("--clients", default="10,25,50,100", help="Comma-separated client counts, run in order")
+    parser.add_argument("--duration", type=float, default=30, help="Measured seconds per client count")
+    parser.add_argument("--warmup", type=float, default=5, help="Unmeasured seconds before each step")
+    parser.add_argument("--dashboard-share", type=float, default=0.3, help="Fraction of clients on dashboard.html")
+    parser.add_argument("--predict-every", type=float, default=60, help="Mean seconds between predict clicks")
+    parser.add_argument("--datalake-every", type=float, default=120, help="Mean seconds between data-lake lookups")
+    parser.add_argument("--url", help="Target a running server (no seeding, no serve.py)")
+    parser.add_argument("--data-dir", help="Seed here and keep it (reused if already seeded)")
+    parser.add_argument("--cameras", type=int, default=36)
+    parser.add_argument("--days", type=int, default=30, help="Days of seeded history")
+    parser.add_argument("--step", type=int, default=120, help="Seconds between seeded history rows")
+    parser.add_argument("--history-points", type=int, default=750, help="Rolling history entries per camera in traffic_stats.json")
+    parser.add_argument("--server", choices=["auto", "gevent", "threaded"], default="auto")
+    parser.add_argument("--port", type=int, default=5077)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Save results as JSON")
+    parser.add_argument("--compare", help="Baseline JSON from --output")
+    parser.add_argument("--max-regression", type=float, default=1.25, help="Allowed p95 ratio against --compare")
+    args = parser.parse_args()
+    client_counts = [int(c) for c in args.clients.split(",")]
+
+    proc = None
+    temp_dir = None
+    try:
+        if args.url:
+            parsed = urllib.parse.urlsplit(args.url)
+            host, port = parsed.hostname, parsed.port or 80
+            conn = http.client.HTTPConnection(host, port, timeout=10)
+            conn.request("GET", "/api/sources")
+            camera_ids = [src["id"] for src in json.loads(conn.getresponse().read())]
+            conn.close()
+        else:
+            data_dir = args.data_dir
+            if data_dir is None:
+                data_dir = temp_dir = tempfile.mkdtemp(prefix="smarttraffic-load-")
+            if os.path.exists(os.path.join(data_dir, "traffic_data.db")):
+                camera_ids = seeded_camera_ids(data_dir)
+                print(f"[INFO] Reusing seeded data in {data_dir}")
+            else:
+                camera_ids = seed_data(data_dir, args.cameras, args.days, args.step, args.history_points, args.seed)
+            host, port = "127.0.0.1", args.port
+            proc = start_server(data_dir, port, args.server, os.path.join(data_dir, "server.log"))
+        if not camera_ids:
+            print("[ERROR] No cameras configured on the target")
+            return 1
+
+        results = {}
+        for step, clients in enumerate(client_counts):
+            summary = run_step(host, port, clients, camera_ids, args, args.seed + step)
+            report(clients, summary)
+            results[str(clients)] = summary
+    finally:
+        if proc is not None:
+            stop_server(proc)
+        if temp_dir is not None:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\n[INFO] Results saved to {args.output}")
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if not compare(results, baseline, args.max_regression):
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
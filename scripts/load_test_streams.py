@@ -0,0 +1,201 @@
+import argparse
+import http.client
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.live_state import LiveStateWriter, FrameSlotWriter
+from app.utils import load_config
+
+# API latency with and without concurrent /video_feed viewers.
+#
+# Starts `serve.py --no-ingest` and plays the ingest process itself: synthetic
+# counters for every configured camera and a synthetic JPEG for whichever camera
+# the viewers asked for. API clients poll /api/stats, /api/sources and
+# /api/history while N MJPEG viewers stay connected; p50/p95/p99 should not move.
+# Do not run next to a live ingest process: both would write data/live/.
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+API_PATHS = ["/api/stats", "/api/sources", "/api/history"]
+
+def percentile(values, q):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))]
+
+class FakeIngest(threading.Thread):
+    """Publishes counters for every camera and frames for the requested view."""
+
+    def __init__(self, camera_ids, fps, frame_bytes):
+        super().__init__(daemon=True)
+        self.camera_ids = camera_ids
+        self.interval = 1.0 / fps
+        self.frame = b"\xff\xd8" + os.urandom(frame_bytes) + b"\xff\xd9"
+        self.running = True
+        self.states = LiveStateWriter()
+        self.frames = FrameSlotWriter()
+
+    def run(self):
+        total = 0
+        while self.running:
+            total += 1
+            for cam_id in self.camera_ids:
+                self.states.publish_raw(self.states.slot_for(cam_id), cam_id, "online", time.time(),
+                                        (total % 40, total % 20, total % 20, total, total // 2, total // 2))
+            view = self.states.requested_view()
+            if view:
+                self.frames.publish(self.frame, view)
+            time.sleep(self.interval)
+
+class Viewer(threading.Thread):
+    def __init__(self, port, camera_id):
+        super().__init__(daemon=True)
+        self.port = port
+        self.camera_id = camera_id
+        self.frames = 0
+        self.error = None
+        self.running = True
+
+    def run(self):
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", self.port, timeout=30)
+            conn.request("GET", f"/video_feed/{self.camera_id}")
+            resp = conn.getresponse()
+            while self.running:
+                chunk = resp.read1(65536)
+                if not chunk:
+                    break
+                self.frames += chunk.count(b"--frame")
+            conn.close()
+        except Exception as e:
+            if self.running:
+                self.error = e
+
+def api_clients(port, clients, duration):
+    """{path: [latency ms]} from `clients` threads looping over API_PATHS for `duration` seconds."""
+    latencies = {path: [] for path in API_PATHS}
+    errors = []
+    deadline = time.time() + duration
+
+    def client():
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+        while time.time() < deadline:
+            for path in API_PATHS:
+                t0 = time.perf_counter()
+                try:
+                    conn.request("GET", path)
+                    resp = conn.getresponse()
+                    resp.read()
+                    if resp.status != 200:
+                        errors.append(f"{path}: HTTP {resp.status}")
+                except Exception as e:
+                    errors.append(f"{path}: {e}")
+                    conn.close()
+                    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+                    continue
+                latencies[path].append((time.perf_counter() - t0) * 1000)
+            # Dashboard-like pacing rather than a tight loop
+            time.sleep(0.1)
+        conn.close()
+
+    threads = [threading.Thread(target=client, daemon=True) for _ in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return latencies, errors
+
+def report(title, latencies):
+    print(f"\n{title}")
+    print(f"{'endpoint':<14} {'requests':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for path, values in latencies.items():
+        print(f"{path:<14} {len(values):>8} {percentile(values, 50):>8.1f} "
+              f"{percentile(values, 95):>8.1f} {percentile(values, 99):>8.1f}")
+
+def wait_ready(port, proc, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"serve.py exited with code {proc.returncode}")
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=2)
+            conn.request("GET", "/api/sources")
+            conn.getresponse().read()
+            conn.close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError("serve.py did not start listening in time")
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure API latency while many clients watch /video_feed.")
+    parser.add_argument("--viewers", type=int, default=100)
+    parser.add_argument("--clients", type=int, default=4, help="Concurrent API clients")
+    parser.add_argument("--duration", type=float, default=15, help="Seconds per phase")
+    parser.add_argument("--port", type=int, default=5055)
+    parser.add_argument("--server", choices=["auto", "gevent", "threaded"], default="auto")
+    parser.add_argument("--fps", type=float, default=10, help="Synthetic frames published per second")
+    parser.add_argument("--frame-kb", type=int, default=60, help="Synthetic JPEG size")
+    args = parser.parse_args()
+
+    camera_ids = [src["id"] for src in load_config()]
+    if not camera_ids:
+        print("[ERROR] No cameras in the config")
+        return 1
+
+    ingest = FakeIngest(camera_ids, args.fps, args.frame_kb * 1024)
+    ingest.start()
+
+    proc = subprocess.Popen([sys.executable, os.path.join(BASE_DIR, "serve.py"), "--no-ingest",
+                             "--host", "127.0.0.1", "--port", str(args.port), "--server", args.server],
+                            cwd=BASE_DIR)
+    viewers = []
+    try:
+        wait_ready(args.port, proc)
+
+        baseline, errors = api_clients(args.port, args.clients, args.duration)
+        report(f"Baseline ({args.clients} API clients, no viewers)", baseline)
+
+        viewers = [Viewer(args.port, camera_ids[0]) for _ in range(args.viewers)]
+        for v in viewers:
+            v.start()
+        time.sleep(2)
+        loaded, load_errors = api_clients(args.port, args.clients, args.duration)
+        errors += load_errors
+        report(f"With {args.viewers} concurrent /video_feed viewers", loaded)
+
+        frames = [v.frames for v in viewers]
+        failed = [v for v in viewers if v.error is not None]
+        print(f"\nViewers: {len(viewers) - len(failed)} connected, frames per viewer "
+              f"min {min(frames)} / avg {sum(frames) / len(frames):.1f} / max {max(frames)}")
+        for v in failed[:5]:
+            print(f"[WARN] Viewer error: {v.error}")
+        for err in errors[:5]:
+            print(f"[WARN] API error: {err}")
+        for path in API_PATHS:
+            base, under = percentile(baseline[path], 95), percentile(loaded[path], 95)
+            print(f"{path:<14} p95 {base:.1f} ms -> {under:.1f} ms ({under / base if base else float('nan'):.2f}x)")
+    finally:
+        # Graceful shutdown with the viewers still connected
+        t0 = time.time()
+        proc.send_signal(signal.SIGTERM)
+        try:
+            code = proc.wait(30)
+            print(f"\nShutdown with open streams: exit code {code} after {time.time() - t0:.2f}s")
+        except subprocess.TimeoutExpired:
+            print("\n[ERROR] serve.py did not exit within 30s of SIGTERM")
+            proc.kill()
+        for v in viewers:
+            v.running = False
+        ingest.running = False
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,93 @@
+import argparse
+import datetime
+import json
+import os
+import sys
+import tempfile
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Replay recorded data-lake detections through the counting, stats and storage
+# path under a simulated clock, e.g. a day at 600x (about 2.5 minutes):
+#   python scripts/replay.py --date 2026-10-18 --speed 600
+# Results go to a scratch data directory (stats JSON, history DB, thresholds,
+# nowcasts), never to the live one unless --data-dir points there. Same lake +
+# same --seed = same counts, so two summaries can be diffed for regressions.
+
+def parse_time(value):
+    return datetime.datetime.fromisoformat(value).timestamp()
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded detections at N x real time.")
+    parser.add_argument("--date", help="Replay this whole day (YYYY-MM-DD, default: yesterday)")
+    parser.add_argument("--start", help="Start time (ISO, e.g. 2026-10-18T06:00); overrides --date")
+    parser.add_argument("--end", help="End time (ISO, exclusive; default: start + 1 day)")
+    parser.add_argument("--camera-id", action="append", help="Replay only this camera (repeatable)")
+    parser.add_argument("--speed", type=float, help="Simulated seconds per real second, 0 = unpaced (default: REPLAY_SPEED)")
+    parser.add_argument("--seed", type=int, help="Traffic multiplier seed (default: REPLAY_SEED)")
+    parser.add_argument("--root", help="Data lake to replay (default: DATA_LAKE_PATH)")
+    parser.add_argument("--data-dir", help="Where replay results are written (default: a new temp dir)")
+    parser.add_argument("--lake-out", help="Also log replayed detections to this lake root")
+    parser.add_argument("--output", help="Write the JSON summary here")
+    args = parser.parse_args()
+
+    # Must be set before the app modules read their config
+    data_dir = args.data_dir or tempfile.mkdtemp(prefix="smarttraffic-replay-")
+    os.makedirs(data_dir, exist_ok=True)
+    os.environ["SMARTTRAFFIC_DATA_DIR"] = data_dir
+
+    from app.config import DATA_LAKE_PATH, REPLAY_SPEED, REPLAY_SEED
+    import app.globals as g
+    from app.database import init_db
+    from app.services.thresholds import ThresholdStore
+    from app.services.nowcast import NowcastStore
+    from app.services.replay import run_replay
+
+    try:
+        if args.start:
+            start_ts = parse_time(args.start)
+        else:
+            day = datetime.date.fromisoformat(args.date) if args.date else datetime.date.today() - datetime.timedelta(days=1)
+            start_ts = datetime.datetime.combine(day, datetime.time.min).timestamp()
+        end_ts = parse_time(args.end) if args.end else start_ts + 86400
+    except ValueError as e:
+        print(f"[ERROR] {e}")
+        return 1
+    if end_ts <= start_ts:
+        print("[ERROR] --end must be after the start")
+        return 1
+
+    speed = REPLAY_SPEED if args.speed is None else args.speed
+    seed = REPLAY_SEED if args.seed is None else args.seed
+    root = args.root or DATA_LAKE_PATH
+
+    init_db()
+    g.global_stats = {}
+    g.threshold_store = ThresholdStore().load()
+    g.nowcast_store = NowcastStore().load()
+
+    print(f"[INFO] Replaying {datetime.datetime.fromtimestamp(start_ts)} - {datetime.datetime.fromtimestamp(end_ts)} "
+          f"from {root} at {'max' if speed <= 0 else f'{speed:g}x'} speed into {data_dir}")
+
+    def progress(sim_ts, frames):
+        print(f"[INFO] {datetime.datetime.fromtimestamp(sim_ts):%Y-%m-%d %H:%M}  {frames} frames")
+
+    summary = run_replay(start_ts, end_ts, args.camera_id, speed, seed, root, args.lake_out, progress)
+    summary["data_dir"] = data_dir
+    if not summary["by_camera"]:
+        print("[WARN] No recorded detections in that range")
+
+    for camera_id, camera in summary["by_camera"].items():
+        print(f"[INFO] {camera['name']} ({camera_id}): {camera['vehicles']} vehicles {camera['class_counts']}")
+    print(f"[INFO] {summary['frames']} frames, {summary['detections']} detections, {summary['vehicles']} vehicles "
+          f"in {summary['wall_seconds']:.1f}s ({summary['speedup']}x real time)")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(summary, f, indent=2)
+        print(f"[INFO] Summary written to {args.output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
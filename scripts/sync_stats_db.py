@@ -1,105 +1,164 @@
-import sqlite3
+import argparse
 import json
 import os
+import shutil
 import sys
+import time
 
 # Add project root to path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from app.config import DATA_DIR
+from app.config import STATS_FILE, STATS_SYNC_STATE_FILE
+from app.database import DB_PATH, get_camera_totals_since, get_max_rowid
+from app.utils import load_config, write_stats_file, acquire_ingest_lock
 
-DB_PATH = os.path.join(DATA_DIR, "traffic_data.db")
-STATS_PATH = os.path.join(DATA_DIR, "traffic_stats.json")
-CONFIG_PATH = os.path.join(DATA_DIR, "cctv_config.json")
+# Incremental DB -> traffic_stats.json reconciliation.
+#
+# Each camera entry in traffic_stats.json carries "db_rowid", the highest
+# traffic_history rowid already included in its counters: camera agents
+# advance it as they insert rows (and save it with the counters), this script
+# advances it as it adds rows. Rows of a camera above both its db_rowid and the
+# global watermark in STATS_SYNC_STATE_FILE come from other writers or from an
+# ingest run that died before saving, and are added to the accumulated
+# counters. The first run only records the global watermark; --full instead
+# rebuilds the counters from the whole table. A run with no new rows touches
+# neither file, and the stats document is patched as loaded (histories are
+# written back unchanged, not re-derived).
+#
+# The ingest process keeps the counters in memory and rewrites the file every
+# minute, so the script refuses to run while it holds the ingest lock.
 
-def sync_db_to_json():
-    print("Starting sync from DB to JSON...")
-    
+def load_state():
+    if os.path.exists(STATS_SYNC_STATE_FILE):
+        try:
+            with open(STATS_SYNC_STATE_FILE, 'r') as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"[WARN] Failed to read sync state: {e}")
+    return None
+
+def save_state(state):
+    temp_file = STATS_SYNC_STATE_FILE + ".tmp"
+    with open(temp_file, 'w') as f:
+        json.dump(state, f)
+    shutil.move(temp_file, STATS_SYNC_STATE_FILE)
+
+def load_stats_document():
+    if os.path.exists(STATS_FILE):
+        with open(STATS_FILE, 'r') as f:
+            return json.load(f)
+    return {"sources": {}, "global_total": {}}
+
+def new_source_entry(name):
+    return {
+        "name": name,
+        "current_count": 0,
+        "current_class_counts": {"0": 0, "1": 0},
+        "accumulated_count": 0,
+        "accumulated_class_counts": {"0": 0, "1": 0},
+        "history": []
+    }
+
+def apply_totals(stats, totals, replace=False):
+    """
+    Add (or with replace=True, set) per-camera totals onto the stats document's
+    counters and advance each camera's db_rowid.
+    """
+    sources = stats.setdefault("sources", {})
+    names = {cam["id"]: cam["name"] for cam in load_config()}
+    for cam_id, d in totals.items():
+        src = sources.get(cam_id)
+        if src is None:
+            src = sources[cam_id] = new_source_entry(names.get(cam_id, "Unknown Camera"))
+        counts = src.setdefault("accumulated_class_counts", {"0": 0, "1": 0})
+        if replace:
+            src["accumulated_count"], counts["0"], counts["1"] = d["total"], d["cars"], d["motors"]
+        else:
+            src["accumulated_count"] = src.get("accumulated_count", 0) + d["total"]
+            counts["0"] = counts.get("0", 0) + d["cars"]
+            counts["1"] = counts.get("1", 0) + d["motors"]
+        src["db_rowid"] = max(src.get("db_rowid") or 0, d["last_rowid"])
+
+    # Same global_total fields as save_stats
+    global_total = stats.get("global_total")
+    if not isinstance(global_total, dict):
+        global_total = stats["global_total"] = {}
+    global_total["accumulated_count"] = sum(s.get("accumulated_count", 0) for s in sources.values())
+    global_total["cars"] = sum(s.get("accumulated_class_counts", {}).get("0", 0) for s in sources.values())
+    global_total["motorcycles"] = sum(s.get("accumulated_class_counts", {}).get("1", 0) for s in sources.values())
+    stats["last_update"] = time.time()
+
+def camera_rowids(stats, max_rowid):
+    """{camera_id: db_rowid} from the stats document (marks past max_rowid belong to a replaced DB)."""
+    return {
+        cam_id: src["db_rowid"] for cam_id, src in stats.get("sources", {}).items()
+        if isinstance(src, dict) and src.get("db_rowid") and src["db_rowid"] <= max_rowid
+    }
+
+def sync_db_to_json(full=False):
     if not os.path.exists(DB_PATH):
         print("Database not found!")
+        return 1
+
+    # Hold the ingest lock for the whole run so an ingest start waits for it
+    lock = acquire_ingest_lock(blocking=False)
+    if lock is None:
+        print("[ERROR] The ingest process is running (it owns traffic_stats.json and counts its own rows). "
+              "Stop it first; rows it did not count are picked up on the next run.")
+        return 1
+    try:
+        sync_locked(full)
+    finally:
+        lock.close()
+    return 0
+
+def sync_locked(full):
+    started = time.time()
+    max_rowid = get_max_rowid()
+    state = load_state()
+
+    if full:
+        totals = get_camera_totals_since(0, max_rowid=max_rowid)
+        stats = load_stats_document()
+        apply_totals(stats, totals, replace=True)
+        write_stats_file(stats, indent=None)
+        save_state({"last_rowid": max_rowid})
+        print(f"Rebuilt {len(totals)} cameras from the whole table in {time.time() - started:.2f}s "
+              f"(watermark rowid {max_rowid}).")
+        return
+
+    if state is None:
+        # Rows up to now are assumed to be in the counters already
+        save_state({"last_rowid": max_rowid})
+        print(f"No sync state yet; watermark set to rowid {max_rowid}. Use --full to rebuild from the DB.")
+        return
+
+    # A smaller max rowid means the table was cleared or the DB replaced
+    if max_rowid < state["last_rowid"]:
+        print("[WARN] Database rowids went backwards (cleared or replaced); watermark reset. "
+              "Use --full to rebuild counters from the DB.")
+        save_state({"last_rowid": max_rowid})
+        return
+
+    stats = load_stats_document()
+    delta = get_camera_totals_since(state["last_rowid"], camera_rowids(stats, max_rowid), max_rowid)
+    if delta:
+        apply_totals(stats, delta)
+        write_stats_file(stats, indent=None)
+    if max_rowid != state["last_rowid"]:
+        save_state({"last_rowid": max_rowid})
+    if not delta:
+        print(f"Stats already in sync (watermark rowid {max_rowid}).")
         return
-        
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    
-    # Load current stats
-    if os.path.exists(STATS_PATH):
-        with open(STATS_PATH, 'r') as f:
-            stats = json.load(f)
-    else:
-        stats = {"sources": {}, "global_total": 0}
-        
-    # Load config to ensure we have all cameras
-    if os.path.exists(CONFIG_PATH):
-        with open(CONFIG_PATH, 'r') as f:
-            config = json.load(f)
-    else:
-        config = []
-        
-    # Get totals from DB
-    print("Querying database totals...")
-    c.execute("""
-        SELECT 
-            camera_id, 
-            SUM(new_count) as total, 
-            SUM(new_cars) as cars, 
-            SUM(new_motors) as motors 
-        FROM traffic_history 
-        GROUP BY camera_id
-    """)
-    rows = c.fetchall()
-    
-    db_totals = {}
-    grand_total = 0
-    
-    for row in rows:
-        cam_id, total, cars, motors = row
-        db_totals[cam_id] = {
-            "total": total or 0,
-            "cars": cars or 0,
-            "motors": motors or 0
-        }
-        grand_total += (total or 0)
-        
-    print(f"Found {len(db_totals)} cameras in DB with total {grand_total} vehicles.")
-    
-    # Update stats
-    if "sources" not in stats:
-        stats["sources"] = {}
-        
-    for cam_id, db_data in db_totals.items():
-        if cam_id not in stats["sources"]:
-            # Find name from config
-            name = "Unknown Camera"
-            for cam in config:
-                if cam["id"] == cam_id:
-                    name = cam["name"]
-                    break
-            
-            stats["sources"][cam_id] = {
-                "name": name,
-                "current_count": 0,
-                "current_class_counts": {"0": 0, "1": 0},
-                "accumulated_count": 0,
-                "accumulated_class_counts": {"0": 0, "1": 0},
-                "history": []
-            }
-            
-        # Update accumulated counts
-        # We replace the accumulated count with the DB total because DB is the source of truth
-        stats["sources"][cam_id]["accumulated_count"] = db_data["total"]
-        stats["sources"][cam_id]["accumulated_class_counts"]["0"] = db_data["cars"]
-        stats["sources"][cam_id]["accumulated_class_counts"]["1"] = db_data["motors"]
-        
-    # Update global total
-    stats["global_total"] = grand_total
-    
-    # Save back to JSON
-    with open(STATS_PATH, 'w') as f:
-        json.dump(stats, f, indent=4)
-        
-    print(f"Successfully synced stats. New Global Total: {grand_total}")
-    conn.close()
+
+    new_vehicles = sum(d["total"] for d in delta.values())
+    print(f"Synced {len(delta)} cameras (+{new_vehicles} vehicles, watermark rowid {max_rowid}) "
+          f"in {time.time() - started:.2f}s.")
 
 if __name__ == "__main__":
-    sync_db_to_json()
+    parser = argparse.ArgumentParser(description="Add SQLite rows the counters in traffic_stats.json have not seen "
+                                                 "(run while the ingest process is stopped).")
+    parser.add_argument("--full", action="store_true",
+                        help="Rebuild the accumulated counters from the whole table (overwrites them)")
+    args = parser.parse_args()
+    sys.exit(sync_db_to_json(full=args.full))
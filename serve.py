@@ -0,0 +1,180 @@
+# Production entry point.
+#
+#   python serve.py                       # ingest child + web server on HOST_IP:HOST_PORT
+#   python serve.py --no-ingest           # web only (ingest managed elsewhere)
+#   python serve.py --server threaded     # without gevent
+#
+# The web server runs in the "web" role: camera agents live in a supervised
+# ingest child (run.py, SMARTTRAFFIC_ROLE=ingest) and live counters/frames come
+# through the shared files in data/live/. With gevent installed every request,
+# including each /video_feed stream, is a greenlet, so hundreds of open MJPEG
+# viewers cost almost nothing and never hold a worker the API needs.
+# Equivalent with gunicorn: gunicorn -k gevent --worker-connections 2000 wsgi:app
+#
+# Blocking sqlite calls still block the gevent hub while they run; the response
+# cache keeps them rare, and more processes (gunicorn -w N) add headroom.
+# The app is imported inside main(), after gevent's monkey patching.
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+try:
+    import gevent
+except ImportError:  # optional: falls back to a threaded server
+    gevent = None
+
+# Must be set before app.config is imported
+os.environ["SMARTTRAFFIC_ROLE"] = "web"
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def _live_state_inode():
+    from app.config import LIVE_STATE_FILE
+    try:
+        return os.stat(LIVE_STATE_FILE).st_ino
+    except FileNotFoundError:
+        return None
+
+class IngestSupervisor:
+    """Runs run.py in the ingest role and restarts it if it dies."""
+
+    def __init__(self):
+        self.proc = None
+        self.started = 0.0
+        self.stopping = False
+        self._thread = None
+
+    def spawn(self):
+        env = dict(os.environ, SMARTTRAFFIC_ROLE="ingest")
+        self.proc = subprocess.Popen([sys.executable, os.path.join(BASE_DIR, "run.py")], env=env, cwd=BASE_DIR)
+        self.started = time.time()
+        print(f"[INFO] Ingest process started (pid {self.proc.pid})")
+
+    def start(self, timeout):
+        """Spawn the ingest process and wait until it has (re)created the live state file."""
+        old_inode = _live_state_inode()
+        self.spawn()
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if self.proc.poll() is not None:
+                raise RuntimeError(f"Ingest process exited during startup (code {self.proc.returncode})")
+            inode = _live_state_inode()
+            if inode is not None and inode != old_inode:
+                break
+            time.sleep(0.2)
+        else:
+            print(f"[WARN] Ingest did not publish live state within {timeout}s; serving anyway")
+        self._thread = threading.Thread(target=self._watch, name="ingest-supervisor", daemon=True)
+        self._thread.start()
+
+    def _watch(self):
+        backoff = 1
+        while not self.stopping:
+            time.sleep(1)
+            code = self.proc.poll()
+            if code is None or self.stopping:
+                continue
+            # Reset the backoff once a restart has stayed up for a while
+            if time.time() - self.started > 60:
+                backoff = 1
+            print(f"[ERROR] Ingest process exited (code {code}); restarting in {backoff}s")
+            time.sleep(backoff)
+            backoff = min(backoff * 2, 60)
+            if not self.stopping:
+                self.spawn()
+
+    def stop(self, timeout):
+        self.stopping = True
+        if self.proc is None or self.proc.poll() is not None:
+            return
+        # run.py flushes stats and sketches on SIGTERM
+        self.proc.terminate()
+        try:
+            self.proc.wait(timeout)
+        except subprocess.TimeoutExpired:
+            print("[WARN] Ingest process did not stop in time; killing it")
+            self.proc.kill()
+            self.proc.wait()
+        print("[INFO] Ingest process stopped.")
+
+def make_server(app, host, port, kind, access_log=False):
+    """(serve_forever, stop) for the chosen server."""
+    from app.config import SERVE_MAX_CONNECTIONS, SERVE_SHUTDOWN_TIMEOUT
+    if kind == "gevent":
+        from gevent.pool import Pool
+        from gevent.pywsgi import WSGIServer
+        server = WSGIServer((host, port), app, spawn=Pool(SERVE_MAX_CONNECTIONS),
+                            log=sys.stderr if access_log else None)
+        return server.serve_forever, lambda: server.stop(timeout=SERVE_SHUTDOWN_TIMEOUT)
+
+    from werkzeug.serving import make_server as werkzeug_server
+    server = werkzeug_server(host, port, app, threaded=True)
+    # One thread per connection; daemon threads so open streams never block exit
+    server.daemon_threads = True
+    return server.serve_forever, server.shutdown
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the dashboard/API with the camera agents in a supervised child process.")
+    parser.add_argument("--host", default=None, help="Default: HOST_IP")
+    parser.add_argument("--port", type=int, default=None, help="Default: HOST_PORT")
+    parser.add_argument("--server", choices=["auto", "gevent", "threaded"], default="auto")
+    parser.add_argument("--no-ingest", action="store_true", help="Do not start the ingest process")
+    parser.add_argument("--access-log", action="store_true", help="Log every request (gevent server)")
+    args = parser.parse_args()
+
+    kind = args.server
+    if kind == "auto":
+        kind = "gevent" if gevent is not None else "threaded"
+    if kind == "gevent":
+        if gevent is None:
+            parser.error("gevent is not installed (pip install gevent)")
+        from gevent import monkey
+        monkey.patch_all()
+
+    from app import create_app
+    from app.config import HOST_IP, HOST_PORT, SERVE_SHUTDOWN_TIMEOUT, SERVE_STARTUP_TIMEOUT
+    from app.services.broadcast import broadcaster
+    from app.services.lake_analytics import analytics as lake_analytics
+    host = args.host or HOST_IP
+    port = args.port or HOST_PORT
+
+    supervisor = None
+    if not args.no_ingest:
+        supervisor = IngestSupervisor()
+        supervisor.start(SERVE_STARTUP_TIMEOUT)
+
+    app = create_app()
+    serve_forever, stop_server = make_server(app, host, port, kind, args.access_log)
+
+    def shutdown(signum):
+        print(f"[INFO] Signal {signum} received, shutting down...")
+        # End open video streams first so the server can drain
+        broadcaster.stop()
+        # Never block inside the signal handler (stop() waits for the serve loop)
+        if kind == "gevent":
+            gevent.spawn(stop_server)
+        else:
+            threading.Thread(target=stop_server, daemon=True).start()
+
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        if kind == "gevent":
+            # Runs in the event loop, where plain signal handlers cannot switch greenlets
+            gevent.signal_handler(signum, shutdown, signum)
+        else:
+            signal.signal(signum, lambda signum, frame: shutdown(signum))
+
+    print(f"[INFO] Serving on http://{host}:{port} ({kind} server)")
+    try:
+        serve_forever()
+    finally:
+        if supervisor is not None:
+            supervisor.stop(SERVE_SHUTDOWN_TIMEOUT)
+        lake_analytics.stop()
+        print("[INFO] Server stopped.")
+
+if __name__ == "__main__":
+    main()
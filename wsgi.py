@@ -0,0 +1,13 @@
+# WSGI entry point for multi-worker serving.
+#
+# Run one ingest process and any number of web workers on the same host:
+#   SMARTTRAFFIC_ROLE=ingest python run.py
+#   SMARTTRAFFIC_ROLE=web gunicorn -w 4 -k gevent -b 0.0.0.0:5000 wsgi:app
+#
+# -k gevent keeps long-lived /video_feed streams from occupying sync workers.
+# serve.py does the same in one command (ingest child + gevent server).
+#
+# Web workers read live counters and frames from the shared files in data/live/.
+from app import create_app
+
+app = create_app()